@@ -10,6 +10,8 @@ import numpy as np
 
 from typing import Any, Union, List
 
+from simonplot.util.unique import unique_values
+
 from .BinningBase import BinningBase
 
 def transform_from_string(str : Union[str, None]) -> Union[hist.axis.transform.AxisTransform, None]:
@@ -43,11 +45,11 @@ class AutoIntCategoryBinning(BinningBase):
         for var, cut, dataset in zip(variables, cuts, datasets):
             values.append(dataset.get_unique(var, cut))
 
-        all_values = ak.to_numpy(ak.flatten(values, axis=None)) 
-        unique_values = np.unique(all_values) 
+        # each dataset's values are already distinct and sorted, so this is a small merge
+        all_values = unique_values(np.concatenate(values))
 
         return hist.axis.IntCategory(
-            unique_values.tolist(),
+            all_values.tolist(),
             name=variables[0].key,
             label=lookup_axis_label(variables[0].key),
             growth=False
@@ -146,6 +148,73 @@ class AutoBinning(BinningBase):
                 transform=transform
             ).build_axis(variables[0])
 
+class AutoQuantileBinning(BinningBase):
+    '''
+    Equal-population bins: the edges are quantiles of the variable, from QuantileSketches merged across all the datasets.
+    By default the number of bins follows the same heuristic as AutoBinning
+    '''
+    def __init__(self, nbins : Union[int, None] = None):
+        self._nbins = nbins
+
+    @property
+    def has_custom_labels(self) -> bool:
+        return False
+    
+    @property
+    def label_lookup(self) -> dict[str, str]:
+        return {}
+
+    @property
+    def kind(self) -> BinningKind:
+        return BinningKind.AUTO
+
+    @property
+    def nbins(self) -> Union[int, None]:
+        return self._nbins
+    
+    def build_auto_axis(self, 
+                        variables: List[VariableProtocol], 
+                        cuts: List[CutProtocol], 
+                        datasets: List[BaseDatasetProtocol], 
+                        transform: Union[str, None]=None) -> hist.axis.AxesMixin:
+
+        sketch = None
+        lens = []
+        for var, cut, dataset in zip(variables, cuts, datasets):
+            needed_columns = list(set(var.columns + cut.columns))
+            dataset.ensure_columns(needed_columns)
+
+            next_sketch = dataset.get_quantile_sketch(var, cut)
+            if sketch is None:
+                sketch = next_sketch
+            else:
+                sketch += next_sketch
+            lens.append(dataset.num_rows)
+
+        if sketch is None or np.isnan(sketch.min[0]):
+            raise RuntimeError("AutoQuantileBinning.build_auto_axis: No finite values to build the binning from!")
+
+        if self._nbins is None:
+            nbins = min(max(20, int(np.power(min(lens), 1/3))), 100)
+        else:
+            nbins = self._nbins
+
+        percentiles = np.linspace(0, 100, nbins+1)[1:-1]
+        edges = np.concatenate([sketch.min, sketch.quantiles(percentiles)[:, 0], sketch.max])
+        if transform == 'log':
+            # non-positive values end up in the underflow, as for AutoBinning
+            edges = edges[edges > 0]
+        # repeated values (eg discrete variables) give duplicate edges
+        edges = np.unique(edges)
+
+        if len(edges) < 2:
+            center = edges[0] if len(edges) == 1 else float(sketch.max[0])
+            edges = np.asarray([center - 0.5, center + 0.5])
+
+        return ExplicitBinning(
+            edges=edges.tolist()
+        ).build_axis(variables[0])
+
 class DefaultBinning(BinningBase):
     def __init__(self):
         pass
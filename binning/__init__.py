@@ -1,8 +1,9 @@
-from .Binning import AutoIntCategoryBinning, AutoBinning, DefaultBinning, BasicBinning, ExplicitBinning, PrebinnedBinning, IntBinning #, PrebinnedBinningWithLookup
+from .Binning import AutoIntCategoryBinning, AutoBinning, AutoQuantileBinning, DefaultBinning, BasicBinning, ExplicitBinning, PrebinnedBinning, IntBinning #, PrebinnedBinningWithLookup
 
 __all__ = [
     'AutoIntCategoryBinning',
     'AutoBinning',
+    'AutoQuantileBinning',
     'DefaultBinning',
     'BasicBinning',
     'ExplicitBinning',
@@ -6,12 +6,24 @@ from typing import Any, List, Sequence, Union
 from numpy._typing._array_like import NDArray
 
 from simonplot.variable.Variable import BasicVariable
+from simonplot.util.bitmap import unpack_bitmap
 
 from .CutBase import UnbinnedCutBase
 from simonplot.typing.Protocols import CutProtocol, VariableProtocol, UnbinnedDatasetAccessProtocol, UnbinnedDatasetProtocol
 
 from .NoCut import NoCut
 
+def _bitmap_equals(variable : VariableProtocol, value : float | int, dataset):
+    # only flat top-level columns can be indexed
+    if type(variable) is not BasicVariable or variable._collection_name is not None or not hasattr(dataset, 'get_bitmap_index'):
+        return None
+    
+    index = dataset.get_bitmap_index(variable._name)
+    if index is None:
+        return None
+    
+    return index.equals(value)
+
 class EqualsCut(UnbinnedCutBase):
     def __init__(self, variable : VariableProtocol | str, value : float | int):
         self._value = value
@@ -24,8 +36,19 @@ class EqualsCut(UnbinnedCutBase):
     def columns(self):
         return self._variable.columns
 
+    def _bitmap(self, dataset):
+        '''
+        Packed bitmap of the passing rows if the dataset has a bitmap index for the column, otherwise None
+        '''
+        return _bitmap_equals(self._variable, self._value, dataset)
+
     def evaluate(self, dataset):
         dataset = self.ensure_valid_dataset(dataset)
+
+        bits = self._bitmap(dataset)
+        if bits is not None:
+            return unpack_bitmap(bits, dataset.num_rows)
+
         ev = self._variable.evaluate(dataset, NoCut())
         return ev == self._value
 
@@ -59,8 +82,22 @@ class AllEqualCut(UnbinnedCutBase):
             cols += var.columns
         return list(set(cols))
     
+    def _bitmap(self, dataset):
+        bits = None
+        for var in self._variables:
+            nextbits = _bitmap_equals(var, self._value, dataset)
+            if nextbits is None:
+                return None
+            bits = nextbits if bits is None else np.bitwise_and(bits, nextbits)
+        return bits
+
     def evaluate(self, dataset):
         dataset = self.ensure_valid_dataset(dataset)
+
+        bits = self._bitmap(dataset)
+        if bits is not None:
+            return unpack_bitmap(bits, dataset.num_rows)
+
         mask = np.ones(dataset.num_rows, dtype=bool)
         for var in self._variables:
             ev = var.evaluate(dataset, NoCut())
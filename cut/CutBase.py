@@ -1,9 +1,27 @@
 from simonplot.typing.Protocols import  PrebinnedDatasetAccessProtocol, UnbinnedDatasetAccessProtocol
 from simonpy.AbitraryBinning import ArbitraryBinning
+from simonplot.util.evalcontext import memoize_cut_evaluate
 
 from abc import ABC, abstractmethod
+from typing import Tuple
 
 class CutBase(ABC):
+    # cached attributes which are not part of the cut definition
+    # these are not pickled, and are rebuilt lazily on first use
+    _transient : Tuple[str, ...] = ()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attr in self._transient:
+            state.pop(attr, None)
+        return state
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # memoize results inside an evaluation_context (see util/evalcontext.py)
+        if 'evaluate' in cls.__dict__:
+            cls.evaluate = memoize_cut_evaluate(cls.__dict__['evaluate'])
+
     @property
     @abstractmethod
     def prebinned(self) -> bool:
@@ -61,6 +79,8 @@ class UnbinnedCutBase(CutBase):
         return False
 
 class PrebinnedOperationBase(CutBase):
+    _transient = ('_resulting_binning',)
+
     @property
     def prebinned(self) -> bool:
         return False
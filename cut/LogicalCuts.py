@@ -2,7 +2,11 @@ from .CutBase import UnbinnedCutBase
 from typing import Any, List, Sequence, Union
 from simonplot.typing.Protocols import CutProtocol, VariableProtocol, UnbinnedDatasetAccessProtocol, UnbinnedDatasetProtocol
 import numpy as np
+import awkward as ak
+import time
 from .NoCut import NoCut
+from simonplot.config import config
+from simonplot.util.bitmap import unpack_bitmap
 
 def get_cuts_list(cuts : Union[CutProtocol, Sequence[CutProtocol]]):
     if isinstance(cuts, NoCut):
@@ -19,6 +23,128 @@ def get_cuts_list(cuts : Union[CutProtocol, Sequence[CutProtocol]]):
     else:
         assert_never(cuts)
 
+def _evaluation_order(logical_cut, decided_value : bool, skip : Sequence[int] = ()) -> List[int]:
+    '''
+    Order in which to evaluate the sub-cuts of an AndCuts/OrCuts, based on the statistics from previous evaluations
+    Cheap cuts which decide many rows go first:
+    for AND this is cost/(fraction failing), for OR cost/(fraction passing)
+    Until every sub-cut has statistics, keep the order as given
+    Sub-cuts in skip are left out
+    '''
+    N = len(logical_cut._cuts)
+    todo = [i for i in range(N) if i not in skip]
+    if not config['cut_ordering']['reorder'] or not hasattr(logical_cut, '_stats') or any(logical_cut._stats[i]['rows'] == 0 for i in todo):
+        return todo
+    
+    ranks = {}
+    for i in todo:
+        stat = logical_cut._stats[i]
+        cost = stat['seconds'] / stat['rows']
+        passfrac = stat['passed'] / stat['rows']
+        decided = passfrac if decided_value else 1 - passfrac
+        ranks[i] = cost / decided if decided > 0 else np.inf
+
+    return sorted(todo, key=lambda i: ranks[i])
+
+def _combined_bitmap(logical_cut, dataset, combine_bits, require_all : bool):
+    '''
+    Combine the packed bitmaps of the sub-cuts which can be resolved through a bitmap index
+    Returns (bits, indices of the resolved sub-cuts); if require_all and any sub-cut can't be resolved, bits is None
+    '''
+    bits = None
+    resolved = []
+    for i, cut in enumerate(logical_cut._cuts):
+        nextbits = cut._bitmap(dataset) if hasattr(cut, '_bitmap') else None
+        if nextbits is None:
+            if require_all:
+                return None, []
+            continue
+        bits = nextbits if bits is None else combine_bits(bits, nextbits)
+        resolved.append(i)
+    return bits, resolved
+
+def _as_numpy_mask(mask):
+    '''
+    Flat awkward masks (eg from cuts on NanoEvents columns) as numpy arrays, 
+    so that later sub-cuts can be short-circuited on them. Anything else is returned as is
+    '''
+    if isinstance(mask, ak.Array) and mask.ndim == 1:
+        try:
+            return ak.to_numpy(mask, allow_missing=False)
+        except ValueError: # option types with missing values
+            return mask
+    return mask
+
+def _evaluate_chain(logical_cut, dataset, combine, combine_bits, decided_value : bool):
+    '''
+    Evaluate the sub-cuts of an AndCuts (combine=np.logical_and, decided_value=False) or OrCuts (np.logical_or, True)
+
+    Sub-cuts which can be resolved through bitmap indexes on the dataset are combined first
+    with bitwise operations on the packed bitmaps (combine_bits), without evaluating any column
+
+    Once the per-event mask has settled (decided_value) for enough of the rows,
+    later sub-cuts are only evaluated on the remaining undecided rows, through a CompactedView.
+    This only works for sub-cuts returning per-event masks. Sub-cuts which turn out to be per-object
+    are re-evaluated on the full dataset, and remembered so that this is not attempted again
+    '''
+    from simonplot.plottables.CompactedView import CompactedView
+
+    if not hasattr(logical_cut, '_stats'):
+        logical_cut._stats = [{'rows' : 0, 'passed' : 0, 'seconds' : 0.0, 'per_event' : True} for _ in logical_cut._cuts]
+
+    cfg = config['cut_ordering']
+    N = dataset.num_rows
+
+    bits, resolved = _combined_bitmap(logical_cut, dataset, combine_bits, require_all=False)
+    mask = unpack_bitmap(bits, N) if bits is not None else None
+
+    for i in _evaluation_order(logical_cut, decided_value, skip=resolved):
+        cut = logical_cut._cuts[i]
+        stat = logical_cut._stats[i]
+
+        undecided = None
+        if (cfg['short_circuit'] and stat['per_event'] and isinstance(mask, np.ndarray) 
+                and mask.ndim == 1 and mask.dtype == bool and len(mask) == N):
+            undecided = np.flatnonzero(mask != decided_value)
+            if len(undecided) > cfg['max_undecided_fraction'] * N:
+                undecided = None
+
+        start = time.perf_counter()
+        if undecided is not None:
+            nextmask = _as_numpy_mask(cut.evaluate(CompactedView(dataset, undecided)))
+            if isinstance(nextmask, slice):
+                nextmask = np.ones(len(undecided), dtype=bool)[nextmask]
+
+            if isinstance(nextmask, np.ndarray) and nextmask.ndim == 1 and len(nextmask) == len(undecided):
+                mask = mask.copy() # pyright: ignore[reportOptionalMemberAccess]
+                mask[undecided] = nextmask
+                stat['rows'] += len(undecided)
+                stat['passed'] += np.count_nonzero(nextmask)
+                stat['seconds'] += time.perf_counter() - start
+                continue
+            else:
+                # per-object cut, can't be scattered back onto the events
+                stat['per_event'] = False
+                start = time.perf_counter()
+
+        nextmask = _as_numpy_mask(cut.evaluate(dataset))
+        if isinstance(nextmask, slice): #ensure mask is a boolean array
+            nextmask = np.ones(N, dtype=bool)[nextmask]
+
+        flat = ak.flatten(nextmask, axis=None) if isinstance(nextmask, ak.Array) else np.ravel(nextmask)
+        stat['rows'] += len(flat)
+        stat['passed'] += ak.count_nonzero(flat)
+        stat['seconds'] += time.perf_counter() - start
+        if isinstance(nextmask, ak.Array) and nextmask.ndim > 1:
+            stat['per_event'] = False
+
+        if mask is None:
+            mask = nextmask
+        else:
+            mask = combine(mask, nextmask)
+
+    return mask
+
 class AndCuts(UnbinnedCutBase):
     # get in before __init__ and sometimes return a different class
     def __new__(cls, cuts : Sequence[CutProtocol]):
@@ -32,6 +158,13 @@ class AndCuts(UnbinnedCutBase):
             # Build the AndCuts object; __init__ will run automatically.
             return super(AndCuts, cls).__new__(cls)
 
+    # __new__ needs the cuts when unpickling/copying
+    def __getnewargs__(self):
+        return (self._cuts,)
+
+    # running selectivity/cost statistics are not part of the cut definition
+    _transient = ('_stats',)
+
     def __init__(self, cuts : Sequence[CutProtocol]):
         filtered_cuts = get_cuts_list(cuts)
         self._cuts = filtered_cuts
@@ -43,21 +176,12 @@ class AndCuts(UnbinnedCutBase):
             cols += cut.columns
         return list(set(cols))
 
+    def _bitmap(self, dataset):
+        return _combined_bitmap(self, dataset, np.bitwise_and, require_all=True)[0]
+
     def evaluate(self, dataset):
         dataset = self.ensure_valid_dataset(dataset)   
-
-        mask = self._cuts[0].evaluate(dataset)
-        if isinstance(mask, slice): #ensure mask is a boolean array
-            mask = np.ones(dataset.num_rows, dtype=bool)[mask]
-
-        for cut in self._cuts[1:]:
-            nextmask = cut.evaluate(dataset)
-            if isinstance(mask, slice): #ensure mask is a boolean array
-                nextmask = np.ones(dataset.num_rows, dtype=bool)[nextmask]
-            
-            mask = np.logical_and(mask, nextmask)
-
-        return mask
+        return _evaluate_chain(self, dataset, np.logical_and, np.bitwise_and, decided_value=False)
 
     @property
     def key(self):
@@ -108,6 +232,12 @@ class OrCuts(UnbinnedCutBase):
             # Build the OrCuts object; __init__ will run automatically.
             return super(OrCuts, cls).__new__(cls)
 
+    # __new__ needs the cuts when unpickling/copying
+    def __getnewargs__(self):
+        return (self._cuts,)
+
+    _transient = ('_stats',)
+
     def __init__(self, cuts : Sequence[CutProtocol]):
         self._cuts = get_cuts_list(cuts)
 
@@ -118,21 +248,12 @@ class OrCuts(UnbinnedCutBase):
             cols += cut.columns
         return list(set(cols))
 
+    def _bitmap(self, dataset):
+        return _combined_bitmap(self, dataset, np.bitwise_or, require_all=True)[0]
+
     def evaluate(self, dataset):
         dataset = self.ensure_valid_dataset(dataset)   
-
-        mask = self._cuts[0].evaluate(dataset)
-        if isinstance(mask, slice): #ensure mask is a boolean array
-            mask = np.ones(dataset.num_rows, dtype=bool)[mask]
-
-        for cut in self._cuts[1:]:
-            nextmask = cut.evaluate(dataset)
-            if isinstance(mask, slice): #ensure mask is a boolean array
-                nextmask = np.ones(dataset.num_rows, dtype=bool)[nextmask]
-            
-            mask = np.logical_or(mask, nextmask)
-
-        return mask
+        return _evaluate_chain(self, dataset, np.logical_or, np.bitwise_or, decided_value=True)
 
     @property
     def key(self):
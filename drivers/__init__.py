@@ -2,10 +2,13 @@ from .plot_histogram import plot_histogram
 from .scatter_2d import scatter_2d
 from .draw_matrix import draw_matrix
 from .draw_radial_histogram import draw_radial_histogram
+from .cutflow import cutflow, Cutflow
 
 __all__ = [
     'plot_histogram',
     'scatter_2d',
     'draw_matrix',
     'draw_radial_histogram',
+    'cutflow',
+    'Cutflow',
 ]
\ No newline at end of file
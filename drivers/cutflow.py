@@ -0,0 +1,306 @@
+'''
+Cut-flows and N-1 selections from a single evaluation of each cut.
+
+Each cut is evaluated once per dataset, and every cumulative selection (cuts[:i]) and N-1 selection
+(all cuts but cuts[i]) is built by ANDing the masks, through prefix and suffix products:
+prefix[i] = AND(masks[:i]), suffix[i] = AND(masks[i:]), N-1[i] = prefix[i] & suffix[i+1].
+That is O(N) cut evaluations and mask combinations, rather than O(N^2) when building N AndCuts.
+
+The resulting selections are _MaskCuts, which can be passed to plot_histogram like any other cut
+'''
+
+from simonplot.cut.CutBase import UnbinnedCutBase
+from simonplot.cut.LogicalCuts import AndCuts
+from simonplot.util.evalcontext import evaluation_context
+from simonplot.typing.Protocols import CutProtocol, VariableProtocol, BaseDatasetProtocol, BaseBinningProtocol, AutoBinningProtocol, DefaultBinningProtocol, BasicBinningProtocol
+
+import itertools
+import numpy as np
+import awkward as ak
+
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+_tokens = itertools.count()
+
+class _MaskCut(UnbinnedCutBase):
+    '''
+    Stands in for a combination of cuts whose masks have already been evaluated, for a fixed set of datasets.
+    On any other dataset (eg the per-file datasets opened in NanoEventsDataset's worker processes,
+    where the masks are not sent) the cuts are evaluated again
+    '''
+
+    # the masks are large and tied to the loaded datasets, so are not pickled
+    _transient = ('_masks',)
+
+    def __init__(self, masks : Dict[int, Tuple[Any, Any]], cuts : Sequence[CutProtocol], key : str, label : str):
+        '''
+        masks: id(dataset) -> (dataset, mask)
+        cuts: the cuts which were combined into the masks
+        '''
+        self._masks = masks
+        # not called _cuts, so that get_cuts_list doesn't take this for an AndCuts
+        self._combined = AndCuts(list(cuts))
+        self._key = key
+        self._mask_label = label
+        # the masks themselves are transient, so this is what distinguishes different _MaskCuts
+        # in memoization and yield-ledger keys
+        self._token = next(_tokens)
+
+    @property
+    def columns(self):
+        # only needed when the cuts have to be evaluated again
+        return self._combined.columns
+
+    def evaluate(self, dataset):
+        dataset = self.ensure_valid_dataset(dataset)
+
+        masks = getattr(self, '_masks', {})
+        if id(dataset) in masks:
+            return masks[id(dataset)][1]
+        else:
+            return self._combined.evaluate(dataset)
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def _auto_label(self):
+        return self._mask_label
+
+    def set_collection_name(self, collection_name):
+        pass
+
+    def __eq__(self, other):
+        if not isinstance(other, _MaskCut):
+            return False
+        return self._token == other._token
+
+def _concatenate(masks : List[Any]) -> Any:
+    if all(isinstance(mask, np.ndarray) for mask in masks):
+        return np.concatenate(masks)
+    else:
+        return ak.concatenate(masks)
+
+def _selection_masks(cuts : Sequence[CutProtocol], dataset : Any) -> Tuple[List[Any], List[Any]]:
+    '''
+    (cumulative masks [N+1], N-1 masks [N]) for dataset, evaluating each cut once
+    '''
+    N = len(cuts)
+
+    # one evaluation context, so that sub-expressions shared between cuts are evaluated once
+    with evaluation_context(dataset):
+        masks = []
+        for cut in cuts:
+            mask = cut.evaluate(dataset)
+            if isinstance(mask, slice):
+                sliced = np.zeros(dataset.num_rows, dtype=bool)
+                sliced[mask] = True
+                mask = sliced
+            masks.append(mask)
+
+    prefix = [None]
+    for mask in masks:
+        prefix.append(_and(prefix[-1], mask))
+
+    suffix = [None] * (N+1)
+    for i in reversed(range(N)):
+        suffix[i] = _and(masks[i], suffix[i+1])
+
+    allpass = np.ones(dataset.num_rows, dtype=bool)
+    cumulative = [allpass if mask is None else mask for mask in prefix]
+    nminus1 = [_and(prefix[i], suffix[i+1]) for i in range(N)]
+    nminus1 = [allpass if mask is None else mask for mask in nminus1]
+    return cumulative, nminus1
+
+def _and(mask1 : Any, mask2 : Any) -> Any:
+    if mask1 is None:
+        return mask2
+    elif mask2 is None:
+        return mask1
+    else:
+        return np.logical_and(mask1, mask2)
+
+def _combined_key(cuts : Sequence[CutProtocol]) -> Tuple[str, str]:
+    if len(cuts) == 0:
+        return "none", ""
+    return "_AND_".join(cut.key for cut in cuts), "\n".join(cut.label for cut in cuts)
+
+def _build_axis(binning : BaseBinningProtocol, variable : VariableProtocol, cut : CutProtocol, dataset : Any) -> Any:
+    if isinstance(binning, AutoBinningProtocol):
+        return binning.build_auto_axis([variable], [cut], [dataset])
+    elif isinstance(binning, DefaultBinningProtocol):
+        return binning.build_default_axis(variable)
+    elif isinstance(binning, BasicBinningProtocol):
+        return binning.build_axis(variable)
+    else:
+        raise RuntimeError("cutflow: Binning must be an auto, default, or basic binning!")
+
+class Cutflow:
+    '''
+    Result of cutflow(): cumulative and N-1 yields for each dataset,
+    the N-1 histograms of each cut's variable, and the selections themselves (as cuts)
+    '''
+    def __init__(self,
+                 cuts : Sequence[CutProtocol],
+                 datasets : Sequence[Any],
+                 cumulative_cuts : Sequence[_MaskCut],
+                 nminus1_cuts : Sequence[_MaskCut],
+                 yields : np.ndarray,
+                 nminus1_yields : np.ndarray,
+                 nminus1_hists : List[List[Any]]):
+        self._cuts = cuts
+        self._datasets = datasets
+        self._cumulative_cuts = cumulative_cuts
+        self._nminus1_cuts = nminus1_cuts
+        self._yields = yields
+        self._nminus1_yields = nminus1_yields
+        self._nminus1_hists = nminus1_hists
+
+    @property
+    def cuts(self) -> Sequence[CutProtocol]:
+        return self._cuts
+
+    @property
+    def datasets(self) -> Sequence[Any]:
+        return self._datasets
+
+    @property
+    def yields(self) -> np.ndarray:
+        '''
+        [ndatasets, ncuts+1]: yield before any cut, and after each successive cut
+        '''
+        return self._yields
+
+    @property
+    def nminus1_yields(self) -> np.ndarray:
+        '''
+        [ndatasets, ncuts]: yield with every cut applied except cuts[i]
+        '''
+        return self._nminus1_yields
+
+    @property
+    def nminus1_hists(self) -> List[List[Any]]:
+        '''
+        [ndatasets][ncuts]: histogram of the variable of cuts[i], with every cut applied except cuts[i]
+        (None where there is no variable)
+        '''
+        return self._nminus1_hists
+
+    def cumulative_cut(self, i : int) -> _MaskCut:
+        '''
+        Selection applying cuts[:i], which can be passed to plot_histogram
+        '''
+        return self._cumulative_cuts[i]
+
+    def nminus1_cut(self, i : int) -> _MaskCut:
+        '''
+        Selection applying every cut except cuts[i], which can be passed to plot_histogram
+        '''
+        return self._nminus1_cuts[i]
+
+    def table(self) -> str:
+        '''
+        Cut-flow table: the yield after each successive cut, and its efficiency relative to the previous row
+        '''
+        names = ['none'] + [cut.key for cut in self._cuts]
+        width = max(len(name) for name in names)
+
+        lines = [" "*width + "".join(" | %22s"%d.key for d in self._datasets)]
+        for i, name in enumerate(names):
+            line = name.ljust(width)
+            for j in range(len(self._datasets)):
+                y = self._yields[j, i]
+                if i == 0:
+                    line += " | %12.4g %9s"%(y, "")
+                else:
+                    prev = self._yields[j, i-1]
+                    eff = y / prev if prev != 0 else np.nan
+                    line += " | %12.4g (%6.2f%%)"%(y, 100*eff)
+            lines.append(line)
+        return "\n".join(lines)
+
+def cutflow(cuts : Sequence[CutProtocol],
+            weight : VariableProtocol,
+            dataset_ : Union[BaseDatasetProtocol, List[BaseDatasetProtocol]],
+            variables : Union[Sequence[Union[VariableProtocol, None]], None] = None,
+            binning : Union[BaseBinningProtocol, Sequence[Union[BaseBinningProtocol, None]], None] = None) -> Cutflow:
+    '''
+    Cut-flow yields and N-1 histograms for an ordered list of cuts, evaluating each cut only once per dataset
+
+    weight: event weight; yields also include the dataset weights, so call compute_weight() first for lumi-normalized yields
+    dataset_: one or more datasets (including stacks)
+    variables: the variable to histogram for each N-1 selection.
+        By default the variable the cut acts on (eg for GreaterThanCut), where there is one
+    binning: binning for the N-1 histograms, either one for all or one per cut. If None, no histograms are filled
+    '''
+    datasets = dataset_ if isinstance(dataset_, list) else [dataset_]
+    cuts = list(cuts)
+    N = len(cuts)
+
+    if variables is None:
+        variables = [getattr(cut, '_variable', None) for cut in cuts]
+    if len(variables) != N:
+        raise RuntimeError("cutflow: Got %d variables for %d cuts!"%(len(variables), N))
+
+    if binning is None or isinstance(binning, BaseBinningProtocol):
+        binnings = [binning] * N
+    else:
+        binnings = list(binning)
+    if len(binnings) != N:
+        raise RuntimeError("cutflow: Got %d binnings for %d cuts!"%(len(binnings), N))
+
+    cut_columns = []
+    for cut in cuts:
+        cut_columns += cut.columns
+    needed_columns = list(set(cut_columns + weight.columns))
+    for var in variables:
+        if var is not None:
+            needed_columns = list(set(needed_columns + var.columns))
+
+    cumulative_masks = [{} for _ in range(N+1)]
+    nminus1_masks = [{} for _ in range(N)]
+    for dataset in datasets:
+        # stacks and comparisons fill their constituents, so those are the ones that need masks
+        for leaf in dataset.leaf_datasets():
+            # load everything up front, so that the table isn't reloaded between cuts
+            leaf.ensure_columns(needed_columns)
+
+            files = leaf.file_datasets()
+            if len(files) > 0:
+                # the fills see the per-file datasets, and estimate_yield the concatenation
+                per_file = [_selection_masks(cuts, f) for f in files]
+                for f, (cumulative, nminus1) in zip(files, per_file):
+                    for i in range(N+1):
+                        cumulative_masks[i][id(f)] = (f, cumulative[i])
+                    for i in range(N):
+                        nminus1_masks[i][id(f)] = (f, nminus1[i])
+                cumulative = [_concatenate([masks[0][i] for masks in per_file]) for i in range(N+1)]
+                nminus1 = [_concatenate([masks[1][i] for masks in per_file]) for i in range(N)]
+            else:
+                cumulative, nminus1 = _selection_masks(cuts, leaf)
+
+            for i in range(N+1):
+                cumulative_masks[i][id(leaf)] = (leaf, cumulative[i])
+            for i in range(N):
+                nminus1_masks[i][id(leaf)] = (leaf, nminus1[i])
+
+    cumulative_cuts = [_MaskCut(cumulative_masks[i], cuts[:i], *_combined_key(cuts[:i])) for i in range(N+1)]
+    nminus1_cuts = [_MaskCut(nminus1_masks[i], cuts[:i] + cuts[i+1:], *_combined_key(cuts[:i] + cuts[i+1:])) for i in range(N)]
+
+    yields = np.zeros((len(datasets), N+1))
+    nminus1_yields = np.zeros((len(datasets), N))
+    nminus1_hists = [[None]*N for _ in datasets]
+    for j, dataset in enumerate(datasets):
+        for i in range(N):
+            if variables[i] is not None and binnings[i] is not None:
+                axis = _build_axis(binnings[i], variables[i], nminus1_cuts[i], dataset) # pyright: ignore[reportArgumentType]
+                nminus1_hists[j][i] = dataset.fill_hist(variables[i], nminus1_cuts[i], weight, axis) # pyright: ignore[reportAttributeAccessIssue]
+
+            # free from the yield ledger if the histogram was just filled
+            nminus1_yields[j, i] = dataset.estimate_yield(nminus1_cuts[i], weight)
+
+        for i in range(N+1):
+            yields[j, i] = dataset.estimate_yield(cumulative_cuts[i], weight)
+
+    return Cutflow(cuts, datasets, cumulative_cuts, nminus1_cuts, yields, nminus1_yields, nminus1_hists)
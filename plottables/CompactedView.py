@@ -0,0 +1,43 @@
+import numpy as np
+
+from simonplot.cut.Cut import NoCut
+
+class CompactedView:
+    '''
+    Read-only view of the selected rows of an unbinned dataset, for select-then-compute evaluation:
+    the cut is evaluated once on the full dataset, and then variables are evaluated on the view with NoCut(),
+    so that each column is gathered only once rather than masked again at every leaf of the variable tree
+
+    Columns are gathered one-by-one on first use, from the dataset's own (cached) columns,
+    so only the columns which are actually evaluated on the view are copied, and nothing else about the dataset is.
+    The view has no bitmap indexes; bitmap-indexed sub-cuts of AndCuts/OrCuts are resolved on the full dataset
+    before any rows are compacted
+    '''
+    def __init__(self, dataset, rows : np.ndarray):
+        self._parent = dataset
+        self._rows = rows
+
+        self._columns = {}
+
+        # the view lives for one fill, so it gets its own memoization cache
+        if getattr(dataset, '_eval_cache', None) is not None:
+            self._eval_cache = {}
+
+    def ensure_columns(self, columns):
+        self._parent.ensure_columns(columns)
+
+    def get_column(self, column_name, collection_name=None):
+        if (column_name, collection_name) not in self._columns:
+            self._columns[(column_name, collection_name)] = self._parent.get_column(column_name, collection_name)[self._rows]
+        return self._columns[(column_name, collection_name)]
+
+    def get_sidecar_column(self, variable):
+        if hasattr(self._parent, 'get_sidecar_column'):
+            return self._parent.get_sidecar_column(variable)[self._rows]
+        else:
+            self.ensure_columns(variable.columns)
+            return variable.evaluate(self, NoCut())
+
+    @property
+    def num_rows(self):
+        return len(self._rows)
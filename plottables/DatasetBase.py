@@ -11,8 +11,16 @@ from simonplot.typing.Protocols import BaseDatasetProtocol, HistplotMode, Prebin
 from simonplot.util.comparison import ComparisonHistStruct
 from simonplot.util.profile import ProfileHistStruct, ProfileStruct
 from simonplot.util.rate import RateHistStruct
+from simonplot.util.evalcontext import with_evaluation_context, memo_key
+from simonplot.util.fill import flatten_for_fill, flatten_values
+from simonplot.config import config
+from simonplot.util.bitmap import BitmapIndex
+from simonplot.util.sketch import QuantileSketch
+from simonplot.util.unique import unique_values
+from simonplot.util.ranges import RangeStats
+from .CompactedView import CompactedView
 from simonplot.variable.PrebinnedVariable import strip_variable
-from simonplot.variable.Variable import ConstantVariable, RateStruct
+from simonplot.variable.Variable import BasicVariable, ConstantVariable, RateStruct
 from simonpy.AbitraryBinning import ArbitraryBinning
 
 from typing import Any, List, Sequence, Tuple, Union, assert_never
@@ -107,11 +115,34 @@ def accumulate_H(H1 : Any, H2 : Any) -> Any:
 class DatasetBase(ABC):
     _key : str
 
+    # attributes holding loaded data or fill results rather than the dataset definition
+    # these are not pickled, and are rebuilt lazily on first use
+    _transient : Tuple[str, ...] = ('_H', '_bitmap_indexes', '_unique_cache', '_yields')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attr in self._transient:
+            state.pop(attr, None)
+        return state
+
     @property
     @abstractmethod
     def is_stack(self) -> bool:
         raise NotImplementedError()
 
+    def leaf_datasets(self) -> List['DatasetBase']:
+        '''
+        The datasets which evaluate cuts in this process when this one is filled:
+        itself, or the constituents of stacks and comparisons
+        '''
+        return [self]
+
+    def file_datasets(self) -> List['DatasetBase']:
+        '''
+        Per-file datasets which are filled one by one (and keep their own yield ledgers); empty if this dataset is filled as a whole
+        '''
+        return []
+
     def set_label(self, label):
         self._label = label
 
@@ -165,64 +196,205 @@ class SingleDatasetBase(DatasetBase):
     _H : Any
     _weight : float = 1.0
 
+    def _yield_key(self, cut : CutProtocol, weight : VariableProtocol) -> Any:
+        # the dataset weight changes with compute_weight, so is part of the key
+        return (memo_key(cut), memo_key(weight), self._weight)
+
+    def _record_yield(self, cut : CutProtocol, weight : VariableProtocol, target : Any, target_cut : CutProtocol, wgt : Any) -> float:
+        '''
+        Add the yield of the already-evaluated weight wgt (on target, with target_cut) to the ledger under (cut, weight)
+        '''
+        if not isinstance(wgt, ak.Array) and np.ndim(wgt) == 0:
+            # a constant weight counts once for every selected row
+            mask = target_cut.evaluate(target)
+            if isinstance(mask, slice):
+                nselected = len(range(target.num_rows)[mask])
+            else:
+                nselected = ak.count_nonzero(mask, axis=None)
+            total_yield = float(wgt) * nselected * self._weight
+        else:
+            total_yield = np.nansum(wgt) * self._weight
+
+        if not hasattr(self, '_yields'):
+            self._yields = {}
+        self._yields[self._yield_key(cut, weight)] = total_yield
+        return total_yield
+
+    @with_evaluation_context
     def estimate_yield(self, cut : CutProtocol, weight : VariableProtocol) -> float:
+        '''
+        Sum of weights passing cut, including the dataset weight
+
+        Yields are kept in a ledger keyed by (cut, weight, dataset weight), which fill_hist also fills,
+        so this is free after filling a histogram with the same cut and weight
+        '''
+        key = self._yield_key(cut, weight)
+        if key in getattr(self, '_yields', {}):
+            return self._yields[key]
+
         needed_columns = list(set(cut.columns + weight.columns))
         
         self.ensure_columns(needed_columns)
-        wgt = weight.evaluate(self, cut)  # pyright: ignore[reportArgumentType]
-        total_yield = np.nansum(wgt) * self._weight
+        target, target_cut = self._select_then_compute(cut)
+        wgt = weight.evaluate(target, target_cut)  # pyright: ignore[reportArgumentType]
 
-        return total_yield
+        return self._record_yield(cut, weight, target, target_cut, wgt)
 
     @abstractmethod
     def ensure_columns(self, columns: Sequence[str]):
         raise NotImplementedError()
 
+    def enable_bitmap_index(self, columns : Sequence[str], max_cardinality : int = 256):
+        '''
+        Resolve EqualsCut/AllEqualCut on these (flat, integer) columns through bitmap indexes
+        The index for each column is built on first use, and kept for the lifetime of the dataset
+        '''
+        if not hasattr(self, '_bitmap_columns'):
+            self._bitmap_columns = {}
+        for column in columns:
+            self._bitmap_columns[column] = max_cardinality
+
+    def get_bitmap_index(self, column : str) -> BitmapIndex | None:
+        '''
+        Bitmap index for column, or None if the column is not indexed
+        '''
+        if column not in getattr(self, '_bitmap_columns', {}):
+            return None
+
+        if not hasattr(self, '_bitmap_indexes'):
+            self._bitmap_indexes = {}
+
+        # only called from cut evaluation, so column is already loaded
+        if column not in self._bitmap_indexes:
+            values = self.get_column(column) # pyright: ignore[reportAttributeAccessIssue]
+            if isinstance(values, ak.Array) and values.ndim == 1:
+                try:
+                    values = ak.to_numpy(values, allow_missing=False)
+                except ValueError:
+                    pass
+
+            if not isinstance(values, np.ndarray) or values.ndim != 1 or values.dtype.kind not in 'iub':
+                print("Warning: column %s is not a flat integer column, so cannot be bitmap-indexed"%column)
+                self._bitmap_indexes[column] = None
+            elif len(np.unique(values)) > self._bitmap_columns[column]:
+                print("Warning: column %s has more than %d distinct values, so will not be bitmap-indexed"%(column, self._bitmap_columns[column]))
+                self._bitmap_indexes[column] = None
+            else:
+                self._bitmap_indexes[column] = BitmapIndex(values)
+
+        return self._bitmap_indexes[column]
+
+    def _select_then_compute(self, cut : CutProtocol) -> Tuple[Any, CutProtocol]:
+        '''
+        If cut is a per-event selection keeping only a small fraction of events,
+        gather the selected rows once into a CompactedView, and evaluate everything on that with NoCut()
+        rather than re-applying the mask at every leaf of the variable tree
+
+        Returns the (dataset, cut) pair to evaluate variables with
+        '''
+        cfg = config['select_then_compute']
+        if not cfg['enabled'] or cut is None or type(cut) is NoCut or not isinstance(self, UnbinnedDatasetAccessProtocol):
+            return self, cut
+        
+        mask = cut.evaluate(self)
+        if isinstance(mask, ak.Array):
+            if mask.ndim != 1:
+                return self, cut
+            try:
+                mask = ak.to_numpy(mask, allow_missing=False)
+            except ValueError:
+                return self, cut
+
+        if not isinstance(mask, np.ndarray) or mask.ndim != 1 or mask.dtype != bool or len(mask) != self.num_rows:
+            return self, cut
+        
+        rows = np.flatnonzero(mask)
+        if len(rows) > cfg['max_selected_fraction'] * len(mask):
+            return self, cut
+
+        return CompactedView(self, rows), NoCut()
+
+    @with_evaluation_context
     def get_range(self, var : VariableProtocol, cut : CutProtocol) -> Tuple[Any, Any, Any, np.dtype]:
         needed_columns = list(set(var.columns + cut.columns))
         
         self.ensure_columns(needed_columns)
+        target, cut = self._select_then_compute(cut)
 
-        v = var.evaluate(self, cut) # pyright: ignore[reportArgumentType]
+        v = var.evaluate(target, cut) # pyright: ignore[reportArgumentType]
         if isinstance(v, RateStruct):
             v = v.wrt
         elif isinstance(v, ProfileStruct):
             v = v.xvar
 
-        values = ak.to_numpy(ak.flatten(v, axis=None)) # pyright: ignore[reportArgumentType]
+        # one fused pass over the (zero-copy where possible) flat values
+        # If there are no finite values, this gives the largest possible range for the dtype 
+        # That way things still work out for dataset stacks
+        # Even when some of the datasets have no finite values for the variable/cut combination
+        return RangeStats.from_values(flatten_values(v)).as_range()
 
-        if np.sum(np.isfinite(values)) == 0:
-            # If there are no finite values, return the largest possible range for the dtype 
-            # That way things still work out for dataset stacks
-            # Even when some of the datasets have no finite values for the variable/cut combination
-            return (np.finfo(values.dtype).max, np.finfo(values.dtype).max, np.finfo(values.dtype).min, values.dtype)
+    def _unique_column_values(self, column : str) -> np.ndarray | None:
+        '''
+        Distinct values of a loaded flat column, if the dataset can find them without evaluating the column,
+        (eg from parquet dictionaries), otherwise None
+        '''
+        return None
 
-        minval = np.nanmin(values)
-        if len(values[values > 0]) == 0:
-            minval2 = np.nan
-        else:
-            minval2 = np.nanmin(values[values > 0])
-            
-        maxval = np.nanmax(values)
+    @with_evaluation_context
+    def get_unique(self, var : VariableProtocol, cut : CutProtocol) -> np.ndarray:
+        '''
+        Sorted distinct values of var after cut, cached per (var, cut) until the dataset reloads its columns
+        '''
+        cachekey = (memo_key(var), memo_key(cut))
+        if cachekey in getattr(self, '_unique_cache', {}):
+            return self._unique_cache[cachekey]
+
+        needed_columns = list(set(var.columns + cut.columns))
+        self.ensure_columns(needed_columns)
 
-        return (minval, minval2, maxval, values.dtype)
+        result = None
+        if type(var) is BasicVariable and var._collection_name is None and isinstance(cut, NoCut):
+            result = self._unique_column_values(var._name)
 
-    def get_unique(self, var : VariableProtocol, cut : CutProtocol) -> np.ndarray:
+        if result is None:
+            target, cut = self._select_then_compute(cut)
+
+            v = var.evaluate(target, cut) # pyright: ignore[reportArgumentType]
+            if isinstance(v, RateStruct):
+                v = v.wrt
+            elif isinstance(v, ProfileStruct):
+                v = v.xvar
+
+            result = unique_values(flatten_values(v))
+
+        # after ensure_columns, which may have reloaded the columns and so cleared the cache
+        if not hasattr(self, '_unique_cache'):
+            self._unique_cache = {}
+        self._unique_cache[cachekey] = result
+        return result
+
+    @with_evaluation_context
+    def get_quantile_sketch(self, var : VariableProtocol, cut : CutProtocol) -> QuantileSketch:
+        '''
+        Single-bin QuantileSketch of the finite values of var, which can be merged across datasets
+        '''
         needed_columns = list(set(var.columns + cut.columns))
         
         self.ensure_columns(needed_columns)
+        target, cut = self._select_then_compute(cut)
 
-        v = var.evaluate(self, cut) # pyright: ignore[reportArgumentType]
+        v = var.evaluate(target, cut) # pyright: ignore[reportArgumentType]
         if isinstance(v, RateStruct):
             v = v.wrt
         elif isinstance(v, ProfileStruct):
             v = v.xvar
 
-        values = ak.to_numpy(ak.flatten(v, axis=None)) # pyright: ignore[reportArgumentType]
-
-        unique_values = np.unique(values) 
+        values = flatten_values(v)
+        values = values[np.isfinite(values)]
 
-        return unique_values
+        sketch = QuantileSketch(1, config['quantile_sketch']['size'])
+        sketch.add(np.zeros(len(values), dtype=np.int64), values, 1.0)
+        return sketch
 
     @property
     def is_stack(self) -> bool:
@@ -268,6 +440,7 @@ class SingleDatasetBase(DatasetBase):
         else:
             self._weight = 1.0
 
+    @with_evaluation_context
     def fill_hist(self,
                   variable: VariableProtocol, 
                   cut: CutProtocol, 
@@ -277,34 +450,21 @@ class SingleDatasetBase(DatasetBase):
         if isinstance(self, UnbinnedDatasetAccessProtocol):
             needed_columns = list(set(variable.columns + cut.columns + weight.columns))
             self.ensure_columns(needed_columns)
+            target, target_cut = self._select_then_compute(cut)
 
-            val = variable.evaluate(self, cut)
-            wgt = weight.evaluate(self, cut)
+            val = variable.evaluate(target, target_cut)
+            wgt = weight.evaluate(target, target_cut)
+            self._record_yield(cut, weight, target, target_cut, wgt)
 
             if isinstance(val, RateStruct):
-                Hpass = hist.Hist(
-                    axis,
-                    storage=hist.storage.Weight()
-                )
-                Hfail = hist.Hist(
-                    axis,
-                    storage=hist.storage.Weight()
-                )
-
-                Hpass.fill(
-                    ak.flatten(val.wrt[val.binary==1], axis=None), 
-                    weight = self._weight * ak.flatten(wgt[val.binary==1], axis=None) 
-                )
-                Hfail.fill(
-                    ak.flatten(val.wrt[val.binary==0], axis=None), 
-                    weight = self._weight * ak.flatten(wgt[val.binary==0], axis=None) 
-                )
-
-                self._H = RateHistStruct(Hpass, Hfail)
+                self._H = val.fill(axis, wgt, self._weight)
             elif isinstance(val, ProfileStruct):
+                # profiles only take the event and dataset weights when asked to
                 self._H = ProfileHistStruct(
                     val,
-                    [axis]
+                    [axis],
+                    weight = wgt if val.weighted else None,
+                    scale = self._weight if val.weighted else 1.0
                 )
             else:
                 self._H = hist.Hist(
@@ -312,10 +472,14 @@ class SingleDatasetBase(DatasetBase):
                     storage=hist.storage.Weight()
                 )
 
+                # the dataset weight is applied to the filled histogram (scaling variances by its square)
+                # rather than multiplied into a copy of the weight array
+                flatval, flatwgt = flatten_for_fill(val, wgt)
                 self._H.fill(
-                    ak.flatten(val, axis=None), 
-                    weight = self._weight * ak.flatten(wgt, axis=None) 
+                    flatval, 
+                    weight = flatwgt
                 )
+                self._H *= self._weight
 
         elif isinstance(self, PrebinnedDatasetAccessProtocol):
             cutresult = variable.evaluate(self, cut)
@@ -342,6 +506,7 @@ class SingleDatasetBase(DatasetBase):
         
         return self._H
 
+    @with_evaluation_context
     def fill_hist_2D(self,
                      variable_x: VariableProtocol,
                      variable_y: VariableProtocol,
@@ -353,10 +518,12 @@ class SingleDatasetBase(DatasetBase):
         if isinstance(self, UnbinnedDatasetAccessProtocol):
             needed_columns = list(set(variable_x.columns + variable_y.columns + cut.columns + weight.columns))
             self.ensure_columns(needed_columns)
+            target, target_cut = self._select_then_compute(cut)
 
-            val_x = variable_x.evaluate(self, cut)
-            val_y = variable_y.evaluate(self, cut)
-            wgt = weight.evaluate(self, cut)
+            val_x = variable_x.evaluate(target, target_cut)
+            val_y = variable_y.evaluate(target, target_cut)
+            wgt = weight.evaluate(target, target_cut)
+            self._record_yield(cut, weight, target, target_cut, wgt)
 
             if isinstance(val_x, (RateStruct, ProfileStruct)) or isinstance(val_y, (RateStruct, ProfileStruct)):
                 raise RuntimeError("fill_hist_2D: RateStruct/ProfileStruct variables are not supported for 2D histogram filling!")
@@ -367,11 +534,14 @@ class SingleDatasetBase(DatasetBase):
                 storage=hist.storage.Weight()
             )
 
+            flatval_x, flatwgt = flatten_for_fill(val_x, wgt)
+            flatval_y = flatten_values(val_y)
             self._H.fill(
-                ak.flatten(val_x, axis=None),
-                ak.flatten(val_y, axis=None),
-                weight=self._weight * ak.flatten(wgt, axis=None)
+                flatval_x,
+                flatval_y,
+                weight=flatwgt
             )
+            self._H *= self._weight
 
         elif isinstance(self, PrebinnedDatasetAccessProtocol):
             raise RuntimeError("fill_hist_2D: Prebinned datasets are not supported yet for 2D histogram filling!")
@@ -433,14 +603,16 @@ class DatasetComparisonBase(DatasetBase):
         raise RuntimeError("DatasetComparison.estimate_yield: Cannot estimate yield for a dataset comparison! Call estimate_yield on the individual datasets instead.")
     
     def get_unique(self, var : VariableProtocol, cut : CutProtocol) -> np.ndarray:
-        unique_values = np.unique(
-            np.concatenate([
-                self._dataset1.get_unique(var, cut), 
-                self._dataset2.get_unique(var, cut)
-            ])
+        return np.union1d(
+            self._dataset1.get_unique(var, cut), 
+            self._dataset2.get_unique(var, cut)
         )
-        return unique_values
     
+    def get_quantile_sketch(self, var : VariableProtocol, cut : CutProtocol) -> QuantileSketch:
+        sketch = self._dataset1.get_quantile_sketch(var, cut)
+        sketch += self._dataset2.get_quantile_sketch(var, cut)
+        return sketch
+
     def get_range(self, var : VariableProtocol, cut : CutProtocol) -> Tuple[Any, Any, Any, np.dtype]:
         r1 = self._dataset1.get_range(var, cut)
         r2 = self._dataset2.get_range(var, cut)
@@ -465,6 +637,9 @@ class DatasetComparisonBase(DatasetBase):
     @property
     def is_stack(self) -> bool:
         return False
+
+    def leaf_datasets(self):
+        return self._dataset1.leaf_datasets() + self._dataset2.leaf_datasets()
     
     def set_lumi(self, lumi):
         raise RuntimeError("DatasetComparison.set_lumi: Cannot set lumi on a dataset comparison! Set lumi on individual datasets instead.")
@@ -580,12 +755,15 @@ class DatasetStackBase(DatasetBase):
         self._datasets = [self._datasets[i] for i in ordered_indices]
 
     def get_unique(self, var : VariableProtocol, cut : CutProtocol) -> np.ndarray:
-        unique_values = np.unique(
-            np.concatenate(
-                [d.get_unique(var, cut) for d in self._datasets]
-            )
-        )
-        return unique_values
+        return unique_values(np.concatenate(
+            [d.get_unique(var, cut) for d in self._datasets]
+        ))
+
+    def get_quantile_sketch(self, var : VariableProtocol, cut : CutProtocol) -> QuantileSketch:
+        sketch = self._datasets[0].get_quantile_sketch(var, cut)
+        for d in self._datasets[1:]:
+            sketch += d.get_quantile_sketch(var, cut)
+        return sketch
 
     def get_range(self, var : VariableProtocol, cut : CutProtocol) -> Tuple[Any, Any, Any, np.dtype]:
 
@@ -593,7 +771,7 @@ class DatasetStackBase(DatasetBase):
         minval = np.min([r[0] for r in results])
         minval2 = np.min([r[1] for r in results])
         maxval = np.max([r[2] for r in results])
-        return (minval, minval2, maxval, results[0][0].dtype)
+        return (minval, minval2, maxval, results[0][3])
 
     @property
     def binning(self) -> ArbitraryBinning:
@@ -606,6 +784,12 @@ class DatasetStackBase(DatasetBase):
     @property
     def is_stack(self) -> bool:
         return self._showStack
+
+    def leaf_datasets(self):
+        result = []
+        for d in self._datasets:
+            result += d.leaf_datasets()
+        return result
     
     def set_lumi(self, lumi):
         raise RuntimeError("DatasetStack.set_lumi: Cannot set lumi on a dataset stack! Set lumi on individual datasets instead.")
@@ -3,6 +3,20 @@ from coffea.nanoevents import NanoEventsFactory, NanoAODSchema
 import pyarrow.parquet as pq
 import pyarrow as pa
 import pyarrow.dataset as ds
+import pyarrow.compute as pc
+import pyarrow.fs
+
+import uproot
+
+import copy
+import multiprocessing
+import os
+import posixpath
+import hashlib
+import tempfile
+import weakref
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
 
 import numpy as np
 import awkward as ak
@@ -12,12 +26,16 @@ import matplotlib.axes
 
 
 from simonplot.util.comparison import ComparisonHistStruct
+from simonplot.util.metadata import MetadataIndex, _row_group_statistics
+from simonplot.util.unique import unique_values
+from simonplot.util.evalcontext import memo_key
 from simonpy.AbitraryBinning import ArbitraryBinning
 
-from typing import List, Union, override
+from typing import Any, List, Literal, Sequence, Union, override
 
-from .DatasetBase import SingleDatasetBase, DatasetStackBase, DatasetComparisonBase
-from simonplot.typing.Protocols import BaseDatasetProtocol
+from .DatasetBase import accumulate_H, SingleDatasetBase, DatasetStackBase, DatasetComparisonBase
+from simonplot.typing.Protocols import BaseDatasetProtocol, VariableProtocol
+from simonplot.cut.Cut import NoCut
 
 class DatasetStack(DatasetStackBase):
     def __init__(self, key : str, color : str | None, label : str, datasets : list[BaseDatasetProtocol], showstack : bool = True):
@@ -41,8 +59,129 @@ class DatasetComparison(DatasetComparisonBase):
     def ylabel(self):
         return self._ylabel
     
+class _NanoEventsFile(SingleDatasetBase):
+    '''
+    NanoEvents for a single root file, with a cache of materialized columns.
+    NanoEventsDataset holds one of these per input file
+    '''
+    _transient = SingleDatasetBase._transient + ('_events', '_column_cache')
+
+    def __init__(self, fname, options):
+        self._key = ''
+        self._color = None
+        self._label = None
+
+        self._fname = fname
+        self._options = options
+
+        self._open()
+
+    def _open(self):
+        if not hasattr(self, '_events'):
+            self._events = NanoEventsFactory.from_root(
+                self._fname,
+                **self._options 
+            ).events()
+
+            self._column_cache = {}
+
+    def _lookup(self, column):
+        if '.' in column:
+            collection_name, column_name = column.rsplit('.', 1)
+            return self._events[collection_name][column_name]
+        else:
+            return self._events[column]
+        
+    def ensure_columns(self, columns):
+        self._open()
+
+        missing = [col for col in set(columns) if col not in self._column_cache]
+        if len(missing) == 0:
+            return
+
+        # materialize all the missing branches together in one pass
+        # rather than one read per variable/cut leaf in get_column()
+        arrays = ak.materialize(ak.zip(
+            {col : self._lookup(col) for col in missing},
+            depth_limit=1
+        ))
+
+        for col in missing:
+            self._column_cache[col] = arrays[col]
+
+    def get_column(self, column_name, collection_name=None):
+        if collection_name is not None:
+            column = collection_name + '.' + column_name
+        else:
+            column = column_name
+
+        self._open()
+        if column not in self._column_cache:
+            self.ensure_columns([column])
+
+        return self._column_cache[column]
+        
+    @property
+    def num_rows(self):
+        self._open()
+        return len(self._events)
+
+    def fill_with_yield(self, method, cut, weight, *args):
+        '''
+        Call fill_hist/fill_hist_2D, and return the histogram together with the yield it recorded in the ledger,
+        so that the yields of files filled in worker processes can be sent back with their histograms
+        '''
+        H = getattr(self, method)(*args)
+        return H, self._yields[self._yield_key(cut, weight)]
+
+# module-level so that they can be shipped to worker processes
+
+# per-file datasets opened in this worker process, keyed on (fname, options)
+# so that the events and materialized columns are kept between calls
+_worker_files = {}
+
+def _init_nanoevents_worker():
+    _worker_files.clear()
+
+def _worker_file(options, fname):
+    key = (repr(fname), repr(sorted(options.items())))
+    if key not in _worker_files:
+        _worker_files[key] = _NanoEventsFile(fname, options)
+    return _worker_files[key]
+
+def _call_nanoevents_file(options, attrs, method, fname, *args):
+    f = _worker_file(options, fname)
+    for attr, value in attrs.items():
+        setattr(f, attr, value)
+    return getattr(f, method)(*args)
+
+def _nanoevents_file_rows(options, fname):
+    return _worker_file(options, fname).num_rows
+
+def _merge_ranges(results):
+    # np.fmin ignores the nan min positive value of files without positive values
+    return (np.min([r[0] for r in results]), 
+            np.fmin.reduce([r[1] for r in results]), 
+            np.max([r[2] for r in results]), 
+            results[0][3])
+
 class NanoEventsDataset(SingleDatasetBase):
-    def __init__(self, key : str, color : str | None, label : str, fname, **options):
+    '''
+    fname can be a single file or a list of files making up one sample.
+
+    With executor='thread' the files are opened and read in a thread pool.
+    With executor='process' the files are never opened in this process: each histogram fill,
+    yield, and range/category/quantile lookup is instead done file-by-file in a pool of worker processes,
+    and only the per-file results are sent back. The workers keep their open files and materialized columns
+    between calls, until close() shuts the pool down (or the dataset is garbage collected).
+    Either way the per-file histograms are merged at fill time.
+    '''
+    _transient = SingleDatasetBase._transient + ('_files', '_pool', '_pool_finalizer')
+
+    def __init__(self, key : str, color : str | None, label : str, fname, 
+                 executor : Literal['thread', 'process'] = 'thread',
+                 num_workers : int | None = None,
+                 **options):
         self._key = key
         self._color = color
         self._label = label
@@ -52,82 +191,777 @@ class NanoEventsDataset(SingleDatasetBase):
 
         import coffea
         version = coffea._version.version_tuple
-        if int(version[0]) >= 2025 and int(version[1]) >= 11 and int(version[2]) >= 0:
+        if (int(version[0]), int(version[1])) >= (2025, 11):
             options['mode'] = 'virtual'
         else:
             options['delayed'] = False
 
-        self._events = NanoEventsFactory.from_root(
-            fname,
-            **options 
-        ).events()
+        self._options = options
+
+        if isinstance(fname, (list, tuple)):
+            self._fnames = list(fname)
+        else:
+            self._fnames = [fname]
+
+        if executor not in ['thread', 'process']:
+            raise ValueError("NanoEventsDataset: executor must be 'thread' or 'process', got '%s'"%executor)
+        self._executor = executor
+        self._num_workers = num_workers
+
+        if self._executor == 'thread':
+            self._open_files()
+
+    def _open_files(self):
+        # also reopens the files after unpickling, since they are not pickled
+        if hasattr(self, '_files'):
+            return
         
+        with ThreadPoolExecutor(self._num_workers) as pool:
+            self._files = list(pool.map(
+                lambda fname: _NanoEventsFile(fname, self._options), 
+                self._fnames
+            ))
+
+    def _get_pool(self):
+        if not hasattr(self, '_pool'):
+            # not forked, since the parent may already be running thread pools
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._pool = ProcessPoolExecutor(
+                self._num_workers,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_init_nanoevents_worker
+            )
+            self._pool_finalizer = weakref.finalize(self, self._pool.shutdown, wait=False, cancel_futures=True)
+        return self._pool
+
+    def close(self):
+        '''
+        Shut down the worker processes (in process mode), releasing the files they hold open.
+        A new pool is started if the dataset is used again
+        '''
+        if hasattr(self, '_pool'):
+            self._pool.shutdown()
+            self._pool_finalizer.detach()
+            del self._pool
+            del self._pool_finalizer
+
     def ensure_columns(self, columns):
-        # NanoEvents loads all columns on demand, so nothing to do here
-        pass
+        if self._executor == 'process':
+            # the worker processes read what they need for each call
+            return
+
+        self._open_files()
+        if len(self._files) == 1:
+            self._files[0].ensure_columns(columns)
+        else:
+            with ThreadPoolExecutor(self._num_workers) as pool:
+                list(pool.map(lambda f: f.ensure_columns(columns), self._files))
 
     def get_column(self, column_name, collection_name=None):
         if '.' in column_name:
             raise ValueError("NanoEventsDataset.get_column: column_name '%s' contains '.'! Instead use collection_name argument."%(column_name))
         
+        # in process mode this is the only thing which opens the files in this process
+        self._open_files()
+
+        if len(self._files) == 1:
+            return self._files[0].get_column(column_name, collection_name)
+        else:
+            return ak.concatenate([f.get_column(column_name, collection_name) for f in self._files])
+
+    def _map_files(self, method, *args):
+        '''
+        Call method on each of the per-file datasets, with this dataset's weight and bitmap indexing
+        '''
+        attrs = {'_weight' : self._weight}
+        if hasattr(self, '_bitmap_columns'):
+            attrs['_bitmap_columns'] = self._bitmap_columns
+
+        if self._executor == 'process':
+            return list(self._get_pool().map(
+                partial(_call_nanoevents_file, self._options, attrs, method),
+                self._fnames,
+                *[[arg]*len(self._fnames) for arg in args]
+            ))
+        else:
+            self._open_files()
+            def call_one(f):
+                for attr, value in attrs.items():
+                    setattr(f, attr, value)
+                return getattr(f, method)(*args)
+            
+            with ThreadPoolExecutor(self._num_workers) as pool:
+                return list(pool.map(call_one, self._files))
+        
+    def _fill_per_file(self, method, cut, weight, *args):
+        '''
+        Fill each file with method (called with args), and merge the histograms, and the yields into the ledger
+        '''
+        results = self._map_files('fill_with_yield', method, cut, weight, *args)
+
+        self._H = copy.deepcopy(results[0][0])
+        for nextH, _ in results[1:]:
+            self._H = accumulate_H(self._H, nextH)
+
+        if not hasattr(self, '_yields'):
+            self._yields = {}
+        self._yields[self._yield_key(cut, weight)] = sum(y for _, y in results)
+
+        return self._H
+
+    def fill_hist(self, variable, cut, weight, axis):
+        if len(self._fnames) == 1 and self._executor == 'thread':
+            return super().fill_hist(variable, cut, weight, axis)
+        
+        return self._fill_per_file('fill_hist', cut, weight, variable, cut, weight, axis)
+    
+    def fill_hist_2D(self, variable_x, variable_y, cut, weight, axis_x, axis_y):
+        if len(self._fnames) == 1 and self._executor == 'thread':
+            return super().fill_hist_2D(variable_x, variable_y, cut, weight, axis_x, axis_y)
+        
+        return self._fill_per_file('fill_hist_2D', cut, weight, variable_x, variable_y, cut, weight, axis_x, axis_y)
+
+    def estimate_yield(self, cut, weight):
+        if self._executor != 'process':
+            return super().estimate_yield(cut, weight)
+
+        key = self._yield_key(cut, weight)
+        if key not in getattr(self, '_yields', {}):
+            if not hasattr(self, '_yields'):
+                self._yields = {}
+            self._yields[key] = sum(self._map_files('estimate_yield', cut, weight))
+        return self._yields[key]
+
+    def get_range(self, var, cut):
+        if self._executor != 'process':
+            return super().get_range(var, cut)
+        
+        return _merge_ranges(self._map_files('get_range', var, cut))
+
+    def get_unique(self, var, cut):
+        if self._executor != 'process':
+            return super().get_unique(var, cut)
+
+        return unique_values(np.concatenate(self._map_files('get_unique', var, cut)))
+
+    def get_quantile_sketch(self, var, cut):
+        if self._executor != 'process':
+            return super().get_quantile_sketch(var, cut)
+
+        sketches = self._map_files('get_quantile_sketch', var, cut)
+        for sketch in sketches[1:]:
+            sketches[0] += sketch
+        return sketches[0]
+
+    @property
+    def num_rows(self):
+        if self._executor == 'process':
+            # counted in the workers, without opening the files here
+            if not hasattr(self, '_num_rows'):
+                self._num_rows = sum(self._get_pool().map(
+                    partial(_nanoevents_file_rows, self._options),
+                    self._fnames
+                ))
+            return self._num_rows
+
+        self._open_files()
+        return sum(f.num_rows for f in self._files)
+    
+    @property
+    def files(self):
+        return self._fnames
+
+    def leaf_datasets(self):
+        # in process mode the worker processes evaluate the cuts themselves
+        return [] if self._executor == 'process' else [self]
+
+    def file_datasets(self):
+        if self._executor == 'process' or len(self._fnames) == 1:
+            return []
+
+        self._open_files()
+        return list(self._files)
+    
+class UprootTreeDataset(SingleDatasetBase):
+    '''
+    Lightweight reader for flat or jagged ROOT ntuples, without the NanoEvents schema machinery.
+
+    All branches requested in one ensure_columns() call are read together
+    in a single uproot.iterate() pass over all the files.
+    Collection-prefixed column names (eg 'Track.pt') are mapped onto 
+    branch names by replacing the '.' with collection_separator (eg 'Track_pt')
+    '''
+    _transient = SingleDatasetBase._transient + ('_columns', '_decompression_executor')
+
+    def __init__(self, key : str, color : str | None, label : str, 
+                 fnames : str | Sequence[str], 
+                 treename : str = 'Events',
+                 step_size : int | str = '100 MB',
+                 decompression_executor : Any = None,
+                 num_workers : int | None = None,
+                 collection_separator : str = '_',
+                 **options):
+        self._key = key
+        self._color = color
+        self._label = label
+
+        if isinstance(fnames, str):
+            fnames = [fnames]
+        self._fnames = list(fnames)
+        self._treename = treename
+
+        self._step_size = step_size
+        if decompression_executor is None and num_workers is not None:
+            decompression_executor = uproot.ThreadPoolExecutor(num_workers)
+        self._decompression_executor = decompression_executor
+        self._num_workers = num_workers
+        self._collection_separator = collection_separator
+        self._options = options
+
+        self._columns = {}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._columns = {}
+        # executors don't pickle. Rebuild the one we made ourselves
+        if self._num_workers is not None:
+            self._decompression_executor = uproot.ThreadPoolExecutor(self._num_workers)
+        else:
+            self._decompression_executor = None
+
+    def _branch_name(self, column : str) -> str:
+        return column.replace('.', self._collection_separator)
+
+    def ensure_columns(self, columns):
+        missing = [col for col in columns if col not in self._columns]
+        if len(missing) == 0:
+            return
+        
+        branches = {self._branch_name(col) : col for col in missing}
+
+        chunks = list(uproot.iterate(
+            {fname : self._treename for fname in self._fnames},
+            filter_name = list(branches.keys()),
+            step_size = self._step_size,
+            decompression_executor = self._decompression_executor,
+            interpretation_executor = self._decompression_executor,
+            library = 'ak',
+            **self._options
+        ))
+
+        if len(chunks) == 0:
+            raise RuntimeError("UprootTreeDataset.ensure_columns: no entries found in tree '%s'!"%self._treename)
+        elif len(chunks) == 1:
+            arrays = chunks[0]
+        else:
+            arrays = ak.concatenate(chunks)
+
+        for branch, col in branches.items():
+            if branch not in arrays.fields:
+                raise RuntimeError("UprootTreeDataset.ensure_columns: branch '%s' (for column '%s') not found in tree '%s'!"%(branch, col, self._treename))
+            self._columns[col] = arrays[branch]
+
+    def get_column(self, column_name, collection_name=None):
         if collection_name is not None:
-            return ak.materialize(self._events[collection_name][column_name])
+            column = collection_name + '.' + column_name
         else:
-            return ak.materialize(self._events[column_name])
+            column = column_name
+
+        if column not in self._columns:
+            raise RuntimeError("Column %s not loaded! Call ensure_columns() first"%column)
         
+        return self._columns[column]
+
     @property
     def num_rows(self):
-        return len(self._events)
+        if len(self._columns) > 0:
+            return len(next(iter(self._columns.values())))
+        
+        if not hasattr(self, '_num_rows'):
+            self._num_rows = 0
+            for fname in self._fnames:
+                with uproot.open(fname) as f:
+                    self._num_rows += f[self._treename].num_entries
+
+        return self._num_rows
     
+    @property
+    def files(self):
+        return self._fnames
+
+def _leaf_paths(pqschema, column, fname):
+    '''
+    Parquet leaf paths for a logical column name, in the given parquet schema
+    eg 'Track.pt' -> ['Track.list.element.pt'] for a list<struct<pt, ...>> column
+    '''
+    paths = []
+    for i in range(len(pqschema)):
+        path = pqschema.column(i).path
+        logical = [part for part in path.split('.') if part not in ['list', 'item', 'element']]
+        if '.'.join(logical[:column.count('.')+1]) == column:
+            paths.append(path)
+
+    if len(paths) == 0:
+        raise RuntimeError("ParquetDataset: column %s not found in parquet schema of %s!"%(column, fname))
+    return paths
+
+def _arrow_to_column(thecol):
+    if pa.types.is_nested(thecol.type):
+        return ak.from_arrow(thecol)
+    else:
+        return thecol.to_numpy()
+
 class ParquetDataset(SingleDatasetBase):
-    def __init__(self, key : str, color : str | None, label : str, path, filesystem=None):
+    _transient = SingleDatasetBase._transient + ('_table', '_loaded_columns', '_collections', '_file_infos', '_resolved_filesystem', '_resolved_path', '_file_metadata', '_sidecar_columns', '_fingerprint')
+
+    def __init__(self, key : str, color : str | None, label : str, path, filesystem=None,
+                 metadata_index : MetadataIndex | str | bool | None = None,
+                 genweight_column : str | None = None,
+                 partitioning : Any = None):
+        '''
+        metadata_index: if given, file schemas, row counts, row-group statistics and generator weight sums 
+            are read from (and cached in) this index, rather than from the parquet files themselves.
+            True uses the index at config['metadata_index']['path'], a string is a path to an index file
+        genweight_column: if given, MC normalization uses the sum of this column rather than the number of rows
+        partitioning: passed to pyarrow.dataset.dataset (eg 'hive'), so that partition keys can be read as columns
+        '''
         self._key = key
         self._color = color
         self._label = label
 
-        self._dataset = ds.dataset(path, format="parquet", filesystem=filesystem)
+        self._path = path
+        self._filesystem = filesystem
+        self._genweight_column = genweight_column
+        self._partitioning = partitioning
+
+        if metadata_index is None or metadata_index is False:
+            self._metadata_index = None
+            self._dataset = ds.dataset(path, format="parquet", filesystem=filesystem, partitioning=partitioning)
+        elif metadata_index is True:
+            self._metadata_index = MetadataIndex.open()
+        elif isinstance(metadata_index, str):
+            self._metadata_index = MetadataIndex.open(metadata_index)
+        else:
+            self._metadata_index = metadata_index
+
+    def _get_dataset(self):
+        if not hasattr(self, '_dataset'):
+            if self._partitioning is None:
+                #explicit file list and schema, so that pyarrow doesn't need to touch the files
+                self._dataset = ds.dataset(self.files, schema=self.schema, format="parquet", filesystem=self.filesystem)
+            else:
+                # the partition fields are not in the file schemas, so pyarrow has to discover the schema
+                self._dataset = ds.dataset(self.files, format="parquet", filesystem=self.filesystem,
+                                           partitioning=self._partitioning, partition_base_dir=self._resolved_path)
+        return self._dataset
+
+    def _get_file_infos(self):
+        '''
+        Listing of the dataset files, with the size and modification time needed for the index fingerprints
+        Mirrors pyarrow dataset discovery: recursive, ignoring files starting with '_' or '.'
+        '''
+        if not hasattr(self, '_file_infos'):
+            if self._filesystem is not None:
+                filesystem = self._filesystem
+                paths = self._path
+            elif isinstance(self._path, str) and '://' in self._path:
+                filesystem, paths = pa.fs.FileSystem.from_uri(self._path)
+            else:
+                filesystem = pa.fs.LocalFileSystem()
+                if isinstance(self._path, str):
+                    paths = os.path.abspath(self._path)
+                else:
+                    paths = [os.path.abspath(p) for p in self._path]
+
+            if isinstance(paths, str):
+                info = filesystem.get_file_info(paths)
+                if info.type == pa.fs.FileType.Directory:
+                    infos = filesystem.get_file_info(pa.fs.FileSelector(paths, recursive=True))
+                    infos = [i for i in infos if i.type == pa.fs.FileType.File and not any(
+                        part.startswith(('_', '.')) for part in posixpath.relpath(i.path, paths).split('/')
+                    )]
+                    infos = sorted(infos, key=lambda i: i.path)
+                elif info.type == pa.fs.FileType.File:
+                    infos = [info]
+                else:
+                    raise RuntimeError("ParquetDataset: path %s not found!"%paths)
+            else:
+                infos = filesystem.get_file_info(list(paths))
+
+            self._resolved_filesystem = filesystem
+            self._resolved_path = paths if isinstance(paths, str) else None
+            self._file_infos = infos
+        return self._file_infos
+
+    def _get_file_metadata(self):
+        if not hasattr(self, '_file_metadata'):
+            self._file_metadata = self._metadata_index.lookup(self._get_file_infos(), self.filesystem) # pyright: ignore[reportOptionalMemberAccess]
+        return self._file_metadata
             
     def ensure_columns(self, columns):
         has_everything = True
         if hasattr(self, '_table'):
             for col in columns:
-                if col not in self._table.column_names:
+                if col not in self._loaded_columns:
                     has_everything = False
                     break
         else:
             has_everything = False
 
         if not has_everything:
-            self._table = self._dataset.to_table(columns=columns)
+            if any('.' in col for col in columns):
+                self._table = self._read_nested(columns)
+            else:
+                self._table = self._get_dataset().to_table(columns=columns)
+
+            self._loaded_columns = set(columns)
+            self._collections = {}
+
+            # the files may have changed since the last load
+            if hasattr(self, '_fingerprint'):
+                del self._fingerprint
+            if hasattr(self, '_unique_cache'):
+                del self._unique_cache
+
+    def _read_nested(self, columns):
+        # pyarrow.dataset cannot project into list<struct> columns, 
+        # so read fragment-by-fragment, selecting just the needed parquet leaves of each file
+        # all fields of one collection end up in one struct column, sharing the list offsets
+        # partition keys (which are not in the files) are added from each fragment's partition expression
+        dataset = self._get_dataset()
+        partition_fields = [name for name in dataset.schema.names if name in columns and '.' not in name]
+
+        tables = []
+        for fragment in dataset.get_fragments():
+            pqfile = pq.ParquetFile(fragment.path, filesystem=self.filesystem)
+            keys = ds.get_partition_keys(fragment.partition_expression)
+
+            leaves = []
+            for col in columns:
+                if col not in keys:
+                    leaves += _leaf_paths(pqfile.schema, col, fragment.path)
+            table = pqfile.read(columns=leaves)
+
+            for name in partition_fields:
+                if name in keys:
+                    value = pa.scalar(keys[name], type=dataset.schema.field(name).type)
+                    table = table.append_column(name, pa.repeat(value, table.num_rows))
+            tables.append(table)
+
+        return pa.concat_tables(tables)
     
     def get_column(self, column_name, collection_name=None):
-        if collection_name is not None:
-            raise NotImplementedError("ParquetDataset does not support collection_name argument")
-        
         if not hasattr(self, '_table'):
             raise RuntimeError("ParquetDataset.ensure_columns must be called before get_column")
         
-        if column_name not in self._table.column_names:
-            raise RuntimeError("Column %s not loaded! Call ensure_columns() first"%column_name)
+        if collection_name is not None:
+            column = collection_name + '.' + column_name
+        else:
+            column = column_name
+
+        if column not in self._loaded_columns:
+            raise RuntimeError("Column %s not loaded! Call ensure_columns() first"%column)
+
+        if collection_name is not None:
+            # convert each collection to awkward only once
+            # fields taken from it are views sharing the same offsets
+            if collection_name not in self._collections:
+                self._collections[collection_name] = ak.from_arrow(self._table[collection_name])
+            return self._collections[collection_name][column_name]
+        
+        return _arrow_to_column(self._table[column_name])
+
+    def _unique_column_values(self, column):
+        # pc.unique is a hash table pass in arrow, rather than a sort
+        # dictionary-encoded columns only need the dictionary entries that are actually used
+        thecol = self._table[column]
+        if pa.types.is_nested(thecol.type):
+            return None
+
+        if pa.types.is_dictionary(thecol.type):
+            chunks = [chunk.dictionary.take(pc.unique(chunk.indices).drop_null()) for chunk in thecol.chunks]
+            values = pa.chunked_array(chunks, type=thecol.type.value_type)
+        else:
+            values = thecol
+
+        values = pc.unique(values).drop_null().to_numpy()
+        if values.dtype == object:
+            return None
+        return unique_values(values)
+
+    def _sidecar_dir(self):
+        return posixpath.join(posixpath.commonpath([posixpath.dirname(f) for f in self.files]), '_sidecars')
+
+    def _sidecar_path(self, variable):
+        # keyed on the full definition of the variable, since variable keys are not unique
+        defhash = hashlib.sha1(repr(memo_key(variable)).encode()).hexdigest()[:16]
+        return posixpath.join(self._sidecar_dir(), '%s-%s.parquet'%(defhash, self.fingerprint))
+
+    @property
+    def fingerprint(self):
+        '''
+        Hash of the path, size and modification time of every file in the dataset,
+        recomputed whenever the table is (re)loaded
+        '''
+        if not hasattr(self, '_fingerprint'):
+            h = hashlib.sha1()
+            for info in self.filesystem.get_file_info(self.files):
+                h.update(('%s|%s|%s\n'%(info.path, info.size, info.mtime_ns)).encode())
+            self._fingerprint = h.hexdigest()[:16]
+        return self._fingerprint
+
+    def write_sidecar(self, variable : VariableProtocol, overwrite : bool = False) -> str:
+        '''
+        Evaluate variable over the whole dataset (no cut) and store the values 
+        in a parquet sidecar file in the _sidecars/ directory next to the dataset.
+        Sidecars are keyed by the variable definition and dataset fingerprint, so they are not reused if either changes
+
+        Returns the path to the sidecar
+        '''
+        path = self._sidecar_path(variable)
+        if not overwrite and self.filesystem.get_file_info(path).type == pa.fs.FileType.File:
+            return path
+
+        # evaluate on a shallow copy, so that the currently loaded table is left alone
+        raw = copy.copy(self)
+        for attr in ['_table', '_loaded_columns', '_collections']:
+            raw.__dict__.pop(attr, None)
+        raw.ensure_columns(variable.columns)
+        values = variable.evaluate(raw, NoCut())
+
+        if isinstance(values, np.ndarray):
+            values = pa.array(values)
+        elif isinstance(values, ak.Array):
+            values = ak.to_arrow(values, extensionarray=False)
+        else:
+            raise RuntimeError("ParquetDataset.write_sidecar: cannot store values of type %s for variable %s"%(type(values), variable.key))
+
+        table = pa.table({'values' : values}).replace_schema_metadata({
+            'simonplot.key' : variable.key,
+            'simonplot.fingerprint' : self.fingerprint
+        })
+
+        self.filesystem.create_dir(self._sidecar_dir(), recursive=True)
+        tmppath = path + '.tmp-%d'%os.getpid()
+        pq.write_table(table, tmppath, filesystem=self.filesystem)
+        self.filesystem.move(tmppath, path)
+
+        return path
+
+    def get_sidecar_column(self, variable : VariableProtocol):
+        '''
+        Values of variable over the whole dataset (no cut), read from the sidecar
+        The sidecar is written first if it doesn't exist yet
+        '''
+        if not hasattr(self, '_sidecar_columns'):
+            self._sidecar_columns = {}
+
+        # keyed on the sidecar path, which changes with the variable definition and the dataset fingerprint
+        path = self._sidecar_path(variable)
+        if path not in self._sidecar_columns:
+            self.write_sidecar(variable)
+            table = pq.read_table(path, filesystem=self.filesystem)
+            self._sidecar_columns[path] = _arrow_to_column(table['values'])
+
+        return self._sidecar_columns[path]
+
+    def list_sidecars(self) -> List[dict]:
+        '''
+        All sidecars next to this dataset, as dicts with keys
+        'path', 'key', 'fingerprint', 'size', and 'current' (whether the sidecar matches the current dataset files)
+        '''
+        infos = self.filesystem.get_file_info(pa.fs.FileSelector(self._sidecar_dir(), allow_not_found=True))
 
-        return self._table[column_name].to_numpy()
+        result = []
+        for info in infos:
+            if not info.path.endswith('.parquet'):
+                continue
+
+            metadata = pq.read_schema(info.path, filesystem=self.filesystem).metadata or {}
+            fingerprint = metadata.get(b'simonplot.fingerprint', b'').decode()
+            result.append({
+                'path' : info.path,
+                'key' : metadata.get(b'simonplot.key', b'').decode(),
+                'fingerprint' : fingerprint,
+                'size' : info.size,
+                'current' : fingerprint == self.fingerprint
+            })
+        return result
+
+    def prune_sidecars(self, keys : Sequence[str] | None = None) -> int:
+        '''
+        Delete sidecars which don't match the current dataset files
+        If keys is given, also delete the current sidecars for those variable keys
+
+        Returns the number of sidecars deleted
+        '''
+        removed = 0
+        for sidecar in self.list_sidecars():
+            if not sidecar['current'] or (keys is not None and sidecar['key'] in keys):
+                self.filesystem.delete_file(sidecar['path'])
+                if hasattr(self, '_sidecar_columns'):
+                    self._sidecar_columns.pop(sidecar['path'], None)
+                removed += 1
+        return removed
     
+    def share(self, columns : Sequence[str], scratch_dir : str | None = None) -> "SharedMemoryDataset":
+        '''
+        Load columns once and write them to a memory-mapped Arrow IPC scratch file
+        Returns a lightweight SharedMemoryDataset handle which can be cheaply pickled to worker processes,
+        where get_column returns zero-copy views of the shared file
+
+        scratch_dir defaults to /dev/shm (ie RAM) where available
+        The caller is responsible for calling unlink() on the returned handle when all workers are done
+        '''
+        self.ensure_columns(columns)
+
+        if scratch_dir is None:
+            scratch_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+        fd, ipc_path = tempfile.mkstemp(prefix='simonplot-%s-'%self._key, suffix='.arrow', dir=scratch_dir)
+        os.close(fd)
+
+        # single-chunk columns, so that to_numpy() in the workers is zero-copy
+        table = self._table.combine_chunks()
+        with pa.OSFile(ipc_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        shared = SharedMemoryDataset(self._key, self._color, self._label, ipc_path, list(self._loaded_columns))
+        for attr in ['_lumi', '_xsec', '_isMC', '_weight']:
+            if hasattr(self, attr):
+                setattr(shared, attr, getattr(self, attr))
+        if getattr(self, '_isMC', False):
+            shared.override_num_events(self.num_events)
+
+        return shared
+
     @property
     def num_rows(self):
         if hasattr(self, '_table'):
             return self._table.num_rows
+        elif self._metadata_index is not None:
+            return sum(md['num_rows'] for md in self._get_file_metadata())
         else:
             return self._dataset.count_rows()
+
+    @property
+    def num_events(self):
+        if hasattr(self, '_override_nevts') and self._override_nevts is not None:
+            return self._override_nevts
+        elif self._genweight_column is not None:
+            return self.sum_genweight
+        else:
+            return self.num_rows
     
     #extra properties for parquetdatasets for utility
+    @property
+    def sum_genweight(self):
+        if self._genweight_column is None:
+            raise RuntimeError("ParquetDataset.sum_genweight: no genweight_column specified!")
+
+        if not hasattr(self, '_sum_genweight'):
+            if self._metadata_index is not None:
+                self._sum_genweight = sum(self._metadata_index.sum_genweight(self._get_file_infos(), self.filesystem, self._genweight_column))
+            else:
+                table = self._dataset.to_table(columns=[self._genweight_column])
+                self._sum_genweight = pc.sum(table[self._genweight_column]).as_py()
+        return self._sum_genweight
+
+    @property
+    def row_group_statistics(self):
+        '''
+        Per-file list of row groups, each with 'num_rows' and per-column 'min', 'max', 'null_count'
+        '''
+        if self._metadata_index is not None:
+            return self._metadata_index.row_group_statistics(self._get_file_infos(), self.filesystem)
+        else:
+            return [_row_group_statistics(pq.ParquetFile(fname, filesystem=self.filesystem).metadata) for fname in self.files]
+
     @property
     def files(self):
-        return self._dataset.files
+        if self._metadata_index is not None:
+            return [info.path for info in self._get_file_infos()]
+        else:
+            return self._dataset.files
     
     @property 
     def filesystem(self):
-        return self._dataset.filesystem
+        if self._metadata_index is not None:
+            self._get_file_infos()
+            return self._resolved_filesystem
+        else:
+            return self._dataset.filesystem
+    
+    @property
+    def schema(self):
+        if self._metadata_index is not None:
+            return self._get_file_metadata()[0]['schema']
+        else:
+            return self._dataset.schema
+
+class SharedMemoryDataset(ParquetDataset):
+    '''
+    Handle to columns loaded once by a parent process into a memory-mapped Arrow IPC file (see ParquetDataset.share())
+    Pickles to just the file path and dataset definition. 
+    The file is mapped on first use, so get_column returns zero-copy views and all workers share the same pages
+    '''
+    _transient = SingleDatasetBase._transient + ('_table', '_collections')
+
+    def __init__(self, key : str, color : str | None, label : str, ipc_path : str, columns : Sequence[str]):
+        self._key = key
+        self._color = color
+        self._label = label
+
+        self._ipc_path = ipc_path
+        self._loaded_columns = set(columns)
+
+        self._metadata_index = None
+        self._genweight_column = None
+
+    def _open(self):
+        if not hasattr(self, '_table'):
+            source = pa.memory_map(self._ipc_path, 'r')
+            self._table = pa.ipc.open_file(source).read_all()
+            self._collections = {}
+
+    def ensure_columns(self, columns):
+        missing = [col for col in columns if col not in self._loaded_columns]
+        if len(missing) > 0:
+            raise RuntimeError("SharedMemoryDataset.ensure_columns: columns %s were not shared by the parent process!"%missing)
+        
+        self._open()
+
+    def get_column(self, column_name, collection_name=None):
+        self._open()
+        return super().get_column(column_name, collection_name)
+
+    def get_sidecar_column(self, variable):
+        # no sidecars for the scratch file, just evaluate from the shared columns
+        self.ensure_columns(variable.columns)
+        return variable.evaluate(self, NoCut())
+
+    def unlink(self):
+        '''
+        Remove the scratch file. Workers which already mapped it keep working until they release it
+        '''
+        if os.path.exists(self._ipc_path):
+            os.remove(self._ipc_path)
+
+    @property
+    def num_rows(self):
+        self._open()
+        return self._table.num_rows
+
+    @property
+    def files(self):
+        return [self._ipc_path]
     
+    @property
+    def filesystem(self):
+        return pa.fs.LocalFileSystem()
+
     @property
     def schema(self):
-        return self._dataset.schema
\ No newline at end of file
+        self._open()
+        return self._table.schema
@@ -1,4 +1,4 @@
-from .Datasets import NanoEventsDataset, ParquetDataset, DatasetStack, DatasetComparison
+from .Datasets import NanoEventsDataset, UprootTreeDataset, ParquetDataset, SharedMemoryDataset, DatasetStack, DatasetComparison
 from .PrebinnedDatasets import ValCovPairDataset, CovmatDataset, PrebinnedRootHistogramDataset, ValNoCovDataset, TransferMatrixDataset, CovNoValDataset
 from .PlotStuff import LineSpec, PointSpec
 
@@ -8,6 +8,8 @@ __all__ = [
     "NanoEventsDataset",
     "DatasetStack",
     "ParquetDataset",
+    "SharedMemoryDataset",
+    "UprootTreeDataset",
     "LineSpec",
     "PointSpec",
     "DatasetComparison",
@@ -0,0 +1,86 @@
+'''
+The repository is the simonplot package itself, so when it isn't installed
+(or on the path under the name simonplot), import it from this checkout,
+through a symlink named simonplot on sys.path (which worker processes inherit)
+'''
+
+import importlib.util
+import os
+import sys
+import tempfile
+
+import numpy as np
+import awkward as ak
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+if importlib.util.find_spec('simonplot') is None:
+    _root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    _linkdir = tempfile.mkdtemp(prefix='simonplot-tests-')
+    os.symlink(_root, os.path.join(_linkdir, 'simonplot'))
+    sys.path.insert(0, _linkdir)
+
+@pytest.fixture
+def nanoevents_files(tmp_path):
+    '''
+    Two NanoAOD-like files (30 and 20 events), as {path : treename} dicts
+    '''
+    uproot = pytest.importorskip('uproot')
+    ak = pytest.importorskip('awkward')
+    pytest.importorskip('coffea')
+
+    files = []
+    rng = np.random.default_rng(0)
+    for i, nevents in enumerate([30, 20]):
+        path = tmp_path / ('nano%d.root'%i)
+        ntrack = rng.integers(0, 4, nevents)
+        branches = {
+            'run' : np.ones(nevents, dtype=np.uint32),
+            'luminosityBlock' : np.ones(nevents, dtype=np.uint32),
+            'event' : np.arange(nevents, dtype=np.uint64),
+            'Track' : ak.zip({
+                'pt' : ak.unflatten(rng.uniform(0, 50, ntrack.sum()).astype(np.float32), ntrack),
+                'eta' : ak.unflatten(rng.uniform(-2, 2, ntrack.sum()).astype(np.float32), ntrack),
+            }),
+            'Vtx_z' : rng.uniform(-10, 10, nevents).astype(np.float32),
+        }
+        with uproot.recreate(path) as f:
+            f.mktree('Events', {name : array.type if isinstance(array, ak.Array) else array.dtype for name, array in branches.items()},
+                     counter_name=lambda c: 'n'+c, field_name=lambda o, f: o+'_'+f)
+            f['Events'].extend(branches)
+        files.append({str(path) : 'Events'})
+    return files
+
+@pytest.fixture
+def columnar_dataset(tmp_path):
+    '''
+    Parquet dataset with flat per-event columns (x, y, w, channel) and a Jet collection
+    '''
+    from simonplot.plottables import ParquetDataset
+
+    rng = np.random.default_rng(0)
+    n = 5000
+    counts = rng.integers(0, 4, n)
+    jets = ak.zip({'pt' : ak.unflatten(rng.uniform(0, 100, counts.sum()), counts)})
+    pq.write_table(pa.table({
+        'x' : rng.normal(0, 1, n),
+        'y' : rng.normal(0, 1, n),
+        'w' : rng.uniform(0.5, 2, n),
+        'channel' : rng.integers(0, 4, n),
+        'Jet' : ak.to_arrow(jets, extensionarray=False),
+    }), tmp_path / 'd.parquet')
+    return ParquetDataset('d', None, 'd', str(tmp_path / 'd.parquet'))
+
+@pytest.fixture
+def disable_optimizations(monkeypatch):
+    '''
+    Call to turn off select-then-compute, cut reordering and short-circuiting
+    '''
+    from simonplot.config import config
+
+    def disable():
+        monkeypatch.setitem(config['select_then_compute'], 'enabled', False)
+        monkeypatch.setitem(config['cut_ordering'], 'short_circuit', False)
+        monkeypatch.setitem(config['cut_ordering'], 'reorder', False)
+    return disable
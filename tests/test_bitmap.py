@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from simonplot.util.bitmap import BitmapIndex, unpack_bitmap
+
+@pytest.mark.parametrize('num_rows', [0, 1, 7, 8, 13, 1000, 100003])
+def test_equals_matches_comparison(num_rows):
+    rng = np.random.default_rng(num_rows)
+    values = rng.integers(0, 40, num_rows)
+    values[:3] = 1000 # a rare value, kept as row indices
+
+    index = BitmapIndex(values)
+    assert index.num_rows == num_rows
+    assert np.array_equal(index.values, np.unique(values))
+    for value in list(np.unique(values)) + [12345]:
+        mask = unpack_bitmap(index.equals(value), num_rows)
+        assert np.array_equal(mask, values == value)
+
+def test_bitwise_combinations():
+    values = np.arange(1001) % 7
+    index = BitmapIndex(values)
+
+    both = np.bitwise_or(index.equals(2), index.equals(5))
+    assert np.array_equal(unpack_bitmap(both, len(values)), (values == 2) | (values == 5))
+
+    neither = np.bitwise_and(index.equals(2), index.equals(5))
+    assert not np.any(unpack_bitmap(neither, len(values)))
+
+def test_size_is_bounded_for_high_cardinality():
+    num_rows = 100000
+    values = np.arange(num_rows) % 5000
+    index = BitmapIndex(values)
+
+    # one full bitmap per value would take 5000 * num_rows/8 bytes
+    assert index.nbytes <= 4 * num_rows
+    assert np.array_equal(unpack_bitmap(index.equals(1234), num_rows), values == 1234)
+
+def test_boolean_values():
+    values = np.array([True, False, False, True, True])
+    index = BitmapIndex(values)
+    assert np.array_equal(unpack_bitmap(index.equals(True), len(values)), values)
+    assert np.array_equal(unpack_bitmap(index.equals(False), len(values)), ~values)
@@ -0,0 +1,58 @@
+import numpy as np
+import awkward as ak
+import pytest
+
+from simonplot.plottables.CompactedView import CompactedView
+from simonplot.variable import BasicVariable, ConstantVariable, SumVariable, ProductVariable
+from simonplot.cut import GreaterThanCut, LessThanCut, EqualsCut, TwoSidedCut, AndCuts, OrCuts, NoCut
+from simonplot.binning import BasicBinning
+
+def _fill(dataset, variable, cut):
+    weight = BasicVariable('w')
+    H = dataset.fill_hist(variable, cut, weight, BasicBinning(20, -5, 100).build_axis(variable))
+    return H.values(), H.variances(), dataset.estimate_yield(cut, weight)
+
+CUTS = [
+    GreaterThanCut('x', 1.5),
+    AndCuts([GreaterThanCut('x', 0.5), LessThanCut('y', -0.5), EqualsCut('channel', 2)]),
+    OrCuts([GreaterThanCut('x', 2.5), LessThanCut('y', -2.5), TwoSidedCut('x', -0.1, 0.1)]),
+    AndCuts([GreaterThanCut('x', 1.0), OrCuts([LessThanCut('y', -1), GreaterThanCut('y', 1)])]),
+    AndCuts([NoCut(), GreaterThanCut('x', 1.0), GreaterThanCut('y', 0.0)]),
+]
+
+VARIABLES = [
+    BasicVariable('x'),
+    SumVariable('x', ProductVariable('y', ConstantVariable(2.0))),
+    BasicVariable('Jet.pt'),
+    SumVariable('Jet.pt', 'x'),
+]
+
+@pytest.mark.parametrize('cut', CUTS, ids=lambda cut: cut.key)
+@pytest.mark.parametrize('variable', VARIABLES, ids=lambda variable: variable.key)
+def test_matches_full_evaluation(columnar_dataset, disable_optimizations, cut, variable):
+    dataset = columnar_dataset
+    dataset.enable_bitmap_index(['channel'])
+
+    # evaluate a few times, so that the sub-cuts get reordered
+    results = [_fill(dataset, variable, cut) for _ in range(3)]
+
+    disable_optimizations()
+    del dataset._yields
+    expected = _fill(dataset, variable, cut)
+    for result in results:
+        for got, want in zip(result, expected):
+            assert np.allclose(got, want)
+
+def test_view_gathers_only_used_columns(columnar_dataset):
+    dataset = columnar_dataset
+    dataset.ensure_columns(['x', 'y', 'w', 'Jet.pt'])
+    rows = np.array([3, 1, 4])
+    view = CompactedView(dataset, rows)
+
+    assert np.array_equal(view.get_column('x'), dataset.get_column('x')[rows])
+    assert ak.to_list(view.get_column('pt', 'Jet')) == ak.to_list(dataset.get_column('pt', 'Jet')[rows])
+    assert set(view._columns) == {('x', None), ('pt', 'Jet')}
+    assert view.num_rows == 3
+
+    # the view shares the dataset's converted collections rather than copying the table
+    assert 'Jet' in dataset._collections
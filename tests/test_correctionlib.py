@@ -0,0 +1,61 @@
+import numpy as np
+import awkward as ak
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+correctionlib = pytest.importorskip('correctionlib')
+import correctionlib.schemav2 as cs
+
+from simonplot.plottables import ParquetDataset
+from simonplot.variable import CorrectionlibVariable
+from simonplot.cut import NoCut, GreaterThanCut
+
+@pytest.fixture
+def dataset(tmp_path):
+    table = pa.table({
+        'MET' : [10.0, 60.0, 70.0, 5.0],
+        'Jet' : [[{'pt' : 1.0, 'eta' : 0.5}, {'pt' : 2.0, 'eta' : 1.0}], [], [{'pt' : 3.0, 'eta' : 0.0}], [{'pt' : 4.0, 'eta' : 2.0}]],
+        'Muon' : [[{'pt' : 100.0, 'eta' : 1.0}], [{'pt' : 200.0, 'eta' : 0.0}], [], [{'pt' : 300.0, 'eta' : 2.0}, {'pt' : 400.0, 'eta' : 3.0}]],
+    })
+    pq.write_table(table, tmp_path / 'data.parquet')
+    return ParquetDataset('d', None, 'd', str(tmp_path / 'data.parquet'))
+
+@pytest.fixture
+def correction(tmp_path):
+    # f(x, y) = 2x + y
+    c = cs.Correction(
+        name='f', version=1, 
+        inputs=[cs.Variable(name='x', type='real'), cs.Variable(name='y', type='real')],
+        output=cs.Variable(name='w', type='real'), 
+        data=cs.Formula(nodetype='formula', expression='2*x+y', parser='TFormula', variables=['x', 'y'])
+    )
+    path = tmp_path / 'corr.json'
+    path.write_text(cs.CorrectionSet(schema_version=2, corrections=[c]).model_dump_json())
+    return str(path)
+
+def test_jagged_and_per_event_arguments(dataset, correction):
+    var = CorrectionlibVariable(['Jet.pt', 'MET'], correction, 'f')
+    dataset.ensure_columns(var.columns)
+
+    result = var.evaluate(dataset, GreaterThanCut('MET', 50))
+    assert ak.to_list(result) == [[], [2*3.0 + 70.0]]
+
+def test_results_follow_collection_name(dataset, correction):
+    var = CorrectionlibVariable(['Jet.pt', 'Jet.eta'], correction, 'f')
+    dataset.ensure_columns(['Jet.pt', 'Jet.eta', 'Muon.pt', 'Muon.eta'])
+
+    jets = var.evaluate(dataset, NoCut())
+    var.set_collection_name('Muon')
+    muons = var.evaluate(dataset, NoCut())
+
+    assert ak.to_list(jets) == [[2.5, 5.0], [], [6.0], [10.0]]
+    assert ak.to_list(muons) == [[201.0], [400.0], [], [602.0, 803.0]]
+
+def test_results_follow_data(dataset, correction):
+    var = CorrectionlibVariable(['MET', 'MET'], correction, 'f')
+    dataset.ensure_columns(['MET'])
+    assert np.allclose(var.evaluate(dataset, NoCut()), [30.0, 180.0, 210.0, 15.0])
+
+    dataset._table = dataset._table.set_column(0, 'MET', pa.array([1.0, 2.0, 3.0, 4.0]))
+    assert np.allclose(var.evaluate(dataset, NoCut()), [3.0, 6.0, 9.0, 12.0])
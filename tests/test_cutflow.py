@@ -0,0 +1,108 @@
+import pickle
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from simonplot.plottables import ParquetDataset, DatasetStack, DatasetComparison, NanoEventsDataset
+from simonplot.variable import BasicVariable, ConstantVariable
+from simonplot.cut import GreaterThanCut, LessThanCut, TwoSidedCut, AndCuts, NoCut
+from simonplot.binning import BasicBinning
+from simonplot.drivers import cutflow
+
+WEIGHT = ConstantVariable(1.0)
+BINNING = BasicBinning(10, -5, 5)
+
+def _parquet(tmp_path, name, seed):
+    rng = np.random.default_rng(seed)
+    pq.write_table(pa.table({
+        'x' : rng.normal(0, 2, 1000),
+        'y' : rng.normal(0, 2, 1000),
+        'z' : rng.normal(0, 2, 1000),
+    }), tmp_path / ('%s.parquet'%name))
+    return ParquetDataset(name, None, name, str(tmp_path / ('%s.parquet'%name)))
+
+def _check(cf, cuts, datasets):
+    N = len(cuts)
+    for j, dataset in enumerate(datasets):
+        for i in range(N+1):
+            assert cf.yields[j, i] == pytest.approx(dataset.estimate_yield(AndCuts(cuts[:i]), WEIGHT))
+        for i in range(N):
+            others = AndCuts(cuts[:i] + cuts[i+1:])
+            assert cf.nminus1_yields[j, i] == pytest.approx(dataset.estimate_yield(others, WEIGHT))
+
+            if cf.nminus1_hists[j][i] is not None:
+                variable = cuts[i]._variable
+                expected = dataset.fill_hist(variable, others, WEIGHT, BINNING.build_axis(variable))
+                assert np.allclose(cf.nminus1_hists[j][i].values(), expected.values())
+
+def test_matches_and_cuts(tmp_path):
+    cuts = [GreaterThanCut('x', -1), LessThanCut('y', 1), TwoSidedCut('z', -2, 3)]
+    datasets = [
+        _parquet(tmp_path, 'a', 0),
+        DatasetStack('stack', None, 'stack', [_parquet(tmp_path, 'b', 1), _parquet(tmp_path, 'c', 2)]),
+    ]
+
+    cf = cutflow(cuts, WEIGHT, datasets, binning=BINNING)
+    assert cf.yields[0, 0] == 1000
+    assert cf.yields[1, 0] == 2000
+    assert np.all(np.diff(cf.yields, axis=1) <= 0)
+    _check(cf, cuts, datasets)
+    assert len(cf.table().splitlines()) == len(cuts) + 2
+
+def test_slice_masks(tmp_path):
+    dataset = _parquet(tmp_path, 'a', 0)
+    cuts = [NoCut(), GreaterThanCut('x', 0)]
+
+    cf = cutflow(cuts, WEIGHT, dataset)
+    _check(cf, cuts, [dataset])
+    assert cf.yields[0, 1] == 1000
+
+def test_pickled_selection_reevaluates(tmp_path):
+    dataset = _parquet(tmp_path, 'a', 0)
+    cuts = [GreaterThanCut('x', -1), LessThanCut('y', 1)]
+    cf = cutflow(cuts, WEIGHT, dataset)
+
+    restored = pickle.loads(pickle.dumps(cf.cumulative_cut(2)))
+    dataset.ensure_columns(restored.columns)
+    assert np.array_equal(np.asarray(restored.evaluate(dataset)), np.asarray(cf.cumulative_cut(2).evaluate(dataset)))
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_multi_file_nanoevents(nanoevents_files, executor):
+    cuts = [GreaterThanCut('Vtx.z', -3), LessThanCut('Vtx.z', 5)]
+    dataset = NanoEventsDataset('nano', None, 'nano', nanoevents_files, executor=executor, num_workers=2)
+    reference = NanoEventsDataset('nano', None, 'nano', nanoevents_files)
+
+    cf = cutflow(cuts, WEIGHT, dataset, binning=BINNING)
+    assert cf.yields[0, 0] == 50
+    _check(cf, cuts, [reference])
+    dataset.close()
+
+def test_leaf_datasets(tmp_path):
+    a, b, c = _parquet(tmp_path, 'a', 0), _parquet(tmp_path, 'b', 1), _parquet(tmp_path, 'c', 2)
+    stack = DatasetStack('stack', None, 'stack', [a, b])
+    comparison = DatasetComparison('cmp', None, 'cmp', 'ratio', stack, c, 'ratio')
+
+    assert a.leaf_datasets() == [a]
+    assert stack.leaf_datasets() == [a, b]
+    assert comparison.leaf_datasets() == [a, b, c]
+    assert a.file_datasets() == []
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_nanoevents_file_datasets(nanoevents_files, executor):
+    single = NanoEventsDataset('nano', None, 'nano', nanoevents_files[:1], executor=executor, num_workers=1)
+    multi = NanoEventsDataset('nano', None, 'nano', nanoevents_files, executor=executor, num_workers=1)
+
+    assert single.file_datasets() == []
+    if executor == 'thread':
+        assert single.leaf_datasets() == [single]
+        assert multi.leaf_datasets() == [multi]
+        assert [f.num_rows for f in multi.file_datasets()] == [30, 20]
+    else:
+        # the files are only opened in the worker processes
+        assert multi.leaf_datasets() == []
+        assert multi.file_datasets() == []
+        assert not hasattr(multi, '_files')
+    single.close()
+    multi.close()
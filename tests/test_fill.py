@@ -0,0 +1,101 @@
+import numpy as np
+import awkward as ak
+import pytest
+
+from simonplot.util.fill import flatten_values, flatten_for_fill
+
+def test_flatten_values_is_zero_copy():
+    jagged = ak.Array([[1.0, 2.0], [], [3.0]])
+    flat = flatten_values(jagged)
+    assert np.array_equal(flat, [1.0, 2.0, 3.0])
+    assert np.shares_memory(flat, np.asarray(jagged.layout.content.data))
+
+    # a sliced array only covers part of the buffer
+    sliced = jagged[1:]
+    assert np.array_equal(flatten_values(sliced), [3.0])
+    assert np.shares_memory(flatten_values(sliced), np.asarray(jagged.layout.content.data))
+
+    arr = np.arange(5.0)
+    assert np.shares_memory(flatten_values(arr), arr)
+
+def test_flatten_values_falls_back_for_other_layouts():
+    # option types are flattened (dropping missing values) rather than viewed
+    assert np.array_equal(flatten_values(ak.Array([[1.0, None], [2.0]])), [1.0, 2.0])
+    assert np.array_equal(flatten_values(ak.Array([[[1.0], [2.0, 3.0]], [[4.0]]])), [1.0, 2.0, 3.0, 4.0])
+
+def test_option_typed_weight_without_missing_values():
+    values = np.array([1.0, 2.0, 3.0])
+    weight = ak.Array([1.0, 2.0, None])[:2]
+    assert str(weight.type.content).startswith('?')
+
+    vals, wgts = flatten_for_fill(values[:2], weight, 2.0)
+    assert np.array_equal(vals, [1.0, 2.0])
+    assert np.array_equal(wgts, [2.0, 4.0])
+
+def test_option_typed_weight_with_missing_values():
+    weight = ak.Array([1.0, None, 3.0])
+
+    vals, wgts = flatten_for_fill(np.array([1.0, 2.0, 3.0]), weight)
+    assert np.array_equal(vals, [1.0, 3.0])
+    assert np.array_equal(wgts, [1.0, 3.0])
+
+    # missing in both, as after a left join
+    vals, wgts = flatten_for_fill(ak.Array([1.0, None, 3.0]), weight)
+    assert np.array_equal(vals, [1.0, 3.0])
+    assert np.array_equal(wgts, [1.0, 3.0])
+
+    # broadcast onto objects: the objects of events without a weight are left out
+    vals, wgts = flatten_for_fill(ak.Array([[1.0, 2.0], [3.0], [4.0, 5.0]]), weight, 2.0)
+    assert np.array_equal(vals, [1.0, 2.0, 4.0, 5.0])
+    assert np.array_equal(wgts, [2.0, 2.0, 6.0, 6.0])
+
+    with pytest.raises(RuntimeError):
+        flatten_for_fill(np.array([1.0, 2.0]), weight)
+
+def test_per_event_weight_is_broadcast_onto_objects():
+    jagged = ak.Array([[1.0, 2.0], [], [3.0, 4.0, 5.0]])
+    weight = np.array([2.0, 3.0, 4.0])
+
+    vals, wgts = flatten_for_fill(jagged, weight, 0.5)
+    assert np.array_equal(vals, [1.0, 2.0, 3.0, 4.0, 5.0])
+    assert np.array_equal(wgts, [1.0, 1.0, 2.0, 2.0, 2.0])
+
+    # the same as broadcasting through awkward
+    expected = ak.flatten(ak.broadcast_arrays(weight, jagged)[0], axis=None)
+    assert np.array_equal(flatten_for_fill(jagged, weight)[1], ak.to_numpy(expected))
+
+    # doubly-jagged values get the weight once per innermost entry
+    vals, wgts = flatten_for_fill(ak.Array([[[1.0], [2.0, 3.0]], [[4.0]], []]), weight)
+    assert np.array_equal(wgts, [2.0, 2.0, 2.0, 3.0])
+
+    with pytest.raises(RuntimeError):
+        flatten_for_fill(jagged, weight[:2])
+
+def test_scalar_weight():
+    vals, wgts = flatten_for_fill(ak.Array([[1.0], [2.0, 3.0]]), 2.0, 3.0)
+    assert np.array_equal(vals, [1.0, 2.0, 3.0])
+    assert wgts == 6.0
+
+def test_fill_hist_broadcasts_event_weights(columnar_dataset):
+    from simonplot.variable import BasicVariable
+    from simonplot.cut import NoCut, GreaterThanCut
+    from simonplot.binning import BasicBinning
+
+    variable = BasicVariable('Jet.pt')
+    axis = BasicBinning(10, 0, 100).build_axis(variable)
+    columnar_dataset._weight = 0.5
+
+    for cut in [NoCut(), GreaterThanCut('x', 0.5)]:
+        H = columnar_dataset.fill_hist(variable, cut, BasicVariable('w'), axis)
+
+        mask = ak.to_numpy(cut.evaluate(columnar_dataset)) if not isinstance(cut, NoCut) else slice(None)
+        pt = columnar_dataset.get_column('pt', 'Jet')[mask]
+        w = columnar_dataset.get_column('w')[mask]
+        flatpt = ak.to_numpy(ak.flatten(pt))
+        flatw = ak.to_numpy(ak.flatten(ak.broadcast_arrays(w, pt)[0]))
+        expected, _ = np.histogram(flatpt, bins=10, range=(0, 100), weights=flatw)
+        expected_var, _ = np.histogram(flatpt, bins=10, range=(0, 100), weights=flatw**2)
+
+        assert np.allclose(H.values(), 0.5 * expected)
+        # the dataset weight scales the variances by its square
+        assert np.allclose(H.variances(), 0.25 * expected_var)
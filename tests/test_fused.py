@@ -0,0 +1,70 @@
+import numpy as np
+import awkward as ak
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+pytest.importorskip('numexpr')
+
+from simonplot.plottables import ParquetDataset, NanoEventsDataset
+from simonplot.variable import (FusedVariable, BasicVariable, ConstantVariable, SumVariable, DifferenceVariable, ProductVariable,
+                                RatioVariable, AbsVariable, LogVariable, UFuncVariable, DeltaPhiVariable, DeltaRVariable, RelativeResolutionVariable)
+from simonplot.cut import NoCut, GreaterThanCut
+
+@pytest.fixture
+def dataset(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 200
+    counts = rng.integers(0, 4, n)
+    jets = ak.zip({
+        field : ak.unflatten(rng.uniform(lo, hi, counts.sum()), counts)
+        for field, lo, hi in [('pt', 1, 100), ('eta', -2.5, 2.5), ('phi', -np.pi, np.pi), ('genpt', 1, 100)]
+    })
+    pq.write_table(pa.table({
+        'MET' : rng.uniform(1, 100, n),
+        'METphi' : rng.uniform(-np.pi, np.pi, n),
+        'nPV' : rng.integers(0, 50, n).astype(np.uint8),
+        'Jet' : ak.to_arrow(jets, extensionarray=False),
+    }), tmp_path / 'd.parquet')
+    return ParquetDataset('d', None, 'd', str(tmp_path / 'd.parquet'))
+
+def _check(result, expected):
+    if isinstance(expected, ak.Array) and expected.ndim == 2:
+        assert ak.to_list(ak.num(result, axis=1)) == ak.to_list(ak.num(expected, axis=1))
+    else:
+        assert not isinstance(result, ak.Array)
+    assert np.allclose(ak.flatten(result, axis=None), ak.flatten(expected, axis=None))
+
+TREES = [
+    SumVariable('MET', 'nPV'),
+    LogVariable(RatioVariable('MET', SumVariable('nPV', ConstantVariable(1))), 10),
+    UFuncVariable(DifferenceVariable('MET', 'nPV'), np.square),
+    ProductVariable('Jet.pt', 'MET'),
+    AbsVariable(DifferenceVariable('Jet.pt', 'nPV')),
+    RelativeResolutionVariable('Jet.genpt', 'Jet.pt'),
+    DeltaPhiVariable('Jet.phi', 'METphi'),
+    DeltaRVariable('Jet.eta', 'Jet.phi', ConstantVariable(0.0), 'METphi'),
+]
+
+@pytest.mark.parametrize('tree', TREES, ids=lambda tree: tree.key)
+@pytest.mark.parametrize('cut', [NoCut(), GreaterThanCut('MET', 50)], ids=['nocut', 'cut'])
+def test_matches_unfused(dataset, tree, cut):
+    fused = FusedVariable(tree)
+    dataset.ensure_columns(list(set(fused.columns + cut.columns)))
+
+    _check(fused.evaluate(dataset, cut), tree.evaluate(dataset, cut))
+
+def test_single_numexpr_expression():
+    fused = FusedVariable(AbsVariable(DifferenceVariable('Jet.pt', 'MET')))
+    assert fused.expression == 'abs((v0 - v1))'
+    assert [leaf.key for leaf in fused._leaves] == ['MET', 'Jet.pt']
+
+def test_per_event_awkward_leaves(nanoevents_files):
+    # NanoEvents returns per-event columns as awkward arrays, which must be broadcast onto the objects too
+    dataset = NanoEventsDataset('nano', None, 'nano', nanoevents_files)
+    tree = SumVariable('Track.pt', ProductVariable('Vtx.z', 'Track.eta'))
+    fused = FusedVariable(tree)
+    dataset.ensure_columns(fused.columns)
+
+    for cut in [NoCut(), GreaterThanCut('Vtx.z', 0)]:
+        _check(fused.evaluate(dataset, cut), tree.evaluate(dataset, cut))
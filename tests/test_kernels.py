@@ -0,0 +1,122 @@
+import numpy as np
+import awkward as ak
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import simonplot.util.kernels as kernels
+import simonplot.variable.CompositeVariable as CompositeVariable
+from simonplot.plottables import ParquetDataset
+from simonplot.variable import DeltaPhiVariable, DeltaRVariable, Distance2dVariable, EtaFromXYZVariable, PhiFromXYZVariable
+from simonplot.cut import GreaterThanCut, NoCut
+
+@pytest.fixture
+def dataset(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 2000
+    counts = rng.integers(0, 5, n)
+    def jagged(lo, hi):
+        return ak.unflatten(rng.uniform(lo, hi, counts.sum()), counts)
+    jets = ak.zip({
+        'eta' : jagged(-3, 3), 
+        'phi' : jagged(-np.pi, np.pi),
+        'x' : jagged(-5, 5), 
+        'y' : jagged(-5, 5), 
+        'z' : jagged(-5, 5),
+    })
+    pq.write_table(pa.table({
+        'met_eta' : rng.uniform(-3, 3, n),
+        'met_phi' : rng.uniform(-np.pi, np.pi, n),
+        'vx' : rng.uniform(-1, 1, n),
+        'vy' : rng.uniform(-1, 1, n),
+        'Jet' : ak.to_arrow(jets, extensionarray=False),
+    }), tmp_path / 'd.parquet')
+    return ParquetDataset('d', None, 'd', str(tmp_path / 'd.parquet'))
+
+VARIABLES = [
+    DeltaPhiVariable('Jet.phi', 'met_phi'),
+    DeltaRVariable('Jet.eta', 'Jet.phi', 'met_eta', 'met_phi'),
+    DeltaRVariable('met_eta', 'met_phi', 'met_eta', 'met_phi'),
+    Distance2dVariable('Jet.x', 'Jet.y', 'vx', 'vy'),
+    EtaFromXYZVariable('Jet.x', 'Jet.y', 'Jet.z'),
+    PhiFromXYZVariable('Jet.x', 'Jet.y', 'Jet.z'),
+]
+
+EVENT_CUTS = [NoCut(), GreaterThanCut('met_phi', 1)]
+OBJECT_CUT = GreaterThanCut('Jet.eta', 0.5)
+
+# the awkward path can't apply a per-object cut to per-event columns, so only the all-jagged variables are compared with one
+CASES = [(var, cut) for var in VARIABLES for cut in EVENT_CUTS] + [(var, OBJECT_CUT) for var in VARIABLES[4:]]
+
+def _awkward(variable, dataset, cut, monkeypatch):
+    # the plain awkward implementation, which the variables fall back to
+    with monkeypatch.context() as m:
+        m.setattr(CompositeVariable, 'evaluate_kernel', lambda *args: None)
+        return variable.evaluate(dataset, cut)
+
+@pytest.mark.parametrize('compiled', [True, False], ids=['compiled', 'numpy'])
+@pytest.mark.parametrize('variable,cut', CASES, ids=lambda x: x.key)
+def test_kernels_match_awkward(dataset, variable, cut, compiled, monkeypatch):
+    if compiled:
+        pytest.importorskip('numba')
+    else:
+        monkeypatch.setattr(kernels, '_jit', lambda func: None)
+
+    dataset.ensure_columns(list(set(variable.columns + cut.columns)))
+    expected = _awkward(variable, dataset, cut, monkeypatch)
+    result = variable.evaluate(dataset, cut)
+
+    assert len(result) == len(expected)
+    if isinstance(expected, ak.Array) and expected.ndim > 1:
+        assert ak.to_list(ak.num(result)) == ak.to_list(ak.num(expected))
+    assert np.allclose(ak.to_numpy(ak.flatten(result, axis=None)), ak.to_numpy(ak.flatten(expected, axis=None)))
+
+def test_per_object_cut_with_per_event_inputs(dataset):
+    variable = DeltaRVariable('Jet.eta', 'Jet.phi', 'met_eta', 'met_phi')
+    dataset.ensure_columns(list(set(variable.columns + OBJECT_CUT.columns)))
+    result = variable.evaluate(dataset, OBJECT_CUT)
+
+    eta, phi = dataset.get_column('eta', 'Jet'), dataset.get_column('phi', 'Jet')
+    met_eta, met_phi = ak.broadcast_arrays(dataset.get_column('met_eta'), eta)[0], ak.broadcast_arrays(dataset.get_column('met_phi'), eta)[0]
+    dphi = (phi - met_phi + np.pi) % (2*np.pi) - np.pi
+    expected = np.sqrt((eta - met_eta)**2 + dphi**2)[eta > 0.5]
+
+    assert ak.to_list(ak.num(result)) == ak.to_list(ak.num(expected))
+    assert np.allclose(ak.to_numpy(ak.flatten(result)), ak.to_numpy(ak.flatten(expected)))
+
+def test_delta_phi_wraps():
+    phi1 = np.array([3.0, -3.0, 0.5])
+    phi2 = np.array([-3.0, 3.0, -0.5])
+    dphi, = kernels.delta_phi(phi1, phi2)
+    assert np.allclose(dphi, [6.0 - 2*np.pi, 2*np.pi - 6.0, 1.0])
+
+    # gathered through an index, as for a cut
+    dphi, = kernels.delta_phi(phi1, phi2, index=np.array([2, 0]))
+    assert np.allclose(dphi, [1.0, 6.0 - 2*np.pi])
+
+def test_sliced_inputs(dataset):
+    # jagged arrays whose content doesn't start at 0
+    dataset.ensure_columns(['Jet.x', 'Jet.y', 'Jet.z'])
+    x, y, z = [dataset.get_column(c, 'Jet')[100:200] for c in ['x', 'y', 'z']]
+    class Sliced:
+        def __init__(self, val):
+            self._val = val
+        def evaluate(self, dataset, cut):
+            return self._val
+
+    eta, phi = kernels.evaluate_kernel(kernels.eta_phi_from_xyz, [Sliced(x), Sliced(y), Sliced(z)], dataset, None)
+    assert ak.to_list(ak.num(eta)) == ak.to_list(ak.num(x))
+    assert np.allclose(ak.flatten(phi), ak.flatten(np.arctan2(y, x)))
+    assert np.allclose(ak.flatten(eta), ak.flatten(np.arcsinh(z / np.sqrt(x**2 + y**2))))
+
+def test_unsupported_layouts_fall_back(dataset):
+    class Value:
+        def __init__(self, val):
+            self._val = val
+        def evaluate(self, dataset, cut):
+            return self._val
+
+    doubly = ak.Array([[[1.0]], [[2.0, 3.0]]])
+    assert kernels.evaluate_kernel(kernels.delta_phi, [Value(doubly), Value(doubly)], dataset, None) is None
+    option = ak.Array([[1.0, None], [2.0]])
+    assert kernels.evaluate_kernel(kernels.delta_phi, [Value(option), Value(option)], dataset, None) is None
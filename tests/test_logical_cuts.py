@@ -0,0 +1,80 @@
+import numpy as np
+import awkward as ak
+import pytest
+
+from simonplot.cut import GreaterThanCut, LessThanCut, EqualsCut, TwoSidedCut, AndCuts, OrCuts, NoCut
+from simonplot.cut.LogicalCuts import _evaluation_order
+
+CUTS = [
+    AndCuts([GreaterThanCut('x', 0.5), LessThanCut('y', -0.5), EqualsCut('channel', 2)]),
+    AndCuts([GreaterThanCut('x', 1.5), LessThanCut('y', 0.0), TwoSidedCut('w', 0.6, 1.9)]),
+    OrCuts([GreaterThanCut('x', 2.5), LessThanCut('y', -2.5), TwoSidedCut('x', -0.1, 0.1)]),
+    OrCuts([GreaterThanCut('x', -1.5), LessThanCut('y', 0.0)]),
+    AndCuts([GreaterThanCut('x', 1.0), OrCuts([LessThanCut('y', -1), GreaterThanCut('y', 1)])]),
+    AndCuts([NoCut(), GreaterThanCut('x', 1.0), GreaterThanCut('y', 0.0)]),
+    # per-object masks, which can only be short-circuited where the sub-cuts are per-event
+    AndCuts([GreaterThanCut('x', 1.0), GreaterThanCut('Jet.pt', 50)]),
+    OrCuts([GreaterThanCut('Jet.pt', 95), GreaterThanCut('x', 2.0)]),
+]
+
+@pytest.mark.parametrize('cut', CUTS, ids=lambda cut: cut.key)
+@pytest.mark.parametrize('bitmap', [False, True], ids=['nobitmap', 'bitmap'])
+def test_matches_full_evaluation(columnar_dataset, disable_optimizations, cut, bitmap):
+    dataset = columnar_dataset
+    if bitmap:
+        dataset.enable_bitmap_index(['channel'])
+    dataset.ensure_columns(cut.columns)
+
+    # evaluate a few times, so that the sub-cuts get reordered
+    masks = [cut.evaluate(dataset) for _ in range(3)]
+
+    disable_optimizations()
+    expected = cut.evaluate(dataset)
+    for mask in masks:
+        assert ak.to_list(mask) == ak.to_list(expected)
+
+def test_later_sub_cuts_see_only_undecided_rows(columnar_dataset):
+    dataset = columnar_dataset
+    cut = AndCuts([GreaterThanCut('x', 1.5), LessThanCut('y', 0.0)])
+    dataset.ensure_columns(cut.columns)
+    mask = cut.evaluate(dataset)
+
+    x, y = dataset.get_column('x'), dataset.get_column('y')
+    assert np.array_equal(mask, (x > 1.5) & (y < 0.0))
+    assert cut._stats[0]['rows'] == dataset.num_rows
+    assert cut._stats[1]['rows'] == np.count_nonzero(x > 1.5)
+
+def test_per_object_sub_cuts_are_remembered(columnar_dataset):
+    dataset = columnar_dataset
+    cut = AndCuts([GreaterThanCut('x', 1.5), GreaterThanCut('Jet.pt', 50)])
+    dataset.ensure_columns(cut.columns)
+    cut.evaluate(dataset)
+    assert cut._stats[0]['per_event']
+    assert not cut._stats[1]['per_event']
+
+def test_evaluation_order():
+    cuts = [GreaterThanCut('a', 0), GreaterThanCut('b', 0), GreaterThanCut('c', 0)]
+    # (pass fraction, seconds per row): a passes most, b rejects most, c is expensive
+    stats = [(0.9, 1.0), (0.1, 1.0), (0.5, 10.0)]
+
+    for logical, decided_value, expected in [(AndCuts(cuts), False, [1, 0, 2]), (OrCuts(cuts), True, [0, 1, 2])]:
+        # no statistics yet: keep the order as given
+        assert _evaluation_order(logical, decided_value) == [0, 1, 2]
+
+        logical._stats = [{'rows' : 100, 'passed' : 100*p, 'seconds' : 100*s, 'per_event' : True} for p, s in stats]
+        assert _evaluation_order(logical, decided_value) == expected
+        assert _evaluation_order(logical, decided_value, skip=[expected[0]]) == expected[1:]
+
+def test_flat_awkward_masks_are_short_circuited(nanoevents_files):
+    # NanoEvents columns are awkward arrays, whose flat masks can still be scattered back onto the events
+    from simonplot.plottables import NanoEventsDataset
+    dataset = NanoEventsDataset('nano', None, 'nano', nanoevents_files[:1])
+
+    cut = AndCuts([GreaterThanCut('Vtx.z', 7), LessThanCut('Vtx.z', 9)])
+    dataset.ensure_columns(cut.columns)
+    mask = cut.evaluate(dataset)
+
+    z = ak.to_numpy(dataset.get_column('z', 'Vtx'))
+    assert isinstance(mask, np.ndarray)
+    assert np.array_equal(mask, (z > 7) & (z < 9))
+    assert cut._stats[1]['rows'] == np.count_nonzero(z > 7)
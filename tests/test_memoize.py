@@ -0,0 +1,83 @@
+import collections
+
+import numpy as np
+import pytest
+
+from simonplot.util.evalcontext import evaluation_context, memo_key
+from simonplot.variable import BasicVariable, ConstantVariable, ProductVariable, EtaFromXYZVariable, PhiFromXYZVariable
+from simonplot.cut import GreaterThanCut, NoCut
+from simonplot.binning import BasicBinning
+
+@pytest.fixture
+def reads(columnar_dataset, monkeypatch):
+    '''
+    Count of get_column calls on columnar_dataset, per column
+    '''
+    counts = collections.Counter()
+    get_column = columnar_dataset.get_column
+    def counting(column_name, collection_name=None):
+        counts[column_name] += 1
+        return get_column(column_name, collection_name)
+    monkeypatch.setattr(columnar_dataset, 'get_column', counting)
+    return counts
+
+def test_shared_subexpressions_are_evaluated_once(columnar_dataset, reads):
+    eta = EtaFromXYZVariable('x', 'y', 'w')
+    phi = PhiFromXYZVariable('x', 'y', 'w')
+    columnar_dataset.ensure_columns(['x', 'y', 'w'])
+
+    expected = (eta.evaluate(columnar_dataset, NoCut()), phi.evaluate(columnar_dataset, NoCut()))
+    assert reads['x'] == 2
+
+    reads.clear()
+    with evaluation_context(columnar_dataset):
+        result = (eta.evaluate(columnar_dataset, NoCut()), phi.evaluate(columnar_dataset, NoCut()))
+        # the same tree twice in one product
+        square = ProductVariable('x', 'x').evaluate(columnar_dataset, NoCut())
+    assert reads['x'] == 1
+    assert np.allclose(result[0], expected[0]) and np.allclose(result[1], expected[1])
+    assert np.allclose(square, columnar_dataset.get_column('x')**2)
+
+def test_fill_hist_evaluates_each_subexpression_once(columnar_dataset, reads, disable_optimizations):
+    disable_optimizations()
+    variable = BasicVariable('x')
+    cut = GreaterThanCut('x', 0)
+    weight = ProductVariable('w', 'w')
+
+    columnar_dataset.fill_hist(variable, cut, weight, BasicBinning(10, 0, 5).build_axis(variable))
+    # once for the cut (shared by the variable and the weight), once for the variable
+    assert reads['x'] == 2
+    assert reads['w'] == 1
+
+def test_cache_only_lives_in_context(columnar_dataset):
+    columnar_dataset.ensure_columns(['x'])
+    with evaluation_context(columnar_dataset):
+        cache = columnar_dataset._eval_cache
+        BasicVariable('x').evaluate(columnar_dataset, NoCut())
+        with evaluation_context(columnar_dataset):
+            # nested contexts share the outer cache
+            assert columnar_dataset._eval_cache is cache
+        assert len(cache) == 2  # the variable, and NoCut
+    assert not hasattr(columnar_dataset, '_eval_cache')
+
+    variable = BasicVariable('x')
+    columnar_dataset.fill_hist(variable, NoCut(), ConstantVariable(1.0), BasicBinning(10, 0, 5).build_axis(variable))
+    assert not hasattr(columnar_dataset, '_eval_cache')
+
+def test_keyed_on_definition_rather_than_key(columnar_dataset):
+    # cut keys format thresholds with %g, so these have the same key
+    columnar_dataset.ensure_columns(['x'])
+    x0 = columnar_dataset.get_column('x')[0]
+    first = GreaterThanCut('x', x0 - 1e-9)
+    second = GreaterThanCut('x', x0 + 1e-9)
+    assert first.key == second.key
+    assert memo_key(first) != memo_key(second)
+
+    with evaluation_context(columnar_dataset):
+        assert first.evaluate(columnar_dataset)[0]
+        assert not second.evaluate(columnar_dataset)[0]
+
+    # labels don't change the result, so don't change the memo key
+    labelled = BasicVariable('x')
+    labelled._label = 'something else'
+    assert memo_key(labelled) == memo_key(BasicVariable('x'))
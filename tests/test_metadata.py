@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.fs
+import pyarrow.parquet as pq
+import pytest
+
+import simonplot.util.metadata as metadata
+from simonplot.util.metadata import MetadataIndex
+from simonplot.plottables import ParquetDataset
+
+def _write(path, n, seed=0):
+    rng = np.random.default_rng(seed)
+    pq.write_table(pa.table({
+        'x' : rng.normal(0, 1, n),
+        'genweight' : rng.uniform(0, 2, n),
+    }), path, row_group_size=max(n//2, 1))
+
+@pytest.fixture
+def files(tmp_path):
+    os.mkdir(tmp_path / 'data')
+    for i, n in enumerate([100, 50, 30]):
+        _write(tmp_path / 'data' / ('f%d.parquet'%i), n, i)
+    return tmp_path / 'data'
+
+def _forbid_reads(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("the parquet files should not be read")
+    monkeypatch.setattr(metadata.pq, 'ParquetFile', fail)
+    monkeypatch.setattr(metadata.pq, 'read_table', fail)
+
+def test_lookup_is_cached(files, tmp_path, monkeypatch):
+    index = MetadataIndex(str(tmp_path / 'index.sqlite'))
+    dataset = ParquetDataset('d', None, 'd', str(files), metadata_index=index)
+    assert dataset.num_rows == 180
+    assert dataset.schema.names == ['x', 'genweight']
+
+    # a new index object (eg in a new session) on the same file doesn't need to open the files
+    _forbid_reads(monkeypatch)
+    again = ParquetDataset('d', None, 'd', str(files), metadata_index=MetadataIndex(str(tmp_path / 'index.sqlite')))
+    assert again.num_rows == 180
+    assert not hasattr(again, '_table')
+    assert [len(rgs) for rgs in again.row_group_statistics] == [2, 2, 2]
+
+def test_row_group_statistics_match_the_files(files, tmp_path):
+    indexed = ParquetDataset('d', None, 'd', str(files), metadata_index=str(tmp_path / 'index.sqlite'))
+    plain = ParquetDataset('d', None, 'd', str(files))
+    assert indexed.row_group_statistics == plain.row_group_statistics
+
+    first = indexed.row_group_statistics[0][0]
+    x = pq.read_table(files / 'f0.parquet')['x'].to_numpy()[:50]
+    assert first['num_rows'] == 50
+    assert first['columns']['x']['min'] == x.min()
+    assert first['columns']['x']['max'] == x.max()
+
+def test_genweight_normalization(files, tmp_path, monkeypatch):
+    expected = sum(pq.read_table(files / ('f%d.parquet'%i))['genweight'].to_numpy().sum() for i in range(3))
+
+    dataset = ParquetDataset('d', None, 'd', str(files), metadata_index=str(tmp_path / 'index.sqlite'), genweight_column='genweight')
+    dataset.set_xsec(2.0)
+    dataset.compute_weight(3.0)
+    assert dataset.num_events == pytest.approx(expected)
+    assert dataset._weight == pytest.approx(3.0 * 1000 * 2.0 / expected)
+
+    _forbid_reads(monkeypatch)
+    again = ParquetDataset('d', None, 'd', str(files), metadata_index=MetadataIndex(str(tmp_path / 'index.sqlite')), genweight_column='genweight')
+    assert again.sum_genweight == pytest.approx(expected)
+
+def test_rewritten_files_are_reindexed(files, tmp_path):
+    index = MetadataIndex(str(tmp_path / 'index.sqlite'))
+    assert ParquetDataset('d', None, 'd', str(files), metadata_index=index).num_rows == 180
+
+    _write(files / 'f1.parquet', 70)
+    os.utime(files / 'f1.parquet', ns=(0, 10**18))
+    assert ParquetDataset('d', None, 'd', str(files), metadata_index=index).num_rows == 200
+
+def test_prune(files, tmp_path):
+    index = MetadataIndex(str(tmp_path / 'index.sqlite'))
+    ParquetDataset('d', None, 'd', str(files), metadata_index=index, genweight_column='genweight').sum_genweight
+
+    # nothing has changed, and entries of other filesystems are left alone
+    assert index.prune() == 0
+    os.remove(files / 'f2.parquet')
+    assert index.prune(filesystem=pa.fs.SubTreeFileSystem('/', pa.fs.LocalFileSystem())) == 0
+
+    assert index.prune() == 1
+    assert ParquetDataset('d', None, 'd', str(files), metadata_index=index).num_rows == 150
+
+    assert index.prune(keep_paths=[str(files / 'f0.parquet')]) == 1
+    assert index._db.execute('SELECT COUNT(*) FROM files').fetchone()[0] == 1
+    assert index._db.execute('SELECT COUNT(*) FROM genweights').fetchone()[0] == 1
+
+def test_open_shares_indexes(tmp_path):
+    path = str(tmp_path / 'index.sqlite')
+    assert MetadataIndex.open(path) is MetadataIndex.open(path)
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('coffea')
+
+from simonplot.plottables import NanoEventsDataset
+from simonplot.variable import BasicVariable, ConstantVariable
+from simonplot.cut import GreaterThanCut
+from simonplot.binning import BasicBinning
+
+WEIGHT = ConstantVariable(1.0)
+CUT = GreaterThanCut('Vtx.z', -3)
+
+def _worker_file_count(dataset):
+    # number of per-file datasets cached in the (single) worker process
+    return dataset._get_pool().submit(eval, "len(__import__('simonplot.plottables.Datasets', fromlist=['_worker_files'])._worker_files)").result()
+
+def test_process_mode_matches_thread_mode(nanoevents_files):
+    thread = NanoEventsDataset('nano', None, 'nano', nanoevents_files)
+    process = NanoEventsDataset('nano', None, 'nano', nanoevents_files, executor='process', num_workers=1)
+
+    var = BasicVariable('Track.pt')
+    axis = BasicBinning(10, 0, 50).build_axis(var)
+    for dataset in [thread, process]:
+        dataset.fill_hist(var, CUT, WEIGHT, axis)
+
+    assert np.array_equal(process._H.values(), thread._H.values())
+    assert process.num_rows == thread.num_rows == 50
+    assert process.get_range(var, CUT) == thread.get_range(var, CUT)
+    assert process.estimate_yield(CUT, WEIGHT) == thread.estimate_yield(CUT, WEIGHT)
+
+    # the files are only ever opened in the worker, which keeps them between calls
+    assert not hasattr(process, '_files')
+    assert _worker_file_count(process) == 2
+    process.close()
+
+def test_close_and_reuse(nanoevents_files):
+    dataset = NanoEventsDataset('nano', None, 'nano', nanoevents_files, executor='process', num_workers=1)
+    assert dataset.num_rows == 50
+
+    dataset.close()
+    assert not hasattr(dataset, '_pool')
+    dataset.close()
+
+    var = BasicVariable('Vtx.z')
+    H = dataset.fill_hist(var, CUT, WEIGHT, BasicBinning(10, -10, 10).build_axis(var))
+    assert H.values().sum() > 0
+    dataset.close()
+
+def test_columns_are_materialized_together_and_cached(nanoevents_files, monkeypatch):
+    import awkward as ak
+    import simonplot.plottables.Datasets as Datasets
+
+    calls = []
+    materialize = Datasets.ak.materialize
+    def counting(array, *args, **kwargs):
+        calls.append(sorted(array.fields))
+        return materialize(array, *args, **kwargs)
+    monkeypatch.setattr(Datasets.ak, 'materialize', counting)
+
+    dataset = NanoEventsDataset('nano', None, 'nano', nanoevents_files[:1])
+    dataset.ensure_columns(['Track.pt', 'Track.eta', 'Vtx.z'])
+    assert calls == [['Track.eta', 'Track.pt', 'Vtx.z']]
+
+    # served from the cache, however often the leaves ask for them
+    pt = dataset.get_column('pt', 'Track')
+    assert dataset.get_column('pt', 'Track') is pt
+    dataset.get_column('z', 'Vtx')
+    dataset.ensure_columns(['Track.pt'])
+    assert len(calls) == 1
+
+    # a column which wasn't ensured is materialized on its own on first use
+    dataset.get_column('run')
+    assert calls[1:] == [['run']]
+
+    uproot = pytest.importorskip('uproot')
+    with uproot.open(nanoevents_files[0]) as tree:
+        assert ak.array_equal(pt, tree['Track_pt'].array(), check_parameters=False)
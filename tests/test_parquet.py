@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import awkward as ak
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from simonplot.plottables import ParquetDataset
+from simonplot.variable import BasicVariable, ConstantVariable, SumVariable, UFuncVariable, SidecarVariable
+from simonplot.cut import NoCut, GreaterThanCut
+from simonplot.binning import BasicBinning
+
+def _jets(rows):
+    return pa.table({
+        'MET' : [float(i) for i in range(rows)],
+        'Jet' : [[{'pt' : float(i), 'eta' : -float(i)}]*(i % 3) for i in range(rows)],
+    })
+
+def test_nested_columns(tmp_path):
+    pq.write_table(_jets(4), tmp_path / 'a.parquet')
+    pq.write_table(_jets(2), tmp_path / 'b.parquet')
+    dataset = ParquetDataset('d', None, 'd', str(tmp_path))
+
+    dataset.ensure_columns(['MET', 'Jet.pt', 'Jet.eta'])
+    assert dataset.num_rows == 6
+    assert ak.to_list(dataset.get_column('pt', 'Jet')) == [[], [1.0], [2.0, 2.0], [], [], [1.0]]
+    assert ak.to_list(dataset.get_column('eta', 'Jet')) == [[], [-1.0], [-2.0, -2.0], [], [], [-1.0]]
+    assert np.array_equal(dataset.get_column('MET'), [0, 1, 2, 3, 0, 1])
+
+def test_nested_columns_with_hive_partitions(tmp_path):
+    for era, rows in [('A', 3), ('B', 2)]:
+        os.makedirs(tmp_path / ('era=%s'%era))
+        pq.write_table(_jets(rows), tmp_path / ('era=%s'%era) / 'f.parquet')
+
+    for metadata_index in [None, str(tmp_path.parent / 'index.sqlite')]:
+        dataset = ParquetDataset('d', None, 'd', str(tmp_path), partitioning='hive', metadata_index=metadata_index)
+
+        dataset.ensure_columns(['era', 'Jet.pt'])
+        assert list(dataset.get_column('era')) == ['A', 'A', 'A', 'B', 'B']
+        assert ak.to_list(dataset.get_column('pt', 'Jet')) == [[], [1.0], [2.0, 2.0], [], [1.0]]
+
+        dataset.ensure_columns(['era', 'MET'])
+        assert list(dataset.get_column('era')) == ['A', 'A', 'A', 'B', 'B']
+
+def test_nested_schema_change_on_reload(tmp_path):
+    path = tmp_path / 'a.parquet'
+    pq.write_table(_jets(3), path)
+    dataset = ParquetDataset('d', None, 'd', str(path))
+    dataset.ensure_columns(['Jet.pt'])
+
+    table = pa.table({'Jet' : [[{'pt' : 1.0, 'phi' : 0.5}], []]})
+    pq.write_table(table, path)
+    dataset.ensure_columns(['Jet.pt', 'Jet.phi'])
+    assert ak.to_list(dataset.get_column('phi', 'Jet')) == [[0.5], []]
+
+    with pytest.raises(RuntimeError):
+        dataset.ensure_columns(['Jet.mass'])
+
+def test_sidecars_are_keyed_on_definition(tmp_path):
+    os.makedirs(tmp_path / 'data')
+    pq.write_table(pa.table({'x' : np.arange(5.0)}), tmp_path / 'data' / 'a.parquet')
+    dataset = ParquetDataset('d', None, 'd', str(tmp_path / 'data'))
+
+    plus = UFuncVariable('x', lambda v: v + 1)
+    times = UFuncVariable('x', lambda v: v * 2)
+    assert plus.key == times.key
+
+    assert np.array_equal(SidecarVariable(plus).evaluate(dataset, NoCut()), np.arange(5.0) + 1)
+    assert np.array_equal(SidecarVariable(times).evaluate(dataset, NoCut()), np.arange(5.0) * 2)
+    assert len(dataset.list_sidecars()) == 2
+
+    # same definition, so the sidecar is reused
+    first = dataset.write_sidecar(UFuncVariable('x', np.sqrt))
+    assert dataset.write_sidecar(UFuncVariable('x', np.sqrt)) == first
+    assert len(dataset.list_sidecars()) == 3
+
+def test_sidecar_variable_forwards_columns(tmp_path):
+    pq.write_table(pa.table({'x' : np.arange(5.0), 'y' : np.ones(5)}), tmp_path / 'a.parquet')
+    dataset = ParquetDataset('d', None, 'd', str(tmp_path / 'a.parquet'))
+
+    var = SidecarVariable(SumVariable(BasicVariable('x'), BasicVariable('y')))
+    assert sorted(var.columns) == ['x', 'y']
+
+    H = dataset.fill_hist(var, GreaterThanCut('x', 1.5), ConstantVariable(1.0), BasicBinning(5, 0, 10).build_axis(var))
+    assert H.values().sum() == 3
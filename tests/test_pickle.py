@@ -0,0 +1,76 @@
+import pickle
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from simonplot.plottables import ParquetDataset, NanoEventsDataset, UprootTreeDataset
+from simonplot.variable import BasicVariable, ConstantVariable, SumVariable
+from simonplot.cut import GreaterThanCut, LessThanCut, AndCuts
+from simonplot.binning import BasicBinning
+
+WEIGHT = ConstantVariable(1.0)
+
+def _roundtrip(obj):
+    return pickle.loads(pickle.dumps(obj))
+
+def _fill(dataset, variable, cut):
+    return dataset.fill_hist(variable, cut, WEIGHT, BasicBinning(10, -10, 10).build_axis(variable)).values()
+
+def test_parquet_dataset_pickles_definition_only(tmp_path):
+    rng = np.random.default_rng(0)
+    pq.write_table(pa.table({'x' : rng.normal(0, 3, 100000), 'y' : rng.normal(0, 3, 100000)}), tmp_path / 'd.parquet')
+    dataset = ParquetDataset('d', None, 'd', str(tmp_path / 'd.parquet'))
+    variable = SumVariable(BasicVariable('x'), BasicVariable('y'))
+    cut = AndCuts([GreaterThanCut('x', -1), LessThanCut('y', 2)])
+
+    expected = _fill(dataset, variable, cut)
+    dataset.enable_bitmap_index(['x'])
+
+    # none of the loaded data, fill results or yields are pickled
+    payload = pickle.dumps(dataset)
+    assert len(payload) < 10000
+    restored = pickle.loads(payload)
+    for attr in ['_table', '_H', '_yields']:
+        assert not hasattr(restored, attr)
+    assert restored._bitmap_columns == dataset._bitmap_columns
+
+    assert np.array_equal(_fill(restored, _roundtrip(variable), _roundtrip(cut)), expected)
+
+def test_cut_statistics_are_not_pickled(tmp_path):
+    pq.write_table(pa.table({'x' : np.arange(10.0), 'y' : np.arange(10.0)}), tmp_path / 'd.parquet')
+    dataset = ParquetDataset('d', None, 'd', str(tmp_path / 'd.parquet'))
+    cut = AndCuts([GreaterThanCut('x', 2), LessThanCut('y', 8)])
+    dataset.ensure_columns(cut.columns)
+    cut.evaluate(dataset)
+    assert hasattr(cut, '_stats')
+
+    restored = _roundtrip(cut)
+    assert type(restored) is AndCuts
+    assert not hasattr(restored, '_stats')
+    assert restored == cut
+    assert np.array_equal(restored.evaluate(dataset), cut.evaluate(dataset))
+
+def test_uproot_dataset(nanoevents_files):
+    dataset = UprootTreeDataset('u', None, 'u', [list(f)[0] for f in nanoevents_files], num_workers=2)
+    expected = _fill(dataset, BasicVariable('Vtx.z'), GreaterThanCut('Vtx.z', 0))
+
+    restored = _roundtrip(dataset)
+    assert restored._columns == {}
+    assert restored.num_rows == 50
+    assert np.array_equal(_fill(restored, BasicVariable('Vtx.z'), GreaterThanCut('Vtx.z', 0)), expected)
+
+def test_nanoevents_dataset(nanoevents_files):
+    for fnames in [nanoevents_files[:1], nanoevents_files]:
+        dataset = NanoEventsDataset('nano', None, 'nano', fnames)
+        expected = _fill(dataset, BasicVariable('Vtx.z'), GreaterThanCut('Vtx.z', 0))
+
+        restored = _roundtrip(dataset)
+        assert not hasattr(restored, '_files')
+        assert restored.num_rows == dataset.num_rows
+        assert np.array_equal(_fill(restored, BasicVariable('Vtx.z'), GreaterThanCut('Vtx.z', 0)), expected)
+
+        restored = _roundtrip(dataset)
+        restored.ensure_columns(['Vtx.z'])
+        assert np.array_equal(restored.get_column('z', 'Vtx'), dataset.get_column('z', 'Vtx'))
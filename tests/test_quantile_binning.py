@@ -0,0 +1,71 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from simonplot.plottables import ParquetDataset, NanoEventsDataset
+from simonplot.variable import BasicVariable
+from simonplot.cut import GreaterThanCut, NoCut
+from simonplot.binning import AutoQuantileBinning
+
+def _dataset(tmp_path, name, values):
+    pq.write_table(pa.table({'x' : values}), tmp_path / ('%s.parquet'%name))
+    return ParquetDataset(name, None, name, str(tmp_path / ('%s.parquet'%name)))
+
+def _build(binning, datasets, cut=NoCut(), transform=None):
+    variable = BasicVariable('x')
+    return binning.build_auto_axis([variable]*len(datasets), [cut]*len(datasets), datasets, transform=transform)
+
+def test_equal_population_for_long_tails(tmp_path):
+    values = np.random.default_rng(0).exponential(1, 100000)
+    axis = _build(AutoQuantileBinning(10), [_dataset(tmp_path, 'a', values)])
+
+    assert len(axis.edges) == 11
+    assert axis.edges[0] == values.min() and axis.edges[-1] == values.max()
+    counts, _ = np.histogram(values, bins=axis.edges)
+    assert np.all(np.abs(counts - 10000) < 300)
+
+def test_merged_across_datasets(tmp_path):
+    rng = np.random.default_rng(1)
+    first, second = rng.normal(0, 1, 50000), rng.normal(5, 0.5, 20000)
+    axis = _build(AutoQuantileBinning(7), [_dataset(tmp_path, 'a', first), _dataset(tmp_path, 'b', second)])
+
+    counts, _ = np.histogram(np.concatenate([first, second]), bins=axis.edges)
+    assert np.all(np.abs(counts - 10000) < 300)
+
+def test_default_nbins(tmp_path):
+    axis = _build(AutoQuantileBinning(), [_dataset(tmp_path, 'a', np.random.default_rng(2).normal(0, 1, 1000))])
+    # same heuristic as AutoBinning: cube root of the number of rows, between 20 and 100
+    assert len(axis.edges) == 21
+
+def test_discrete_values_give_unique_edges(tmp_path):
+    values = np.random.default_rng(3).integers(0, 3, 1000).astype(float)
+    axis = _build(AutoQuantileBinning(10), [_dataset(tmp_path, 'a', values)])
+    assert np.all(np.diff(axis.edges) > 0)
+    assert axis.edges[0] == 0 and axis.edges[-1] == 2
+
+    constant = _build(AutoQuantileBinning(10), [_dataset(tmp_path, 'b', np.full(10, 4.0))])
+    assert list(constant.edges) == [3.5, 4.5]
+
+def test_log_transform_drops_non_positive_edges(tmp_path):
+    values = np.random.default_rng(4).normal(1, 1, 10000)
+    axis = _build(AutoQuantileBinning(10), [_dataset(tmp_path, 'a', values)], transform='log')
+    assert np.all(axis.edges > 0)
+
+def test_no_values(tmp_path):
+    dataset = _dataset(tmp_path, 'a', np.array([1.0, 2.0, np.nan]))
+    with pytest.raises(RuntimeError):
+        _build(AutoQuantileBinning(5), [dataset], cut=GreaterThanCut('x', 10))
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_multi_file_nanoevents(nanoevents_files, executor):
+    variable = BasicVariable('Vtx.z')
+    dataset = NanoEventsDataset('nano', None, 'nano', nanoevents_files, executor=executor, num_workers=1)
+    axis = AutoQuantileBinning(5).build_auto_axis([variable], [NoCut()], [dataset])
+
+    reference = NanoEventsDataset('nano', None, 'nano', nanoevents_files)
+    reference.ensure_columns(['Vtx.z'])
+    z = reference.get_column('z', 'Vtx').to_numpy()
+    # 50 entries, so the sketch is exact
+    assert np.allclose(axis.edges, np.percentile(z, np.linspace(0, 100, 6)))
+    dataset.close()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from simonplot.util import ranges
+from simonplot.util.ranges import RangeStats
+
+@pytest.fixture(params=['jit', 'numpy'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        monkeypatch.setattr(ranges, '_jit', lambda func: None)
+    return request.param
+
+def test_floats_skip_nan(backend):
+    values = np.array([np.nan, 3.0, -2.0, 0.0, 0.5, np.inf])
+    stats = RangeStats.from_values(values)
+    assert stats.nfinite == 4
+    assert stats.as_range() == (-2.0, 0.5, np.inf, np.dtype(np.float64))
+
+def test_floats_match_numpy(backend):
+    values = np.random.default_rng(0).normal(0, 1, 3*ranges._CHUNK_SIZE + 17).astype(np.float32)
+    values[::7] = np.nan
+    minval, minpos, maxval, dtype = RangeStats.from_values(values).as_range()
+    assert minval == np.nanmin(values)
+    assert maxval == np.nanmax(values)
+    assert minpos == values[values > 0].min()
+    assert dtype == np.float32
+
+def test_ints(backend):
+    values = np.array([5, -3, 0, 2], dtype=np.int16)
+    stats = RangeStats.from_values(values)
+    assert stats.nfinite == 4
+    minval, minpos, maxval, dtype = stats.as_range()
+    assert (minval, minpos, maxval) == (-3, 2, 5)
+    assert dtype == np.int16 and type(minval) is np.int16
+
+def test_bool(backend):
+    minval, minpos, maxval, dtype = RangeStats.from_values(np.array([False, True, False])).as_range()
+    assert (minval, minpos, maxval) == (False, True, True)
+    assert dtype == np.bool_
+
+def test_no_positive_values(backend):
+    for values in [np.array([-1.0, 0.0, np.nan]), np.array([-4, 0], dtype=np.int32)]:
+        minval, minpos, maxval, _ = RangeStats.from_values(values).as_range()
+        assert np.isnan(minpos)
+        assert maxval == 0
+
+def test_merge(backend):
+    first = RangeStats.from_values(np.array([1.0, 4.0]))
+    second = RangeStats.from_values(np.array([-2.0, 0.25, np.nan]))
+    merged = first + second
+    assert merged.nfinite == 4
+    assert merged.as_range() == (-2.0, 0.25, 4.0, np.dtype(np.float64))
+
+@pytest.mark.parametrize('values', [np.zeros(0), np.array([np.nan, np.nan])])
+def test_no_finite_values_is_neutral(backend, values):
+    empty = RangeStats.from_values(values)
+    info = np.finfo(np.float64)
+    assert empty.as_range() == (info.max, info.max, info.min, np.dtype(np.float64))
+
+    other = RangeStats.from_values(np.array([1.0, 2.0]))
+    assert (empty + other).as_range() == other.as_range()
+
+def test_empty_ints_are_neutral():
+    assert RangeStats.from_values(np.zeros(0, dtype=np.int8)).as_range() == (127, 127, -128, np.dtype(np.int8))
@@ -0,0 +1,58 @@
+import numpy as np
+import hist
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from simonplot.util.rate import RateStruct, RateHistStruct
+from simonplot.util.histplot import simon_histplot, simon_histplot_ratio
+
+def _axis():
+    return hist.axis.Regular(5, 0, 10)
+
+def _sample(n=2000):
+    rng = np.random.default_rng(3)
+    return rng.uniform(0, 1, n), rng.uniform(0, 10, n), rng.uniform(0.5, 2.0, n)
+
+def test_thresholds_match_single_fills():
+    discriminant, wrt, weight = _sample()
+    thresholds = [0.2, 0.5, 0.9]
+
+    H = RateStruct(discriminant, wrt, thresholds=thresholds).fill(_axis(), weight)
+    assert H.thresholds == [repr(t) for t in thresholds]
+
+    for i, t in enumerate(thresholds):
+        single = RateStruct(discriminant >= t, wrt).fill(_axis(), weight)
+        assert np.allclose(H.at_threshold(i).values(), single.values())
+        assert np.allclose(H.at_threshold(i).variances(), single.variances())
+
+def test_nearby_thresholds_get_distinct_labels():
+    discriminant, wrt, weight = _sample()
+    H = RateStruct(discriminant, wrt, thresholds=[0.1, 0.1000001, 0.1]).fill(_axis(), weight)
+    assert H.thresholds == ['0.1', '0.1000001']
+
+def test_pass_fail_constructor():
+    discriminant, wrt, weight = _sample()
+    H = RateStruct(discriminant > 0.5, wrt).fill(_axis(), weight)
+
+    rebuilt = RateHistStruct(H.Hpass, H.Hfail)
+    assert np.allclose(rebuilt.values(), H.values())
+    assert np.allclose(rebuilt.variances(), H.variances())
+
+    fromclassmethod = RateHistStruct.from_pass_fail(H.Hpass, H.Hfail)
+    assert np.allclose(fromclassmethod.values(), H.values())
+
+def test_plot_one_curve_per_threshold():
+    discriminant, wrt, weight = _sample()
+    H = RateStruct(discriminant, wrt, thresholds=[0.2, 0.5, 0.9]).fill(_axis(), weight)
+
+    fig, ax = plt.subplots()
+    _, vals = simon_histplot(H, ax=ax, label='sample', color='red')
+    assert len(ax.containers) == 3
+    assert [c.get_label() for c in ax.containers] == ['sample (threshold %s)'%t for t in H.thresholds]
+    assert len(vals) == 3 * 5
+
+    _, ratio, ratio_err = simon_histplot_ratio(H, H, ax=ax)
+    assert np.allclose(ratio[np.isfinite(ratio)], 1.0)
+    assert len(ratio_err) == 3 * 5
+    plt.close(fig)
@@ -0,0 +1,83 @@
+import os
+import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from simonplot.variable import BasicVariable
+from simonplot.cut import GreaterThanCut
+from simonplot.binning import BasicBinning
+
+COLUMNS = ['x', 'w', 'Jet.pt']
+VARIABLE = BasicVariable('Jet.pt')
+CUT = GreaterThanCut('x', 0.5)
+WEIGHT = BasicVariable('w')
+
+def _fill(handle):
+    # in a worker process
+    return handle.fill_hist(VARIABLE, CUT, WEIGHT, BasicBinning(10, 0, 100).build_axis(VARIABLE)).values()
+
+@pytest.fixture
+def shared(columnar_dataset, tmp_path):
+    handle = columnar_dataset.share(COLUMNS, scratch_dir=str(tmp_path))
+    yield handle
+    handle.unlink()
+
+def test_handle_pickles_small(shared):
+    shared.num_rows
+    shared.get_column('x')
+    assert len(pickle.dumps(shared)) < 2000
+
+def test_columns_are_zero_copy(shared):
+    before = pa.total_allocated_bytes()
+    x = shared.get_column('x')
+    pt = shared.get_column('pt', 'Jet')
+    assert pa.total_allocated_bytes() == before
+
+    # views of the read-only mapped file
+    assert not x.flags.writeable
+    assert len(x) == shared.num_rows == 5000
+    assert len(pt) == 5000
+
+def test_matches_parent(columnar_dataset, shared):
+    restored = pickle.loads(pickle.dumps(shared))
+    for col in ['x', 'w']:
+        assert np.array_equal(restored.get_column(col), columnar_dataset.get_column(col))
+
+    axis = BasicBinning(10, 0, 100).build_axis(VARIABLE)
+    expected = columnar_dataset.fill_hist(VARIABLE, CUT, WEIGHT, axis).values()
+    assert np.allclose(restored.fill_hist(VARIABLE, CUT, WEIGHT, axis).values(), expected)
+
+def test_fill_in_worker_processes(columnar_dataset, shared):
+    expected = columnar_dataset.fill_hist(VARIABLE, CUT, WEIGHT, BasicBinning(10, 0, 100).build_axis(VARIABLE)).values()
+
+    with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context('spawn')) as pool:
+        results = list(pool.map(_fill, [shared, shared]))
+    for result in results:
+        assert np.allclose(result, expected)
+
+def test_keeps_normalization(columnar_dataset, tmp_path):
+    columnar_dataset.set_xsec(2.0)
+    columnar_dataset.compute_weight(1.0)
+    handle = columnar_dataset.share(['x'], scratch_dir=str(tmp_path))
+
+    assert handle._weight == columnar_dataset._weight
+    assert handle.num_events == columnar_dataset.num_events
+    handle.unlink()
+
+def test_unshared_columns_raise(shared):
+    with pytest.raises(RuntimeError):
+        shared.ensure_columns(['y'])
+
+def test_unlink(columnar_dataset, tmp_path):
+    handle = columnar_dataset.share(['x'], scratch_dir=str(tmp_path))
+    x = handle.get_column('x')
+    handle.unlink()
+    assert not os.path.exists(handle.files[0])
+
+    # already mapped columns stay valid
+    assert np.array_equal(x, columnar_dataset.get_column('x'))
+    handle.unlink()
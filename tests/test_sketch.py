@@ -0,0 +1,142 @@
+import numpy as np
+import hist
+import pytest
+
+from simonplot.util.sketch import QuantileSketch
+from simonplot.util.profile import ProfileStruct, ProfileHistStruct
+
+PERCENTILES = [0, 5, 25, 50, 75, 95, 100]
+
+def _entries(n, nbins, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, nbins, n), rng.normal(0, 1, n)
+
+def test_exact_while_uncompressed():
+    binidx, values = _entries(300, 3)
+    sketch = QuantileSketch(3, 1000)
+    sketch.add(binidx, values, np.ones(len(values)))
+
+    result = sketch.quantiles(PERCENTILES)
+    for b in range(3):
+        assert np.allclose(result[:, b], np.percentile(values[binidx == b], PERCENTILES))
+
+def test_approximate_after_compression():
+    binidx, values = _entries(200000, 2)
+    sketch = QuantileSketch(2, 100)
+    sketch.add(binidx, values, np.ones(len(values)))
+    assert sketch.num_centroids <= 2*100
+
+    result = sketch.quantiles([5, 50, 95])
+    for b in range(2):
+        expected = np.percentile(values[binidx == b], [5, 50, 95])
+        assert np.allclose(result[:, b], expected, atol=0.05)
+
+def test_merge_matches_single_sketch():
+    binidx, values = _entries(400, 4)
+    whole = QuantileSketch(4, 1000)
+    whole.add(binidx, values, np.ones(len(values)))
+
+    first = QuantileSketch(4, 1000)
+    first.add(binidx[:150], values[:150], np.ones(150))
+    second = QuantileSketch(4, 1000)
+    second.add(binidx[150:], values[150:], np.ones(250))
+    first += second
+
+    assert np.allclose(first.quantiles(PERCENTILES), whole.quantiles(PERCENTILES))
+
+def test_min_max_survive_compression():
+    binidx, values = _entries(50000, 3)
+    sketch = QuantileSketch(4, 20)
+    sketch.add(binidx, values, np.ones(len(values)))
+
+    for b in range(3):
+        assert sketch.min[b] == values[binidx == b].min()
+        assert sketch.max[b] == values[binidx == b].max()
+    assert np.isnan(sketch.min[3]) and np.isnan(sketch.max[3])
+    assert np.all(np.isnan(sketch.quantiles([50])[:, 3]))
+
+def test_rejects_negative_weights():
+    sketch = QuantileSketch(1, 10)
+    with pytest.raises(RuntimeError):
+        sketch.add(np.zeros(2, dtype=int), np.array([1.0, 2.0]), np.array([1.0, -1.0]))
+
+def _profile(x, y, weight, weighted):
+    data = ProfileStruct(x, y, 'median', weighted=weighted)
+    return ProfileHistStruct(data, [hist.axis.Regular(4, 0, 4)], weight=weight if weighted else None)
+
+def test_profile_is_unweighted_by_default():
+    rng = np.random.default_rng(1)
+    x = rng.uniform(0, 4, 500)
+    y = rng.normal(0, 1, 500)
+    weight = rng.uniform(-1, 2, 500)
+
+    profile = _profile(x, y, weight, weighted=False)
+    binidx = np.floor(x).astype(int)
+    expected = [np.median(y[binidx == b]) for b in range(4)]
+    assert np.allclose(profile.values(), expected)
+    assert np.allclose(profile.stats['count'], np.bincount(binidx, minlength=4))
+
+def test_weighted_profile_is_opt_in():
+    rng = np.random.default_rng(2)
+    x = rng.uniform(0, 4, 500)
+    y = rng.normal(0, 1, 500)
+
+    with pytest.raises(RuntimeError):
+        _profile(x, y, rng.uniform(-1, 2, 500), weighted=True)
+
+    weight = rng.uniform(0.5, 2, 500)
+    profile = ProfileHistStruct(ProfileStruct(x, y, 'mean', weighted=True), [hist.axis.Regular(4, 0, 4)], weight=weight)
+    binidx = np.floor(x).astype(int)
+    expected = [np.average(y[binidx == b], weights=weight[binidx == b]) for b in range(4)]
+    assert np.allclose(profile.values(), expected)
+
+def test_exact_mode_matches_np_percentile():
+    # well above the default size of 200 entries per bin
+    binidx, values = _entries(5000, 2)
+    sketch = QuantileSketch(2, None)
+    sketch.add(binidx[:3000], values[:3000], np.ones(3000))
+    sketch.add(binidx[3000:], values[3000:], np.ones(2000))
+    assert sketch.num_centroids == 5000
+
+    result = sketch.quantiles(PERCENTILES)
+    for b in range(2):
+        assert np.allclose(result[:, b], np.percentile(values[binidx == b], PERCENTILES))
+
+def test_default_size_accuracy_on_large_bin():
+    binidx, values = _entries(5000, 2)
+    sketch = QuantileSketch(2, 200)
+    sketch.add(binidx, values, np.ones(len(values)))
+
+    result = sketch.quantiles(PERCENTILES)
+    for b in range(2):
+        entries = np.sort(values[binidx == b])
+        assert len(entries) > 200
+        # the extremes are exact, and everything else is within 0.5% in rank
+        assert result[0, b] == entries[0] and result[-1, b] == entries[-1]
+        ranks = 100 * np.searchsorted(entries, result[:, b]) / len(entries)
+        assert np.all(np.abs(ranks - PERCENTILES) <= 0.5)
+
+def test_merging_exact_into_sized_sketch():
+    binidx, values = _entries(1000, 1)
+    exact = QuantileSketch(1, None)
+    exact.add(binidx[:500], values[:500], np.ones(500))
+    sized = QuantileSketch(1, 50)
+    sized.add(binidx[500:], values[500:], np.ones(500))
+
+    exact += sized
+    assert exact.size == 50
+    assert exact.num_centroids <= 50
+
+def test_exact_profile_percentiles(monkeypatch):
+    from simonplot.config import config
+    monkeypatch.setitem(config['quantile_sketch'], 'size', None)
+
+    rng = np.random.default_rng(3)
+    x = rng.uniform(0, 2, 2000)
+    y = rng.exponential(1, 2000)
+    data = ProfileStruct(x, y, 'percentile-range', mode_params=(10, 90))
+    profile = ProfileHistStruct(data, [hist.axis.Regular(2, 0, 2)])
+
+    binidx = np.floor(x).astype(int)
+    expected = [np.subtract(*np.percentile(y[binidx == b], [90, 10])) for b in range(2)]
+    assert np.allclose(profile.values(), expected)
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from simonplot.util.unique import unique_values
+
+@pytest.mark.parametrize('values', [
+    np.array([3, 1, 2, 3, 1], dtype=np.int64),
+    np.array([-128, 127, 0, -128], dtype=np.int8),
+    np.array([0, 255, 7], dtype=np.uint8),
+    np.array([-5, 10**12, 3], dtype=np.int64),
+    np.array([0, 2**63], dtype=np.uint64),
+    np.array([True, False, True]),
+    np.array([True, True]),
+    np.array([0.5, np.nan, -1.0, 0.5]),
+    np.array([], dtype=np.int32),
+    np.array([], dtype=np.float64),
+])
+def test_matches_np_unique(values):
+    result = unique_values(values)
+    expected = np.unique(values)
+    assert result.dtype == expected.dtype
+    assert np.array_equal(result, expected, equal_nan=values.dtype.kind == 'f')
+
+def test_random_ints():
+    values = np.random.default_rng(0).integers(-1000, 1000, 10000).astype(np.int16)
+    assert np.array_equal(unique_values(values), np.unique(values))
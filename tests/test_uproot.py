@@ -0,0 +1,71 @@
+import numpy as np
+import awkward as ak
+import pytest
+
+uproot = pytest.importorskip('uproot')
+
+import simonplot.plottables.Datasets as Datasets
+from simonplot.plottables import UprootTreeDataset, NanoEventsDataset
+from simonplot.variable import BasicVariable, ConstantVariable
+from simonplot.cut import GreaterThanCut
+from simonplot.binning import BasicBinning
+
+@pytest.fixture
+def fnames(nanoevents_files):
+    return [list(f)[0] for f in nanoevents_files]
+
+@pytest.fixture
+def iterations(monkeypatch):
+    '''
+    Count of uproot.iterate passes made by UprootTreeDataset
+    '''
+    calls = []
+    iterate = Datasets.uproot.iterate
+    def counting(*args, **kwargs):
+        calls.append(kwargs['filter_name'])
+        return iterate(*args, **kwargs)
+    monkeypatch.setattr(Datasets.uproot, 'iterate', counting)
+    return calls
+
+def test_reads_all_columns_in_one_pass(fnames, iterations):
+    dataset = UprootTreeDataset('u', None, 'u', fnames)
+    dataset.ensure_columns(['Track.pt', 'Track.eta', 'Vtx.z'])
+    assert len(iterations) == 1
+    assert sorted(iterations[0]) == ['Track_eta', 'Track_pt', 'Vtx_z']
+
+    expected = uproot.concatenate({fname : 'Events' for fname in fnames}, ['Track_pt', 'Vtx_z'])
+    assert ak.array_equal(dataset.get_column('pt', 'Track'), expected['Track_pt'])
+    assert ak.array_equal(dataset.get_column('z', 'Vtx'), expected['Vtx_z'])
+
+    # already-loaded columns are not read again
+    dataset.ensure_columns(['Track.pt', 'Vtx.z'])
+    assert len(iterations) == 1
+
+def test_step_size_does_not_change_the_result(fnames, iterations):
+    whole = UprootTreeDataset('u', None, 'u', fnames)
+    chunked = UprootTreeDataset('u', None, 'u', fnames, step_size=7, num_workers=2)
+    for dataset in [whole, chunked]:
+        dataset.ensure_columns(['Track.pt'])
+        assert dataset.num_rows == 50
+    assert ak.array_equal(chunked.get_column('pt', 'Track'), whole.get_column('pt', 'Track'))
+
+def test_matches_nanoevents(nanoevents_files, fnames):
+    variable = BasicVariable('Track.pt')
+    cut = GreaterThanCut('Vtx.z', 0)
+    axis = BasicBinning(10, 0, 50).build_axis(variable)
+
+    uprootH = UprootTreeDataset('u', None, 'u', fnames).fill_hist(variable, cut, ConstantVariable(1.0), axis)
+    nanoH = NanoEventsDataset('n', None, 'n', nanoevents_files).fill_hist(variable, cut, ConstantVariable(1.0), axis)
+    assert np.array_equal(uprootH.values(), nanoH.values())
+
+def test_num_rows_without_reading(fnames, iterations):
+    dataset = UprootTreeDataset('u', None, 'u', fnames)
+    assert dataset.num_rows == 50
+    assert len(iterations) == 0
+
+def test_errors(fnames):
+    dataset = UprootTreeDataset('u', None, 'u', fnames)
+    with pytest.raises(RuntimeError):
+        dataset.get_column('pt', 'Track')
+    with pytest.raises(RuntimeError):
+        dataset.ensure_columns(['Muon.pt'])
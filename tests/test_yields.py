@@ -0,0 +1,76 @@
+import copy
+
+import numpy as np
+import pytest
+
+from simonplot.plottables import DatasetStack
+from simonplot.variable import BasicVariable, ConstantVariable
+from simonplot.cut import GreaterThanCut, NoCut
+from simonplot.binning import BasicBinning
+
+def _forbid(monkeypatch, dataset, method):
+    def fail(*args, **kwargs):
+        raise AssertionError("%s should not be called"%method)
+    monkeypatch.setattr(dataset, method, fail)
+
+@pytest.mark.parametrize('weight', [BasicVariable('w'), ConstantVariable(2.0)], ids=lambda w: w.key)
+def test_fill_hist_fills_the_ledger(columnar_dataset, weight, monkeypatch):
+    variable = BasicVariable('Jet.pt')
+    cut = GreaterThanCut('x', 0.5)
+    columnar_dataset._weight = 0.5
+    columnar_dataset.fill_hist(variable, cut, weight, BasicBinning(10, 0, 100).build_axis(variable))
+
+    # the yield counts events rather than the objects filled
+    mask = np.asarray(cut.evaluate(columnar_dataset))
+    wgt = columnar_dataset.get_column('w')[mask] if isinstance(weight, BasicVariable) else np.full(mask.sum(), 2.0)
+    expected = 0.5 * np.sum(wgt)
+
+    _forbid(monkeypatch, columnar_dataset, 'ensure_columns')
+    assert columnar_dataset.estimate_yield(cut, weight) == pytest.approx(expected)
+
+def test_ledger_is_keyed_on_dataset_weight(columnar_dataset):
+    weight = BasicVariable('w')
+    first = columnar_dataset.estimate_yield(NoCut(), weight)
+
+    columnar_dataset._weight = 3.0
+    assert columnar_dataset.estimate_yield(NoCut(), weight) == pytest.approx(3 * first)
+    assert len(columnar_dataset._yields) == 2
+
+def test_order_by_yield_reads_the_ledger(columnar_dataset, monkeypatch):
+    small = copy.deepcopy(columnar_dataset)
+    small._weight = 0.1
+    stack = DatasetStack('stack', None, 'stack', [columnar_dataset, small])
+
+    variable = BasicVariable('x')
+    weight = BasicVariable('w')
+    stack.fill_hist(variable, NoCut(), weight, BasicBinning(10, -3, 3).build_axis(variable))
+
+    for dataset in [columnar_dataset, small]:
+        _forbid(monkeypatch, dataset, 'ensure_columns')
+    stack.order_by_yield(NoCut(), weight)
+    assert stack._datasets[0] is small
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_multi_file_nanoevents_ledger(nanoevents_files, executor, monkeypatch):
+    from simonplot.plottables import NanoEventsDataset
+
+    dataset = NanoEventsDataset('nano', None, 'nano', nanoevents_files, executor=executor, num_workers=1)
+    fresh = NanoEventsDataset('nano', None, 'nano', nanoevents_files)
+
+    variable = BasicVariable('Track.pt')
+    cut = GreaterThanCut('Vtx.z', -3)
+    weight = BasicVariable('Vtx.z')
+    dataset._weight = fresh._weight = 2.0
+
+    dataset.fill_hist(variable, cut, weight, BasicBinning(10, 0, 50).build_axis(variable))
+    eta = BasicVariable('Track.eta')
+    dataset.fill_hist_2D(variable, eta, NoCut(), weight, BasicBinning(10, 0, 50).build_axis(variable), BasicBinning(10, -2, 2).build_axis(eta))
+
+    # the yields come back with the per-file histograms, so nothing is evaluated again
+    _forbid(monkeypatch, dataset, '_map_files')
+    _forbid(monkeypatch, dataset, 'ensure_columns')
+    assert dataset.estimate_yield(cut, weight) == pytest.approx(fresh.estimate_yield(cut, weight))
+    assert dataset.estimate_yield(NoCut(), weight) == pytest.approx(fresh.estimate_yield(NoCut(), weight))
+
+    monkeypatch.undo()
+    dataset.close()
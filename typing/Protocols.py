@@ -169,10 +169,19 @@ class BaseDatasetProtocol(Protocol):
     def get_range(self, var : VariableProtocol, cut : CutProtocol) -> Tuple[Any, Any, Any, np.dtype]:
         ...
 
+    def get_quantile_sketch(self, var : VariableProtocol, cut : CutProtocol) -> Any:
+        ...
+
     @property
     def is_stack(self) -> bool:
         ...
 
+    def leaf_datasets(self) -> Sequence[Any]:
+        ...
+
+    def file_datasets(self) -> Sequence[Any]:
+        ...
+
     def set_label(self, label : str) -> None:
         ...
 
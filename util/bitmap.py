@@ -0,0 +1,70 @@
+'''
+Bitmap secondary indexes for categorical integer columns.
+
+For every distinct value of the column we keep a bitmap of the rows holding that value,
+packed 8 rows per byte (np.packbits). Equality selections then become a dictionary lookup,
+and AND/OR combinations of them are bitwise operations on the packed bytes,
+touching 1/8th of the memory of the equivalent boolean masks
+
+Rare values, whose sorted row indices take less memory than a full bitmap, are kept as row indices instead,
+and only expanded to a bitmap when selected. That way the whole index takes at most a few bytes per row
+however many distinct values the column has, rather than num_rows/8 bytes per value
+'''
+
+import numpy as np
+
+from typing import Any
+
+class BitmapIndex:
+    def __init__(self, values : np.ndarray):
+        self._num_rows = len(values)
+        self._rowtype = np.int32 if self._num_rows < 2**31 else np.int64
+
+        uniques, inverse = np.unique(values, return_inverse=True)
+        order = np.argsort(inverse, kind='stable').astype(self._rowtype)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(inverse, minlength=len(uniques)))])
+
+        # value -> packed bitmap (dense values) or sorted row indices (sparse values)
+        self._bitmaps = {}
+        self._rows = {}
+        bitmap_nbytes = (self._num_rows + 7) // 8
+        for i, value in enumerate(uniques):
+            rows = order[offsets[i]:offsets[i+1]]
+            if rows.nbytes < bitmap_nbytes:
+                self._rows[value.item()] = rows.copy()
+            else:
+                bits = np.zeros(self._num_rows, dtype=bool)
+                bits[rows] = True
+                self._bitmaps[value.item()] = np.packbits(bits)
+
+    @property
+    def num_rows(self) -> int:
+        return self._num_rows
+
+    @property
+    def values(self) -> np.ndarray:
+        return np.asarray(sorted(list(self._bitmaps.keys()) + list(self._rows.keys())))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(bits.nbytes for bits in self._bitmaps.values()) + sum(rows.nbytes for rows in self._rows.values())
+
+    def equals(self, value : Any) -> np.ndarray:
+        '''
+        Packed bitmap of the rows equal to value
+        '''
+        if value in self._bitmaps:
+            return self._bitmaps[value]
+
+        bits = np.zeros((self._num_rows + 7) // 8, dtype=np.uint8)
+        if value in self._rows:
+            # np.packbits is big-endian within each byte
+            rows = self._rows[value]
+            np.bitwise_or.at(bits, rows >> 3, (0x80 >> (rows & 7)).astype(np.uint8))
+        return bits
+
+def unpack_bitmap(bits : np.ndarray, num_rows : int) -> np.ndarray:
+    '''
+    Packed bitmap -> boolean mask
+    '''
+    return np.unpackbits(bits, count=num_rows).view(bool)
@@ -0,0 +1,93 @@
+'''
+Memoization of variable and cut evaluations on a dataset.
+
+Inside an evaluation_context(dataset), every Variable.evaluate(dataset, cut) and Cut.evaluate(dataset)
+result is cached on the dataset, so subexpressions shared between the variable, the weight, and the cut
+(or between several nodes of one variable tree) are evaluated only once.
+Outside of an evaluation context nothing is cached.
+
+Cache entries are keyed by the full definition of the variable/cut (type and all parameters, recursively)
+rather than just by key, since keys format numbers with %g and so are not unique
+'''
+
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+from typing import Any, Hashable
+
+def memo_key(obj : Any) -> Hashable:
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    elif isinstance(obj, (list, tuple)):
+        return tuple(memo_key(item) for item in obj)
+    elif isinstance(obj, dict):
+        return tuple(sorted((k, memo_key(v)) for k, v in obj.items()))
+    elif isinstance(obj, np.ndarray):
+        return (obj.dtype.str, obj.shape, obj.tobytes())
+    elif hasattr(obj, 'evaluate') and hasattr(obj, '__dict__'):
+        # a variable or cut. Labels and centerlines don't change the result
+        transient = getattr(obj, '_transient', ())
+        return (type(obj),) + tuple(
+            (name, memo_key(value)) for name, value in sorted(vars(obj).items())
+            if name not in transient and name not in ['_label', '_centerline']
+        )
+    elif isinstance(obj, np.ufunc):
+        # by name rather than id, so that the key is the same in every process (eg for sidecar file names)
+        return ('ufunc', obj.__name__)
+    else:
+        # eg other functions
+        return ('id', id(obj))
+
+@contextmanager
+def evaluation_context(dataset):
+    '''
+    Memoize evaluations on dataset until the context exits
+    Re-entrant: nested contexts on the same dataset share the outer cache
+    '''
+    if getattr(dataset, '_eval_cache', None) is not None:
+        yield
+        return
+
+    dataset._eval_cache = {}
+    try:
+        yield
+    finally:
+        del dataset._eval_cache
+
+def with_evaluation_context(method):
+    '''
+    Decorator for dataset methods, running the whole method inside an evaluation_context(self)
+    '''
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with evaluation_context(self):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def memoize_variable_evaluate(evaluate):
+    @wraps(evaluate)
+    def wrapper(self, dataset, cut):
+        cache = getattr(dataset, '_eval_cache', None)
+        if cache is None:
+            return evaluate(self, dataset, cut)
+
+        key = ('variable', memo_key(self), memo_key(cut))
+        if key not in cache:
+            cache[key] = evaluate(self, dataset, cut)
+        return cache[key]
+    return wrapper
+
+def memoize_cut_evaluate(evaluate):
+    @wraps(evaluate)
+    def wrapper(self, dataset):
+        cache = getattr(dataset, '_eval_cache', None)
+        if cache is None:
+            return evaluate(self, dataset)
+
+        key = ('cut', memo_key(self))
+        if key not in cache:
+            cache[key] = evaluate(self, dataset)
+        return cache[key]
+    return wrapper
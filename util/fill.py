@@ -0,0 +1,94 @@
+'''
+Helpers for filling histograms from evaluated variables and weights
+'''
+
+import numpy as np
+import awkward as ak
+
+from typing import Any, Tuple
+
+def _flat_view(layout : Any) -> np.ndarray | None:
+    '''
+    View of the leaf buffer holding all the values of a layout made of nested ListOffsetArrays over a NumpyArray,
+    (possibly wrapped in UnmaskedArrays)
+    without copying; None for any other layout (option types, records, ListArrays, ...)
+    '''
+    start, stop = None, None
+    while isinstance(layout, (ak.contents.ListOffsetArray, ak.contents.UnmaskedArray)):
+        # UnmaskedArray is an option type without any missing values (eg nullable parquet columns)
+        if isinstance(layout, ak.contents.ListOffsetArray):
+            offsets = np.asarray(layout.offsets)
+            if start is None:
+                start, stop = offsets[0], offsets[-1]
+            else:
+                start, stop = offsets[start], offsets[stop]
+        layout = layout.content
+
+    if not isinstance(layout, ak.contents.NumpyArray) or layout.data.ndim != 1:
+        return None
+    
+    data = np.asarray(layout.data)
+    if start is None:
+        return data
+    else:
+        return data[start:stop]
+
+def flatten_values(arr : Any) -> np.ndarray:
+    '''
+    All the values of arr as a 1D numpy array, zero-copy where the layout allows
+    '''
+    if isinstance(arr, ak.Array):
+        view = _flat_view(arr.layout)
+        if view is not None:
+            return view
+        return ak.to_numpy(ak.flatten(arr, axis=None))
+    else:
+        return np.ravel(arr)
+
+def _counts_per_event(values : ak.Array) -> np.ndarray:
+    '''
+    Number of entries in each event of a jagged array, summed over all levels of nesting
+    '''
+    while values.ndim > 2:
+        values = ak.flatten(values, axis=2)
+    return ak.to_numpy(ak.num(values, axis=1))
+
+def flatten_for_fill(values : Any, weight : Any, scale : float = 1.0) -> Tuple[np.ndarray, np.ndarray | float]:
+    '''
+    Flatten values and weight into the 1D arrays passed to hist.fill, with weights multiplied by scale
+
+    Where the layout allows, the returned arrays are views of the awkward buffers rather than copies,
+    so they must not be modified in place
+
+    weight can be
+     - a scalar (eg from ConstantVariable), which is returned as a scalar
+     - per-event while values are per-object, in which case it is repeated onto the objects
+       (scaling first, on the shorter per-event array)
+     - the same layout as values
+    Events whose per-event weight is missing (None, eg after a left join) are left out, as ak.flatten would
+    '''
+    if isinstance(weight, ak.Array) and weight.ndim == 1:
+        try:
+            weight = ak.to_numpy(weight, allow_missing=False)
+        except ValueError:
+            if not hasattr(values, '__len__') or len(values) != len(weight):
+                raise RuntimeError("flatten_for_fill: per-event weight has length %d, but there are %d events!"%(len(weight), len(values)))
+            present = ~ak.to_numpy(ak.is_none(weight))
+            return flatten_for_fill(values[present], weight[present], scale)
+
+    flatvals = flatten_values(values)
+
+    if not isinstance(weight, ak.Array) and np.ndim(weight) == 0:
+        return flatvals, float(np.asarray(weight)) * scale
+
+    if isinstance(values, ak.Array) and values.ndim > 1 and isinstance(weight, np.ndarray) and weight.ndim == 1:
+        if len(weight) != len(values):
+            raise RuntimeError("flatten_for_fill: per-event weight has length %d, but there are %d events!"%(len(weight), len(values)))
+        return flatvals, np.repeat(weight * scale, _counts_per_event(values))
+
+    flatwgt = flatten_values(weight)
+    if len(flatwgt) != len(flatvals):
+        raise RuntimeError("flatten_for_fill: weight has %d entries, but there are %d values!"%(len(flatwgt), len(flatvals)))
+    if scale != 1.0:
+        flatwgt = flatwgt * scale
+    return flatvals, flatwgt
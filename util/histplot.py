@@ -105,7 +105,32 @@ def simon_histplot_arbitrary(vals : np.ndarray, cov : np.ndarray,
     return _simon_histplot(vals, errs, edges, centers, widths,
                            ax=ax, density=density, fillbetween=fillbetween, **kwargs)
 
+def _threshold_kwargs(kwargs, thresholds, i):
+    '''
+    Style for the curve of threshold i of a multi-threshold rate:
+    the threshold is added to the label, and a fixed color is faded for higher thresholds
+    '''
+    kwargs = kwargs.copy()
+    if kwargs.get('label') is not None:
+        kwargs['label'] = '%s (threshold %s)'%(kwargs['label'], thresholds[i])
+    else:
+        kwargs['label'] = 'threshold %s'%thresholds[i]
+
+    if kwargs.get('color') is not None and len(thresholds) > 1:
+        kwargs['alpha'] = 1.0 - 0.6*i/(len(thresholds)-1)
+    return kwargs
+
 def simon_histplot(H, ax=None, density=False, fillbetween = None, **kwargs):
+    if isinstance(H, RateHistStruct) and H.thresholds is not None:
+        # one turn-on curve per threshold
+        thresholds = H.thresholds
+        results = [
+            simon_histplot(H.at_threshold(i), ax=ax, density=density, fillbetween=fillbetween,
+                           **_threshold_kwargs(kwargs, thresholds, i))
+            for i in range(len(thresholds))
+        ]
+        return results[0][0], np.concatenate([vals for _, vals in results])
+
     if len(H.axes) != 1:
         raise ValueError("histplot only supports 1D histograms")
 
@@ -197,6 +222,21 @@ def simon_histplot_ratio_arbitrary(num, denom,
 def simon_histplot_ratio(Hnum, Hdenom, ax=None, 
                          density=False, pulls=False, **kwargs):
     
+    if isinstance(Hnum, RateHistStruct) and Hnum.thresholds is not None:
+        if not isinstance(Hdenom, RateHistStruct) or Hdenom.thresholds != Hnum.thresholds:
+            raise ValueError("histograms must have the same thresholds")
+
+        thresholds = Hnum.thresholds
+        results = [
+            simon_histplot_ratio(Hnum.at_threshold(i), Hdenom.at_threshold(i), ax=ax,
+                                 density=density, pulls=pulls,
+                                 **_threshold_kwargs(kwargs, thresholds, i))
+            for i in range(len(thresholds))
+        ]
+        return (results[0][0], 
+                np.concatenate([ratio for _, ratio, _ in results]), 
+                np.concatenate([ratio_err for _, _, ratio_err in results]))
+
     if len(Hnum.axes) != 1 or len(Hdenom.axes) != 1:
         raise ValueError("histplot only supports 1D histograms")
 
@@ -0,0 +1,268 @@
+'''
+Kernels for per-object kinematic variables (DeltaPhi, DeltaR, Distance2d, eta/phi from xyz).
+
+These work directly on the flat content and offsets buffers of jagged arrays,
+rather than through chains of high-level awkward ufunc calls which each allocate a new jagged array.
+The selection from the cut is fused into the same pass: only the selected objects are read,
+and the output is written already compacted.
+
+If numba is installed the kernels are compiled on first use;
+otherwise the same computation runs as numpy on the flat buffers
+'''
+
+import numpy as np
+import awkward as ak
+
+from typing import Any, Callable, List, Tuple
+
+_jitted = {}
+def _jit(func : Callable) -> Callable | None:
+    '''
+    numba-compiled version of func, or None if numba is not installed
+    '''
+    if func not in _jitted:
+        try:
+            import numba
+            # error_model='numpy' so that eg division by zero gives inf/nan rather than raising
+            _jitted[func] = numba.njit(nogil=True, error_model='numpy')(func)
+        except ImportError:
+            _jitted[func] = None
+    return _jitted[func]
+
+_NO_INDEX = np.zeros(0, dtype=np.int64)
+
+def _run(loop : Callable, numpy_impl : Callable, nout : int, index : np.ndarray | None, *contents : np.ndarray) -> Tuple[np.ndarray, ...]:
+    dtype = np.result_type(*contents, np.float32)
+
+    jitted = _jit(loop)
+    if jitted is None:
+        if index is not None:
+            contents = tuple(content[index] for content in contents)
+        return tuple(out.astype(dtype, copy=False) for out in numpy_impl(*contents))
+
+    N = len(contents[0]) if index is None else len(index)
+    outs = tuple(np.empty(N, dtype=dtype) for _ in range(nout))
+    jitted(index is not None, _NO_INDEX if index is None else index, *outs, *contents)
+    return outs
+
+def _delta_phi_loop(gather, index, out, phi1, phi2):
+    for i in range(len(out)):
+        j = index[i] if gather else i
+        dphi = phi1[j] - phi2[j]
+        if dphi > np.pi:
+            dphi -= 2*np.pi
+        elif dphi < -np.pi:
+            dphi += 2*np.pi
+        out[i] = dphi
+
+def _delta_phi_numpy(phi1, phi2):
+    dphi = phi1 - phi2
+    dphi = np.where(dphi > np.pi, dphi - 2*np.pi, dphi)
+    dphi = np.where(dphi < -np.pi, dphi + 2*np.pi, dphi)
+    return (dphi,)
+
+def _delta_r_loop(gather, index, out, eta1, phi1, eta2, phi2):
+    for i in range(len(out)):
+        j = index[i] if gather else i
+        deta = eta1[j] - eta2[j]
+        dphi = phi1[j] - phi2[j]
+        if dphi > np.pi:
+            dphi -= 2*np.pi
+        elif dphi < -np.pi:
+            dphi += 2*np.pi
+        out[i] = np.sqrt(deta*deta + dphi*dphi)
+
+def _delta_r_numpy(eta1, phi1, eta2, phi2):
+    dphi, = _delta_phi_numpy(phi1, phi2)
+    return (np.sqrt(np.square(eta1 - eta2) + np.square(dphi)),)
+
+def _distance_2d_loop(gather, index, out, x1, y1, x2, y2):
+    for i in range(len(out)):
+        j = index[i] if gather else i
+        dx = x1[j] - x2[j]
+        dy = y1[j] - y2[j]
+        out[i] = np.sqrt(dx*dx + dy*dy)
+
+def _distance_2d_numpy(x1, y1, x2, y2):
+    return (np.sqrt(np.square(x1 - x2) + np.square(y1 - y2)),)
+
+def _eta_phi_from_xyz_loop(gather, index, eta, phi, x, y, z):
+    for i in range(len(eta)):
+        j = index[i] if gather else i
+        rho = np.sqrt(x[j]*x[j] + y[j]*y[j])
+        eta[i] = np.arcsinh(z[j]/rho)
+        phi[i] = np.arctan2(y[j], x[j])
+
+def _eta_phi_from_xyz_numpy(x, y, z):
+    rho = np.sqrt(np.square(x) + np.square(y))
+    return np.arcsinh(z/rho), np.arctan2(y, x)
+
+def delta_phi(phi1, phi2, index=None):
+    return _run(_delta_phi_loop, _delta_phi_numpy, 1, index, phi1, phi2)
+
+def delta_r(eta1, phi1, eta2, phi2, index=None):
+    return _run(_delta_r_loop, _delta_r_numpy, 1, index, eta1, phi1, eta2, phi2)
+
+def distance_2d(x1, y1, x2, y2, index=None):
+    return _run(_distance_2d_loop, _distance_2d_numpy, 1, index, x1, y1, x2, y2)
+
+def eta_phi_from_xyz(x, y, z, index=None):
+    return _run(_eta_phi_from_xyz_loop, _eta_phi_from_xyz_numpy, 2, index, x, y, z)
+
+def _rows_to_index_loop(offsets, rows, index):
+    k = 0
+    for r in rows:
+        for j in range(offsets[r], offsets[r+1]):
+            index[k] = j
+            k += 1
+
+def _rows_to_index(offsets : np.ndarray, rows : np.ndarray, out_offsets : np.ndarray) -> np.ndarray:
+    '''
+    Positions in the flat content of all the objects in the selected rows
+    '''
+    jitted = _jit(_rows_to_index_loop)
+    if jitted is None:
+        counts = np.diff(out_offsets)
+        return np.repeat(offsets[rows] - out_offsets[:-1], counts) + np.arange(out_offsets[-1])
+
+    index = np.empty(out_offsets[-1], dtype=np.int64)
+    jitted(offsets, rows, index)
+    return index
+
+def _buffers(val : Any) -> Tuple[np.ndarray | None, np.ndarray] | None:
+    '''
+    (offsets, content) of a jagged array with one level of nesting, (None, values) of a flat array,
+    or None for anything else (option types, records, deeper nesting)
+    '''
+    if isinstance(val, np.ndarray):
+        return (None, val) if val.ndim == 1 else None
+    elif not isinstance(val, ak.Array):
+        return None
+
+    # UnmaskedArray is an option type without any missing values (eg nullable parquet columns)
+    layout = val.layout
+    if isinstance(layout, ak.contents.UnmaskedArray):
+        layout = layout.content
+
+    if isinstance(layout, ak.contents.NumpyArray) and layout.data.ndim == 1:
+        return None, np.asarray(layout.data)
+    elif not isinstance(layout, ak.contents.ListOffsetArray):
+        return None
+    
+    content = layout.content
+    if isinstance(content, ak.contents.UnmaskedArray):
+        content = content.content
+
+    if isinstance(content, ak.contents.NumpyArray) and content.data.ndim == 1:
+        return np.asarray(layout.offsets), np.asarray(content.data)
+    else:
+        return None
+
+def _jagged(out : np.ndarray, offsets : np.ndarray) -> ak.Array:
+    return ak.Array(ak.contents.ListOffsetArray(
+        ak.index.Index64(offsets),
+        ak.contents.NumpyArray(out)
+    ))
+
+def evaluate_kernel(kernel : Callable, variables : List[Any], dataset : Any, cut : Any) -> Tuple[Any, ...] | None:
+    '''
+    Evaluate kernel (one of delta_phi, delta_r, distance_2d, eta_phi_from_xyz) on the values of variables,
+    applying cut in the same pass
+
+    The inputs can be per-event or per-object (with one shared jagged layout); per-event inputs are broadcast onto the objects.
+    The cut can be per-event or per-object.
+    Returns the tuple of kernel outputs in the layout that evaluating the variables with the cut would have given,
+    or None if the inputs or cut have a layout that the kernels don't handle, in which case the caller should fall back to awkward
+    '''
+    from simonplot.cut.NoCut import NoCut
+
+    values = [var.evaluate(dataset, NoCut()) for var in variables]
+    any_awkward = any(isinstance(val, ak.Array) for val in values)
+
+    bufs = [_buffers(val) for val in values]
+    if any(buf is None for buf in bufs):
+        return None
+
+    jagged_offsets = [off for off, _ in bufs if off is not None]
+    needs_packing = any(
+        len(off) != len(jagged_offsets[0]) or not np.array_equal(off, jagged_offsets[0]) for off in jagged_offsets
+    ) or (0 < len(jagged_offsets) < len(bufs))
+    if needs_packing:
+        # jagged inputs with different content positions, or per-event inputs to broadcast:
+        # repack everything so that the objects of all inputs line up at the same positions
+        bufs = [buf if buf[0] is None else _buffers(ak.to_packed(val)) for buf, val in zip(bufs, values)]
+        if any(buf is None for buf in bufs):
+            return None
+
+        jagged_offsets = [off for off, _ in bufs if off is not None]
+        for off in jagged_offsets[1:]:
+            if len(off) != len(jagged_offsets[0]) or not np.array_equal(off, jagged_offsets[0]):
+                return None
+
+        if len(jagged_offsets) > 0:
+            counts = np.diff(jagged_offsets[0])
+            for i, (off, content) in enumerate(bufs):
+                if off is None:
+                    if len(content) != len(counts):
+                        return None
+                    bufs[i] = (jagged_offsets[0], np.repeat(content, counts))
+
+    offsets = jagged_offsets[0] if len(jagged_offsets) > 0 else None
+    contents = [content for _, content in bufs]
+    num_rows = len(offsets) - 1 if offsets is not None else len(contents[0])
+    if any(len(content) != len(contents[0]) for content in contents):
+        return None
+
+    mask = slice(None) if cut is None else cut.evaluate(dataset)
+    if isinstance(mask, ak.Array) and mask.ndim == 1:
+        try:
+            mask = ak.to_numpy(mask, allow_missing=False)
+        except ValueError:
+            return None
+
+    if isinstance(mask, slice):
+        if mask != slice(None):
+            return None
+
+        if offsets is None:
+            index = None
+        elif offsets[0] == 0 and offsets[-1] == len(contents[0]):
+            index = None
+            out_offsets = offsets
+        else:
+            index = np.arange(offsets[0], offsets[-1])
+            out_offsets = offsets - offsets[0]
+    elif isinstance(mask, np.ndarray) and mask.ndim == 1 and mask.dtype == bool and len(mask) == num_rows:
+        rows = np.flatnonzero(mask)
+        if offsets is None:
+            index = rows
+        else:
+            out_offsets = np.zeros(len(rows)+1, dtype=np.int64)
+            np.cumsum(np.diff(offsets)[rows], out=out_offsets[1:])
+            index = _rows_to_index(offsets, rows, out_offsets)
+    elif isinstance(mask, ak.Array) and offsets is not None:
+        # per-object mask
+        maskbuf = _buffers(mask)
+        if maskbuf is None or maskbuf[0] is None or maskbuf[1].dtype != bool:
+            return None
+
+        maskoffsets, maskcontent = maskbuf
+        if len(maskoffsets) != len(offsets) or not np.array_equal(np.diff(maskoffsets), np.diff(offsets)):
+            return None
+
+        flatmask = maskcontent[maskoffsets[0]:maskoffsets[-1]]
+        index = offsets[0] + np.flatnonzero(flatmask)
+        passed = np.zeros(len(flatmask)+1, dtype=np.int64)
+        np.cumsum(flatmask, out=passed[1:])
+        out_offsets = passed[offsets - offsets[0]]
+    else:
+        return None
+
+    outs = kernel(*contents, index=index)
+
+    if offsets is not None:
+        return tuple(_jagged(out, out_offsets) for out in outs)
+    elif any_awkward:
+        return tuple(ak.Array(out) for out in outs)
+    else:
+        return outs
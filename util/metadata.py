@@ -0,0 +1,248 @@
+import sqlite3
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.fs
+import pyarrow.parquet as pq
+import pyarrow.compute as pc
+
+from typing import Any, List, Sequence
+
+from simonplot.config import config
+
+class MetadataIndex:
+    '''
+    On-disk (sqlite) cache of per-file parquet metadata:
+    schema, row count, row-group statistics, and optionally sums of generator weights.
+
+    Entries are keyed by a file fingerprint (path, size, modification time),
+    so a rewritten file is simply treated as a new file.
+    Each entry also records the type of filesystem the file was read through (eg 'local', 's3').
+    Stale entries are never read, and can be removed with prune()
+    '''
+    _open_indexes = {}
+
+    @classmethod
+    def open(cls, path : str | None = None) -> "MetadataIndex":
+        '''
+        Shared index object per path, so that many datasets can use the same index
+        If path is None, use the path from config['metadata_index']['path']
+        '''
+        if path is None:
+            path = config['metadata_index']['path']
+        path = os.path.abspath(os.path.expanduser(path))
+
+        if path not in cls._open_indexes:
+            cls._open_indexes[path] = cls(path)
+        return cls._open_indexes[path]
+
+    def __init__(self, path : str):
+        self._path = os.path.abspath(os.path.expanduser(path))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_conn', None)
+        return state
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def _db(self):
+        if not hasattr(self, '_conn'):
+            dirname = os.path.dirname(self._path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            self._conn = sqlite3.connect(self._path, timeout=60, check_same_thread=False)
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS files (
+                fingerprint TEXT PRIMARY KEY,
+                path TEXT,
+                num_rows INTEGER,
+                schema BLOB,
+                row_groups TEXT,
+                filesystem TEXT)''')
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS genweights (
+                fingerprint TEXT,
+                col TEXT,
+                sum REAL,
+                path TEXT,
+                filesystem TEXT,
+                PRIMARY KEY (fingerprint, col))''')
+            #indexes written before the path/filesystem columns existed
+            self._add_missing_columns('files', ['filesystem'])
+            self._add_missing_columns('genweights', ['path', 'filesystem'])
+            self._conn.commit()
+        return self._conn
+
+    def _add_missing_columns(self, table : str, columns : Sequence[str]):
+        existing = [row[1] for row in self._conn.execute('PRAGMA table_info(%s)'%table).fetchall()]
+        for col in columns:
+            if col not in existing:
+                self._conn.execute('ALTER TABLE %s ADD COLUMN %s TEXT'%(table, col))
+
+    @staticmethod
+    def fingerprint(info : pyarrow.fs.FileInfo) -> str:
+        # some filesystems don't report modification times (mtime_ns is None);
+        # for those a rewritten file is only noticed if its size changed
+        mtime = info.mtime_ns if info.mtime_ns is not None else -1
+        return '%s|%d|%d'%(info.path, info.size, mtime)
+
+    def _select(self, query : str, fingerprints : Sequence[str]) -> List[Any]:
+        #sqlite limits the number of bound parameters, so query in chunks
+        result = []
+        for i in range(0, len(fingerprints), 500):
+            chunk = fingerprints[i:i+500]
+            placeholders = ','.join('?'*len(chunk))
+            result += self._db.execute(query%placeholders, chunk).fetchall()
+        return result
+
+    def lookup(self, infos : Sequence[pyarrow.fs.FileInfo], filesystem : pyarrow.fs.FileSystem) -> List[dict]:
+        '''
+        Metadata for each file in infos, reading (and caching) only files not already in the index
+
+        Returns a list of dicts with keys 'num_rows' and 'schema' (a pyarrow.Schema)
+        '''
+        fingerprints = [self.fingerprint(info) for info in infos]
+
+        found = {}
+        for fp, num_rows, schema in self._select('SELECT fingerprint, num_rows, schema FROM files WHERE fingerprint IN (%s)', fingerprints):
+            found[fp] = (num_rows, schema)
+
+        new_rows = []
+        for fp, info in zip(fingerprints, infos):
+            if fp in found:
+                continue
+
+            md = pq.ParquetFile(info.path, filesystem=filesystem).metadata
+            schema = md.schema.to_arrow_schema().serialize().to_pybytes()
+            row_groups = json.dumps(_row_group_statistics(md))
+
+            found[fp] = (md.num_rows, schema)
+            new_rows.append((fp, info.path, md.num_rows, schema, row_groups, filesystem.type_name))
+
+        if len(new_rows) > 0:
+            self._db.executemany('INSERT OR REPLACE INTO files (fingerprint, path, num_rows, schema, row_groups, filesystem) VALUES (?, ?, ?, ?, ?, ?)', new_rows)
+            self._db.commit()
+
+        result = []
+        for fp in fingerprints:
+            num_rows, schema = found[fp]
+            result.append({
+                'num_rows' : num_rows,
+                'schema' : pa.ipc.read_schema(pa.py_buffer(schema))
+            })
+        return result
+
+    def row_group_statistics(self, infos : Sequence[pyarrow.fs.FileInfo], filesystem : pyarrow.fs.FileSystem) -> List[List[dict]]:
+        '''
+        Per-file list of row groups, each a dict with 'num_rows' and
+        'columns' : {column path : {'min', 'max', 'null_count'}}
+        '''
+        #make sure everything is indexed
+        self.lookup(infos, filesystem)
+
+        fingerprints = [self.fingerprint(info) for info in infos]
+        found = dict(self._select('SELECT fingerprint, row_groups FROM files WHERE fingerprint IN (%s)', fingerprints))
+        return [json.loads(found[fp]) for fp in fingerprints]
+
+    def sum_genweight(self, infos : Sequence[pyarrow.fs.FileInfo], filesystem : pyarrow.fs.FileSystem, column : str) -> List[float]:
+        '''
+        Per-file sum of the generator weight column
+        Only files not already in the index are read (and only the one column)
+        '''
+        fingerprints = [self.fingerprint(info) for info in infos]
+
+        found = {}
+        for i in range(0, len(fingerprints), 500):
+            chunk = fingerprints[i:i+500]
+            placeholders = ','.join('?'*len(chunk))
+            query = 'SELECT fingerprint, sum FROM genweights WHERE col = ? AND fingerprint IN (%s)'%placeholders
+            for fp, total in self._db.execute(query, [column] + chunk).fetchall():
+                found[fp] = total
+
+        new_rows = []
+        for fp, info in zip(fingerprints, infos):
+            if fp in found:
+                continue
+
+            table = pq.read_table(info.path, columns=[column], filesystem=filesystem)
+            total = pc.sum(table[column]).as_py()
+            if total is None:
+                total = 0.0
+
+            found[fp] = total
+            new_rows.append((fp, column, total, info.path, filesystem.type_name))
+
+        if len(new_rows) > 0:
+            self._db.executemany('INSERT OR REPLACE INTO genweights (fingerprint, col, sum, path, filesystem) VALUES (?, ?, ?, ?, ?)', new_rows)
+            self._db.commit()
+
+        return [found[fp] for fp in fingerprints]
+
+    def prune(self, keep_paths : Sequence[str] | None = None, filesystem : pyarrow.fs.FileSystem | None = None) -> int:
+        '''
+        Remove entries for files which no longer exist, or have been modified since they were indexed,
+        checking the files through filesystem (by default the local filesystem).
+        Only entries indexed through the same type of filesystem are checked, so that eg pruning locally
+        leaves the entries for remote files alone (as do entries indexed before the filesystem was recorded)
+        If keep_paths is given, instead remove every entry whose path is not in keep_paths
+
+        Returns the number of entries removed
+        '''
+        if filesystem is None:
+            filesystem = pa.fs.LocalFileSystem()
+        if keep_paths is not None:
+            keep_paths = set(keep_paths)
+
+        stale = set()
+        tocheck = {}
+        for table in ['files', 'genweights']:
+            for fp, path, fs in self._db.execute('SELECT fingerprint, path, filesystem FROM %s'%table).fetchall():
+                if keep_paths is not None:
+                    if path not in keep_paths:
+                        stale.add(fp)
+                elif fs == filesystem.type_name:
+                    tocheck[fp] = path
+
+        fingerprints = list(tocheck.keys())
+        infos = filesystem.get_file_info([tocheck[fp] for fp in fingerprints])
+        for fp, info in zip(fingerprints, infos):
+            if info.type != pa.fs.FileType.File or self.fingerprint(info) != fp:
+                stale.add(fp)
+
+        self._db.executemany('DELETE FROM files WHERE fingerprint = ?', [(fp,) for fp in stale])
+        self._db.executemany('DELETE FROM genweights WHERE fingerprint = ?', [(fp,) for fp in stale])
+        self._db.commit()
+        return len(stale)
+
+def _jsonable(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    elif isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    else:
+        return str(value)
+
+def _row_group_statistics(md : pq.FileMetaData) -> List[dict]:
+    result = []
+    for i in range(md.num_row_groups):
+        rg = md.row_group(i)
+        columns = {}
+        for j in range(rg.num_columns):
+            col = rg.column(j)
+            stats = col.statistics
+            if stats is None or not stats.has_min_max:
+                continue
+
+            columns[col.path_in_schema] = {
+                'min' : _jsonable(stats.min),
+                'max' : _jsonable(stats.max),
+                'null_count' : stats.null_count if stats.has_null_count else None
+            }
+        result.append({
+            'num_rows' : rg.num_rows,
+            'columns' : columns
+        })
+    return result
@@ -1,8 +1,12 @@
+import copy
 import numpy as np
 import hist
 import awkward as ak
-from typing import Any, Literal, assert_never
-from scipy.stats import binned_statistic
+from typing import Any, Dict, Literal, assert_never
+
+from simonplot.config import config
+from simonplot.util.fill import flatten_for_fill, flatten_values
+from simonplot.util.sketch import QuantileSketch
 
 _MODE_OPTIONS = Literal['mean', 'std', 'median', 'sum', 'min', 'max', 'percentile', 'percentile-range']
 
@@ -11,13 +15,15 @@ class ProfileStruct:
                  xvar : np.ndarray | ak.Array, 
                  yvar : np.ndarray | ak.Array,
                  mode : _MODE_OPTIONS,
-                 mode_params : Any = None):
+                 mode_params : Any = None,
+                 weighted : bool = False):
         
         self._xvar = xvar
         self._yvar = yvar
 
         self._mode = mode
         self._mode_params = mode_params
+        self._weighted = weighted
 
     @property
     def xvar(self):
@@ -35,13 +41,40 @@ class ProfileStruct:
     def mode_params(self):
         return self._mode_params
 
+    @property
+    def weighted(self):
+        return self._weighted
+
+def _bin_index(x : np.ndarray, edges : np.ndarray) -> np.ndarray:
+    '''
+    Index of the bin holding each x, following np.histogram: [lo, hi), with the last bin also including its upper edge.
+    -1 for x outside the bins or non-finite
+    '''
+    nbins = len(edges) - 1
+    binidx = np.searchsorted(edges, x, side='right') - 1
+    binidx[x == edges[-1]] = nbins - 1
+    binidx[(binidx >= nbins) | ~np.isfinite(x)] = -1
+    return binidx
+
 class ProfileHistStruct:
+    '''
+    Profile of y in bins of x, kept as per-bin accumulators rather than the raw entries:
+    a WeightedMean histogram (count, sum, mean, std), running min and max,
+    and for the median/percentile modes a QuantileSketch.
+    Adding two of these, or fill()ing more entries, takes constant memory per bin,
+    so profiles can be accumulated over chunks and stacks
+    '''
 
     def __init__(self, 
                  data : ProfileStruct, 
-                 axes : Any):
+                 axes : Any,
+                 weight : Any = None,
+                 scale : float = 1.0):
+        '''
+        weight can be a scalar, per-event, or per-entry (see flatten_for_fill); by default entries are unweighted.
+        The percentile modes need non-negative weights
+        '''
           
-        self._data = data
         self._axes = axes
         self._bins = axes[0].edges
         self._mode = data.mode
@@ -50,12 +83,7 @@ class ProfileHistStruct:
         if self._mode == 'percentile':
             if not type(self._mode_params) in [int, float]:
                 raise ValueError("For 'percentile' mode, mode_params must be a single number representing the desired percentile (0-100)!")
-            self._statistic, self._t1, self._t2 = binned_statistic(
-                data.xvar,
-                data.yvar,
-                statistic=lambda y: np.percentile(y, self._mode_params), # pyright: ignore[reportArgumentType]
-                bins=self._bins,
-            )
+            self._percentiles = [self._mode_params]
 
         elif self._mode == 'percentile-range':
             if not type(self._mode_params) in [tuple, list] or len(self._mode_params) != 2:
@@ -64,58 +92,106 @@ class ProfileHistStruct:
             lower, upper = self._mode_params
             if not (0 <= lower < upper <= 100):
                 raise ValueError("For 'percentile-range' mode, mode_params must contain two numbers where 0 <= lower < upper <= 100!")
-            
-            def percentile_range_func(y):
-                lower_val = np.percentile(y, lower)
-                upper_val = np.percentile(y, upper)
-                return upper_val - lower_val
-            
-            self._statistic, self._t1, self._t2 = binned_statistic(
-                data.xvar,
-                data.yvar,
-                statistic=percentile_range_func, # pyright: ignore[reportArgumentType]
-                bins=self._bins,
-            )
+            self._percentiles = [lower, upper]
+
         else: 
             if self._mode not in ['mean', 'std', 'median', 'sum', 'min', 'max']:
                 raise ValueError(f"Unsupported mode {self._mode} for ProfileHistStruct! Supported modes are: 'mean', 'std', 'median', 'sum', 'min', 'max', 'percentile', and 'percentile-range'.")
             
             if self._mode_params is not None:
                 raise ValueError(f"Mode {self._mode} does not support mode_params, but got {self._mode_params}!")
-
-            self._statistic, self._t1, self._t2 = binned_statistic(
-                data.xvar,
-                data.yvar,
-                statistic=self._mode,
-                bins=self._bins,
-            )
             
-    @property
-    def data(self):
-        return self._data
-    
+            self._percentiles = [50] if self._mode == 'median' else []
+
+        nbins = len(self._bins) - 1
+        self._H = hist.Hist(
+            hist.axis.Integer(0, nbins, underflow=False, overflow=False),
+            storage=hist.storage.WeightedMean()
+        )
+        self._min = np.full(nbins, np.inf)
+        self._max = np.full(nbins, -np.inf)
+        if len(self._percentiles) > 0:
+            self._sketch = QuantileSketch(nbins, config['quantile_sketch']['size'])
+        else:
+            self._sketch = None
+
+        self.fill(data.xvar, data.yvar, weight=weight, scale=scale)
+
+    def fill(self, xvar : Any, yvar : Any, weight : Any = None, scale : float = 1.0) -> None:
+        '''
+        Add more entries to the profile; the raw entries are not kept
+        '''
+        x, w = flatten_for_fill(xvar, weight if weight is not None else 1.0, scale)
+        y = flatten_values(yvar)
+        if len(y) != len(x):
+            raise RuntimeError("ProfileHistStruct.fill: xvar has %d entries, but yvar has %d!"%(len(x), len(y)))
+
+        binidx = _bin_index(x, self._bins)
+        good = (binidx >= 0) & np.isfinite(y)
+        binidx, y = binidx[good], y[good].astype(np.float64)
+        w = np.broadcast_to(np.asarray(w, dtype=np.float64), len(x))[good]
+
+        if self._sketch is not None and np.any(w < 0):
+            raise RuntimeError("ProfileHistStruct.fill: Percentiles can't be computed with negative weights! Use an unweighted profile, or non-negative weights")
+
+        self._H.fill(binidx, sample=y, weight=w)
+        np.minimum.at(self._min, binidx, y)
+        np.maximum.at(self._max, binidx, y)
+        if self._sketch is not None:
+            self._sketch.add(binidx, y, w)
+
     @property
     def axes(self):
         return self._axes
-        
-    def __add__(self, other):
+    
+    @property
+    def stats(self) -> Dict[str, np.ndarray]:
+        '''
+        All the per-bin statistics, not just the one for the mode:
+        'count' (sum of weights), 'sum', 'mean', 'std', 'min', 'max' (each of shape [nbins]),
+        and 'percentiles' (shape [len(percentiles), nbins]), which only holds the percentiles needed for the mode.
+        Empty bins give 0 for 'count' and 'sum', and nan for everything else
+        '''
+        view = self._H.view()
+        count = view['sum_of_weights']
+        filled = np.isfinite(self._min)
+
+        result = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result['count'] = count
+            result['sum'] = np.where(count != 0, view['value'] * count, 0.0)
+            result['mean'] = np.where(count != 0, view['value'], np.nan)
+            result['std'] = np.sqrt(view['_sum_of_weighted_deltas_squared'] / count)
+        result['min'] = np.where(filled, self._min, np.nan)
+        result['max'] = np.where(filled, self._max, np.nan)
+
+        if self._sketch is not None:
+            result['percentiles'] = self._sketch.quantiles(self._percentiles)
+        else:
+            result['percentiles'] = np.zeros((0, len(count)))
+        return result
+
+    def __iadd__(self, other):
         if not isinstance(other, ProfileHistStruct):
-            raise RuntimeError("ProfileHistStruct.__add__: Can only add another ProfileHistStruct, but got %s!"%type(other))
+            raise RuntimeError("ProfileHistStruct.__iadd__: Can only add another ProfileHistStruct, but got %s!"%type(other))
         
         if self._mode != other._mode or self._mode_params != other._mode_params:
-            raise RuntimeError("ProfileHistStruct.__add__: Cannot add ProfileHistStructs with different modes or mode_params! Got modes %s and %s with mode_params %s and %s"%(self._mode, other._mode, self._mode_params, other._mode_params))
-        
-        new_data = ProfileStruct(
-            xvar = np.concatenate([self.data.xvar, other.data.xvar]),
-            yvar = np.concatenate([self.data.yvar, other.data.yvar]),
-            mode = self._mode, # pyright: ignore[reportArgumentType]
-            mode_params = self._mode_params
-        )
+            raise RuntimeError("ProfileHistStruct.__iadd__: Cannot add ProfileHistStructs with different modes or mode_params! Got modes %s and %s with mode_params %s and %s"%(self._mode, other._mode, self._mode_params, other._mode_params))
 
-        return ProfileHistStruct(
-            data=new_data,
-            axes=self.axes,
-         )
+        if not np.array_equal(self._bins, other._bins):
+            raise RuntimeError("ProfileHistStruct.__iadd__: Cannot add ProfileHistStructs with different binnings!")
+
+        self._H += other._H
+        np.minimum(self._min, other._min, out=self._min)
+        np.maximum(self._max, other._max, out=self._max)
+        if self._sketch is not None:
+            self._sketch += other._sketch
+        return self
+
+    def __add__(self, other):
+        result = copy.deepcopy(self)
+        result += other
+        return result
     
     '''
     Mimick the hist.Hist() interface
@@ -123,8 +199,14 @@ class ProfileHistStruct:
 
     #statistic
     def values(self, flow=False):
-        return self._statistic
+        stats = self.stats
+        if self._mode in ['percentile', 'median']:
+            return stats['percentiles'][0]
+        elif self._mode == 'percentile-range':
+            return stats['percentiles'][1] - stats['percentiles'][0]
+        else:
+            return stats[self._mode]
     
     #just return 0 for uncertainties atm
     def variances(self, flow=False):
-        return np.zeros_like(self._statistic)
\ No newline at end of file
+        return np.zeros(len(self._bins) - 1)
@@ -0,0 +1,134 @@
+'''
+Fused range reduction for get_range: the minimum, minimum positive value, maximum, and number of finite values,
+all in one pass over the values without any temporary arrays.
+
+Compiled with numba when it is installed (see kernels.py), otherwise computed chunk by chunk in numpy,
+so that the temporaries stay small
+'''
+
+import numpy as np
+
+from typing import Any, Tuple
+
+from simonplot.util.kernels import _jit
+
+_CHUNK_SIZE = 1 << 16
+
+def _float_range_loop(values):
+    # comparisons with nan are always False, so nans are skipped
+    # infs are included, as for np.nanmin/np.nanmax
+    minval = np.inf
+    minpos = np.inf
+    maxval = -np.inf
+    nfinite = 0
+    for v in values:
+        if np.isfinite(v):
+            nfinite += 1
+        if v < minval:
+            minval = v
+        if v > maxval:
+            maxval = v
+        if v > 0 and v < minpos:
+            minpos = v
+    return minval, minpos, maxval, nfinite
+
+def _int_range_loop(values):
+    # values must be non-empty
+    minval = values[0]
+    maxval = values[0]
+    minpos = values[0]
+    haspos = False
+    for v in values:
+        if v < minval:
+            minval = v
+        if v > maxval:
+            maxval = v
+        if v > 0 and (not haspos or v < minpos):
+            minpos = v
+            haspos = True
+    return minval, minpos, maxval, haspos
+
+def _range_numpy(values : np.ndarray) -> Tuple[Any, Any, Any, int]:
+    minval, minpos, maxval, nfinite = np.inf, np.inf, -np.inf, 0
+    for start in range(0, len(values), _CHUNK_SIZE):
+        chunk = values[start:start+_CHUNK_SIZE]
+        notnan = chunk[~np.isnan(chunk)] if chunk.dtype.kind == 'f' else chunk
+        nfinite += np.count_nonzero(np.isfinite(notnan))
+        if len(notnan) == 0:
+            continue
+        minval = min(minval, notnan.min())
+        maxval = max(maxval, notnan.max())
+        positive = notnan[notnan > 0]
+        if len(positive) > 0:
+            minpos = min(minpos, positive.min())
+    return minval, minpos, maxval, nfinite
+
+class RangeStats:
+    '''
+    Minimum (ignoring nans), minimum positive value, maximum (ignoring nans), and number of finite values,
+    which can be merged (+) across chunks and datasets
+    '''
+    def __init__(self, minval : Any, minpos : Any, maxval : Any, nfinite : int, dtype : np.dtype):
+        self.minval = minval
+        self.minpos = minpos
+        self.maxval = maxval
+        self.nfinite = nfinite
+        self.dtype = dtype
+
+    @classmethod
+    def from_values(cls, values : np.ndarray) -> "RangeStats":
+        values = np.asarray(values)
+        dtype = values.dtype
+        if dtype.kind == 'b':
+            values = values.view(np.uint8)
+
+        if len(values) == 0:
+            return cls(np.inf, np.inf, -np.inf, 0, dtype)
+
+        if values.dtype.kind == 'f':
+            jitted = _jit(_float_range_loop)
+            if jitted is None:
+                minval, minpos, maxval, nfinite = _range_numpy(values)
+            else:
+                minval, minpos, maxval, nfinite = jitted(values)
+        elif values.dtype.kind in 'iu':
+            jitted = _jit(_int_range_loop)
+            if jitted is None:
+                minval, minpos, maxval, nfinite = _range_numpy(values)
+            else:
+                minval, minpos, maxval, haspos = jitted(values)
+                if not haspos:
+                    minpos = np.inf
+                nfinite = len(values)
+        else:
+            raise RuntimeError("RangeStats.from_values: unsupported dtype %s!"%dtype)
+
+        return cls(minval, minpos, maxval, int(nfinite), dtype)
+
+    def __add__(self, other : "RangeStats") -> "RangeStats":
+        return RangeStats(
+            min(self.minval, other.minval),
+            min(self.minpos, other.minpos),
+            max(self.maxval, other.maxval),
+            self.nfinite + other.nfinite,
+            self.dtype
+        )
+
+    def as_range(self) -> Tuple[Any, Any, Any, np.dtype]:
+        '''
+        (minval, min positive value, maxval, dtype) as returned by get_range.
+
+        If there are no finite values, the range is the largest possible one for the dtype, reversed,
+        so that it is neutral when combined with the ranges of other datasets in a stack.
+        If there are no positive values, the min positive value is nan
+        '''
+        if self.nfinite == 0:
+            if self.dtype.kind == 'f':
+                info = np.finfo(self.dtype)
+            else:
+                info = np.iinfo(self.dtype if self.dtype.kind != 'b' else np.uint8)
+            return (info.max, info.max, info.min, self.dtype)
+
+        cast = self.dtype.type
+        minpos = np.nan if self.minpos == np.inf else cast(self.minpos)
+        return (cast(self.minval), minpos, cast(self.maxval), self.dtype)
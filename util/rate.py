@@ -2,10 +2,17 @@ import numpy as np
 import hist
 import awkward as ak
 
+from typing import Any, List, Sequence
+
 class RateStruct:
-    def __init__(self, binary : np.ndarray | ak.Array, wrt : np.ndarray | ak.Array):
+    '''
+    binary is the pass (1) / fail (0) flag, or with thresholds a continuous discriminant,
+    which passes threshold t if discriminant >= t
+    '''
+    def __init__(self, binary : np.ndarray | ak.Array, wrt : np.ndarray | ak.Array, thresholds : Sequence[float] | None = None):
         self._binary = binary
         self._wrt = wrt
+        self._thresholds = thresholds
     
     @property
     def binary(self):
@@ -14,44 +21,159 @@ class RateStruct:
     @property
     def wrt(self): 
         return self._wrt
+    
+    @property
+    def thresholds(self):
+        return self._thresholds
+
+    def fill(self, axis : Any, weight : Any, scale : float = 1.0) -> "RateHistStruct":
+        '''
+        Fill into a RateHistStruct with a single pass over the values
+        weight can be a scalar, per-event, or with the same layout as wrt (see flatten_for_fill)
+        '''
+        from simonplot.util.fill import flatten_for_fill, flatten_values
+
+        wrt, wgt = flatten_for_fill(self._wrt, weight)
+        binary = flatten_values(self._binary)
+        if len(binary) != len(wrt):
+            raise RuntimeError("RateStruct.fill: binary has %d entries, but wrt has %d!"%(len(binary), len(wrt)))
+
+        if self._thresholds is None:
+            H = hist.Hist(
+                axis, 
+                hist.axis.Boolean(name='passed'),
+                storage=hist.storage.Weight()
+            )
+
+            if binary.dtype == bool:
+                H.fill(wrt, binary, weight=wgt)
+            else:
+                # entries which are neither 0 nor 1 count as neither passing nor failing
+                valid = (binary == 0) | (binary == 1)
+                if np.all(valid):
+                    H.fill(wrt, binary == 1, weight=wgt)
+                else:
+                    H.fill(wrt[valid], binary[valid] == 1, weight=wgt[valid] if np.ndim(wgt) > 0 else wgt)
+
+        else:
+            H = self._fill_thresholds(axis, wrt, binary, wgt)
+
+        if scale != 1.0:
+            H *= scale
+        return RateHistStruct(H)
+    
+    def _fill_thresholds(self, axis, wrt, discriminant, wgt):
+        '''
+        Turn-on curves for all the thresholds from one fill:
+        histogram the number of thresholds passed by each entry, and then
+        the number passing threshold k is the cumulative sum from k+1 passed thresholds upwards
+        '''
+        thresholds = np.unique(np.asarray(self._thresholds, dtype=float))
+        N = len(thresholds)
+
+        npassed = np.searchsorted(thresholds, discriminant, side='right')
+        npassed[np.isnan(discriminant)] = 0
+
+        Hcount = hist.Hist(
+            axis,
+            hist.axis.Integer(0, N+1, underflow=False, overflow=False, name='npassed'),
+            storage=hist.storage.Weight()
+        )
+        Hcount.fill(wrt, npassed, weight=wgt)
+
+        counts = Hcount.view(flow=True)
+        H = hist.Hist(
+            axis,
+            # repr round-trips, so that nearby thresholds don't collapse onto the same label
+            hist.axis.StrCategory([repr(float(t)) for t in thresholds], overflow=False, name='threshold'),
+            hist.axis.Boolean(name='passed'),
+            storage=hist.storage.Weight()
+        )
+        out = H.view(flow=True)
+        for field in ['value', 'variance']:
+            atleast = np.cumsum(counts[field][..., ::-1], axis=-1)[..., ::-1]
+            out[field][..., 1] = atleast[..., 1:]
+            out[field][..., 0] = atleast[..., :1] - atleast[..., 1:]
 
-# container for two histograms representing the pass and fail categories of a RateVariable
+        return H
+
+# histogram with a boolean 'passed' axis (last) representing the pass and fail categories of a RateVariable
 # needed for plotting rates with histplot
 class RateHistStruct:
-    def __init__(self, Hpass, Hfail):
-        self._Hpass = Hpass
-        self._Hfail = Hfail
+    '''
+    Either RateHistStruct(H) with the pass/fail axis included,
+    or RateHistStruct(Hpass, Hfail) from separate pass and fail histograms
+    '''
+    def __init__(self, H : hist.Hist, Hfail : hist.Hist | None = None):
+        if Hfail is not None:
+            H = self._combine_pass_fail(H, Hfail)
+
+        if len(H.axes) == 0 or not isinstance(H.axes[-1], hist.axis.Boolean):
+            raise RuntimeError("RateHistStruct: last axis of the histogram must be a boolean pass/fail axis!")
+        
+        self._H = H
 
+    @staticmethod
+    def _combine_pass_fail(Hpass : hist.Hist, Hfail : hist.Hist) -> hist.Hist:
         if Hpass.axes != Hfail.axes:
             raise RuntimeError("RateHistStruct: Hpass and Hfail must have the same axes!")
+        
+        H = hist.Hist(
+            *Hpass.axes,
+            hist.axis.Boolean(name='passed'),
+            storage=hist.storage.Weight()
+        )
+        H.view(flow=True)[..., 0] = Hfail.view(flow=True)
+        H.view(flow=True)[..., 1] = Hpass.view(flow=True)
+        return H
+
+    @classmethod
+    def from_pass_fail(cls, Hpass : hist.Hist, Hfail : hist.Hist) -> "RateHistStruct":
+        return cls(Hpass, Hfail)
+    
+    @property
+    def H(self):
+        return self._H
 
     @property
     def Hpass(self):
-        return self._Hpass
+        return self._H[..., 1]
     
     @property
     def Hfail(self):
-        return self._Hfail
+        return self._H[..., 0]
 
     @property
     def axes(self):
-        return self._Hpass.axes
+        return self._H.axes[:-1]
+    
+    @property
+    def thresholds(self) -> List[str] | None:
+        if 'threshold' in self._H.axes.name:
+            return list(self._H.axes['threshold'])
+        else:
+            return None
+
+    def at_threshold(self, index : int) -> "RateHistStruct":
+        '''
+        The turn-on curve for one threshold of a multi-threshold rate
+        '''
+        if self.thresholds is None:
+            raise RuntimeError("RateHistStruct.at_threshold: not a multi-threshold rate!")
+        
+        return RateHistStruct(self._H[{'threshold' : index}])
 
     def __add__(self, other):
         if not isinstance(other, RateHistStruct):
             raise RuntimeError("RateHistStruct.__add__: Can only add another RateHistStruct, but got %s!"%type(other))
         
-        newHpass = self._Hpass + other._Hpass
-        newHfail = self._Hfail + other._Hfail
-
-        return RateHistStruct(newHpass, newHfail)
+        return RateHistStruct(self._H + other._H)
     
     def __iadd__(self, other):
         if not isinstance(other, RateHistStruct):
             raise RuntimeError("RateHistStruct.__iadd__: Can only add another RateHistStruct, but got %s!"%type(other))
         
-        self._Hpass += other._Hpass
-        self._Hfail += other._Hfail
+        self._H += other._H
 
         return self
 
@@ -61,21 +183,20 @@ class RateHistStruct:
 
     # return rates
     def values(self, flow=False): 
-        Ntotal = self._Hpass.values(flow=flow) + self._Hfail.values(flow=flow)
-        Npass = self._Hpass.values(flow=flow)
-        return Npass / Ntotal
+        Nfail = self._H.values(flow=flow)[..., 0]
+        Npass = self._H.values(flow=flow)[..., 1]
+        return Npass / (Npass + Nfail)
     
     # error propagation for ratio Npass / (Npass + Nfail)
     # use formula from Appendix B.1.3 of the AN
     def variances(self, flow=False):
-        Nfail = self._Hfail.values(flow=flow)
-        Npass = self._Hpass.values(flow=flow)
+        Nfail = self._H.values(flow=flow)[..., 0]
+        Npass = self._H.values(flow=flow)[..., 1]
         Ntotal = Npass + Nfail
 
-        varPass = self._Hpass.variances(flow=flow)
-        varFail = self._Hfail.variances(flow=flow)
+        varFail = self._H.variances(flow=flow)[..., 0] # pyright: ignore[reportOptionalSubscript]
+        varPass = self._H.variances(flow=flow)[..., 1] # pyright: ignore[reportOptionalSubscript]
 
         rate = Npass / Ntotal
 
         return np.square((1-rate)/Ntotal) * varPass + np.square(rate/Ntotal) * varFail
-
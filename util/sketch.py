@@ -0,0 +1,187 @@
+'''
+Mergeable per-bin quantile sketches, for profile percentiles that can be accumulated over chunks and stacks.
+
+Each bin keeps at most `size` weighted centroids, sorted by value.
+While a bin holds no more than `size` entries, its centroids are exactly the entries, and quantiles are exact.
+Beyond that, the entries of the bin are merged into `size` centroids, each being the weighted mean
+of a slice of the sorted entries. As in a t-digest, the slices are narrower in the tails (equal slices on an arcsine scale),
+where percentiles like 5% or 95% are most sensitive to the rank error; in the middle of the distribution
+the rank error is at most about 1.6/size of the bin's total weight. Merging two sketches concatenates their centroids
+and re-compresses, so memory stays at most `size` centroids per bin however many entries are added.
+In compressed bins the tails are interpolated out to the exact minimum and maximum, so 0 and 100 give those.
+
+With size=None nothing is ever compressed: every entry is kept, and the quantiles are exact
+(np.percentile for unit weights), at the cost of memory growing with the number of entries
+'''
+
+import numpy as np
+
+from typing import Sequence
+
+class QuantileSketch:
+    def __init__(self, nbins : int, size : int | None):
+        if size is not None and size < 1:
+            raise RuntimeError("QuantileSketch.__init__: size must be at least 1, but got %d!"%size)
+
+        self._nbins = nbins
+        self._size = size
+
+        # centroids of all the bins, sorted by (bin, value)
+        self._bin = np.zeros(0, dtype=np.int64)
+        # whether each bin's centroids are still exactly its entries
+        self._compressed = np.zeros(nbins, dtype=bool)
+        # exact extremes, which the centroids of compressed bins lose
+        self._min = np.full(nbins, np.inf)
+        self._max = np.full(nbins, -np.inf)
+        self._value = np.zeros(0, dtype=np.float64)
+        self._weight = np.zeros(0, dtype=np.float64)
+
+    @property
+    def nbins(self) -> int:
+        return self._nbins
+
+    @property
+    def size(self) -> int | None:
+        return self._size
+
+    @property
+    def num_centroids(self) -> int:
+        return len(self._value)
+
+    @property
+    def min(self) -> np.ndarray:
+        '''
+        Exact per-bin minimum of the values added; nan for empty bins
+        '''
+        return np.where(np.isfinite(self._min), self._min, np.nan)
+
+    @property
+    def max(self) -> np.ndarray:
+        '''
+        Exact per-bin maximum of the values added; nan for empty bins
+        '''
+        return np.where(np.isfinite(self._max), self._max, np.nan)
+
+    def add(self, binidx : np.ndarray, values : np.ndarray, weights : np.ndarray) -> None:
+        '''
+        Add entries with the given bin indices (which must all be in [0, nbins)), values, and non-negative weights
+        '''
+        if np.any(np.asarray(weights) < 0):
+            raise RuntimeError("QuantileSketch.add: weights must be non-negative!")
+
+        self._bin = np.concatenate([self._bin, np.asarray(binidx, dtype=np.int64)])
+        self._value = np.concatenate([self._value, np.asarray(values, dtype=np.float64)])
+        self._weight = np.concatenate([self._weight, np.broadcast_to(np.asarray(weights, dtype=np.float64), len(values))])
+        np.minimum.at(self._min, binidx, values)
+        np.maximum.at(self._max, binidx, values)
+        self._compress()
+
+    def __iadd__(self, other):
+        if not isinstance(other, QuantileSketch):
+            raise RuntimeError("QuantileSketch.__iadd__: Can only add another QuantileSketch, but got %s!"%type(other))
+
+        if self._nbins != other._nbins:
+            raise RuntimeError("QuantileSketch.__iadd__: Cannot add sketches with different numbers of bins! (%d vs %d)"%(self._nbins, other._nbins))
+
+        # merging into the smaller budget; an exact (size=None) sketch takes the other's
+        sizes = [size for size in (self._size, other._size) if size is not None]
+        self._size = min(sizes) if len(sizes) > 0 else None
+        self._compressed |= other._compressed
+        np.minimum(self._min, other._min, out=self._min)
+        np.maximum(self._max, other._max, out=self._max)
+        self.add(other._bin, other._value, other._weight)
+        return self
+
+    def _compress(self) -> None:
+        # sort by value, and then stably by bin
+        # (much faster than np.lexsort; small integer bin indices get a radix sort)
+        order = np.argsort(self._value)
+        bybin = np.argsort(self._bin[order].astype(np.min_scalar_type(-self._nbins)), kind='stable')
+        order = order[bybin]
+        binidx, value, weight = self._bin[order], self._value[order], self._weight[order]
+
+        offsets = np.searchsorted(binidx, np.arange(self._nbins+1))
+        counts = np.diff(offsets)
+        if self._size is None or np.all(counts <= self._size):
+            self._bin, self._value, self._weight = binidx, value, weight
+            return
+
+        starts = np.repeat(offsets[:-1], counts)
+        cumw = np.zeros(len(weight)+1)
+        np.cumsum(weight, out=cumw[1:])
+        total = np.repeat(cumw[offsets[1:]] - cumw[offsets[:-1]], counts)
+        before = cumw[:-1] - cumw[starts]
+
+        # bins within the size budget keep every entry as its own centroid;
+        # larger bins are cut into `size` slices of cumulative weight, equal on the arcsine scale
+        self._compressed |= counts > self._size
+        big = np.repeat(counts > self._size, counts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            q = np.where(total > 0, before / total, 0.0)
+        slices = np.floor(self._size * (np.arcsin(2*np.clip(q, 0, 1) - 1) / np.pi + 0.5))
+        centroid = np.where(big, np.minimum(slices, self._size-1), np.arange(len(value)) - starts)
+
+        newgroup = np.ones(len(value), dtype=bool)
+        newgroup[1:] = (binidx[1:] != binidx[:-1]) | (centroid[1:] != centroid[:-1])
+        groups = np.flatnonzero(newgroup)
+
+        sumw = np.add.reduceat(weight, groups)
+        sumwv = np.add.reduceat(weight * value, groups)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # zero-weight centroids get the plain mean of their values
+            plainmean = np.add.reduceat(value, groups) / np.diff(np.append(groups, len(value)))
+            self._value = np.where(sumw > 0, sumwv / sumw, plainmean)
+        self._weight = sumw
+        self._bin = binidx[groups]
+
+    def quantiles(self, percentiles : Sequence[float]) -> np.ndarray:
+        '''
+        Per-bin percentiles (0-100), interpolating linearly between centroids.
+        Bins which were never compressed follow np.percentile exactly (for unit weights);
+        in compressed bins each centroid sits at the middle of the cumulative weight it absorbed,
+        and the exact minimum and maximum sit at 0 and 100.
+        Shape [len(percentiles), nbins]; nan for empty bins
+        '''
+        result = np.full((len(percentiles), self._nbins), np.nan)
+        if len(self._value) == 0:
+            return result
+
+        offsets = np.searchsorted(self._bin, np.arange(self._nbins+1))
+        counts = np.diff(offsets)
+        ne = np.flatnonzero(counts > 0)
+        start, last = offsets[ne], offsets[ne+1]-1
+
+        cumw = np.zeros(len(self._weight)+1)
+        np.cumsum(self._weight, out=cumw[1:])
+        starts = np.repeat(offsets[:-1], counts)
+        before = cumw[:-1] - cumw[starts]
+        total = np.repeat(cumw[offsets[1:]] - cumw[offsets[:-1]], counts)
+        span = np.repeat(cumw[offsets[1:]-1] - cumw[offsets[:-1]], counts)
+        compressed = np.repeat(self._compressed, counts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            position = np.where(compressed, 
+                                (before + 0.5*self._weight) / total, 
+                                np.where(span > 0, before / span, 0.0))
+        position = np.nan_to_num(np.clip(position, 0, 1))
+
+        # positions are in [0, 1] and increasing within each bin, so offsetting by 2*bin makes them searchable globally
+        key = 2*self._bin + position
+        for i, pct in enumerate(percentiles):
+            q = pct / 100
+            lo = np.searchsorted(key, 2*ne + q, side='right') - 1
+            lo = np.clip(lo, start, last)
+            hi = np.minimum(lo + 1, last)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                frac = np.where(position[hi] > position[lo], (q - position[lo]) / (position[hi] - position[lo]), 0.0)
+            frac = np.clip(frac, 0, 1)
+            result[i, ne] = self._value[lo] + frac*(self._value[hi] - self._value[lo])
+
+            # in compressed bins, below the first centroid and above the last one interpolate to the exact extremes
+            first, final = position[start], position[last]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                below = self._compressed[ne] & (q < first)
+                result[i, ne[below]] = self._min[ne[below]] + (q / first[below]) * (self._value[start[below]] - self._min[ne[below]])
+                above = self._compressed[ne] & (q > final)
+                result[i, ne[above]] = self._value[last[above]] + ((q - final[above]) / (1 - final[above])) * (self._max[ne[above]] - self._value[last[above]])
+
+        return result
@@ -0,0 +1,34 @@
+'''
+Distinct values of columns, for discovering categories (eg AutoIntCategoryBinning)
+'''
+
+import numpy as np
+
+def unique_values(values : np.ndarray) -> np.ndarray:
+    '''
+    Sorted distinct values, as np.unique
+
+    Integer and boolean values spanning a small enough range (no wider than the number of values, or 2^16)
+    are counted with np.bincount in linear time, rather than sorted
+    '''
+    values = np.asarray(values)
+    if len(values) == 0 or values.dtype.kind not in 'iub':
+        return np.unique(values)
+
+    dtype = values.dtype
+    if dtype.kind == 'b':
+        values = values.view(np.uint8)
+
+    lo, hi = values.min(), values.max()
+    span = int(hi) - int(lo) + 1
+    if span > max(len(values), 1 << 16):
+        return np.unique(values).astype(dtype)
+
+    # narrow types are widened first (eg int8 127 - -128 would wrap);
+    # 64-bit types can't overflow, since the result is in [0, span)
+    if values.dtype.itemsize < 8:
+        offset = values.astype(np.int64) - int(lo)
+    else:
+        offset = (values - lo).astype(np.intp)
+    counts = np.bincount(offset, minlength=span)
+    return (np.flatnonzero(counts) + int(lo)).astype(dtype)
@@ -2,6 +2,8 @@ from .Variable import BasicVariable, UFuncVariable, SumVariable, DifferenceVaria
 from .VariableBase import VariableBase
 from simonplot.typing.Protocols import VariableProtocol
 
+from simonplot.util.kernels import evaluate_kernel, delta_phi, delta_r, distance_2d, eta_phi_from_xyz
+
 from simonpy.coordinates import xyz_to_eta_phi
 
 class RelativeResolutionVariable(VariableBase):
@@ -266,6 +268,10 @@ class DeltaPhiVariable(VariableBase):
     def evaluate(self, dataset, cut):
         import numpy as np
 
+        result = evaluate_kernel(delta_phi, [self._phi1, self._phi2], dataset, cut)
+        if result is not None:
+            return result[0]
+
         phi1val = self._phi1.evaluate(dataset, cut)
         phi2val = self._phi2.evaluate(dataset, cut)
 
@@ -332,6 +338,10 @@ class DeltaRVariable(VariableBase):
         self._dr.set_collection_name(collection_name)
 
     def evaluate(self, dataset, cut):
+        result = evaluate_kernel(delta_r, [self._eta1, self._phi1, self._eta2, self._phi2], dataset, cut)
+        if result is not None:
+            return result[0]
+
         return self._dr.evaluate(dataset, cut)
     
 class Distance2dVariable(VariableBase):
@@ -345,6 +355,10 @@ class Distance2dVariable(VariableBase):
             self._dxvar,
             self._dyvar
         )
+
+    @property
+    def _natural_centerline(self):
+        return None
     
     @property
     def prebinned(self) -> bool:
@@ -358,6 +372,10 @@ class Distance2dVariable(VariableBase):
         ))  
     
     def evaluate(self, dataset, cut):
+        result = evaluate_kernel(distance_2d, [self._dxvar._var1, self._dyvar._var1, self._dxvar._var2, self._dyvar._var2], dataset, cut)
+        if result is not None:
+            return result[0]
+
         return self.magnitude_var.evaluate(dataset, cut)
     
     @property
@@ -380,6 +398,55 @@ class Distance2dVariable(VariableBase):
         self._dyvar.set_collection_name(collection_name)
         self.magnitude_var.set_collection_name(collection_name)
 
+class _EtaPhiFromXYZVariable(VariableBase):
+    '''
+    Internal node returning the (eta, phi) pair, shared by EtaFromXYZVariable and PhiFromXYZVariable
+    '''
+    def __init__(self, x : VariableProtocol, y : VariableProtocol, z : VariableProtocol):
+        self._x = x
+        self._y = y
+        self._z = z
+
+    @property
+    def _natural_centerline(self):
+        return None
+    
+    @property
+    def prebinned(self) -> bool:
+        return False
+    
+    @property 
+    def columns(self):
+        return list(set(self._x.columns + self._y.columns + self._z.columns))
+    
+    @property
+    def key(self):
+        return "ETAPHI(%s_%s_%s)" % (self._x.key, self._y.key, self._z.key)
+    
+    def __eq__(self, other):
+        if type(other) is not _EtaPhiFromXYZVariable:
+            return False
+        
+        return (self._x == other._x and 
+                self._y == other._y and
+                self._z == other._z)
+    
+    def set_collection_name(self, collection_name):
+        self._x.set_collection_name(collection_name)
+        self._y.set_collection_name(collection_name)
+        self._z.set_collection_name(collection_name)
+
+    def evaluate(self, dataset, cut):
+        result = evaluate_kernel(eta_phi_from_xyz, [self._x, self._y, self._z], dataset, cut)
+        if result is not None:
+            return result
+
+        xval = self._x.evaluate(dataset, cut)
+        yval = self._y.evaluate(dataset, cut)
+        zval = self._z.evaluate(dataset, cut)
+
+        return xyz_to_eta_phi(xval, yval, zval)
+
 class EtaFromXYZVariable(VariableBase):
     def __init__(self, x : VariableProtocol | str, y: VariableProtocol | str, z: VariableProtocol | str):
         if isinstance(x, str):
@@ -393,6 +460,10 @@ class EtaFromXYZVariable(VariableBase):
         self._y = y
         self._z = z
 
+        # eta and phi come out of the same transform,
+        # so share one node that can be memoized within an evaluation context
+        self._etaphi = _EtaPhiFromXYZVariable(x, y, z)
+
     @property
     def _natural_centerline(self):
         return None
@@ -423,11 +494,7 @@ class EtaFromXYZVariable(VariableBase):
         self._z.set_collection_name(collection_name)
 
     def evaluate(self, dataset, cut):
-        xval = self._x.evaluate(dataset, cut)
-        yval = self._y.evaluate(dataset, cut)
-        zval = self._z.evaluate(dataset, cut)
-
-        return xyz_to_eta_phi(xval, yval, zval)[0]
+        return self._etaphi.evaluate(dataset, cut)[0]
     
 class PhiFromXYZVariable(VariableBase):
     def __init__(self, x : VariableProtocol | str, y: VariableProtocol | str, z: VariableProtocol | str):
@@ -442,6 +509,10 @@ class PhiFromXYZVariable(VariableBase):
         self._y = y
         self._z = z
 
+        # eta and phi come out of the same transform,
+        # so share one node that can be memoized within an evaluation context
+        self._etaphi = _EtaPhiFromXYZVariable(x, y, z)
+
     @property
     def _natural_centerline(self):
         return None
@@ -472,8 +543,4 @@ class PhiFromXYZVariable(VariableBase):
         self._z.set_collection_name(collection_name)
 
     def evaluate(self, dataset, cut):
-        xval = self._x.evaluate(dataset, cut)
-        yval = self._y.evaluate(dataset, cut)
-        zval = self._z.evaluate(dataset, cut)
-
-        return xyz_to_eta_phi(xval, yval, zval)[1]
\ No newline at end of file
+        return self._etaphi.evaluate(dataset, cut)[1]
\ No newline at end of file
@@ -0,0 +1,197 @@
+import numpy as np
+import awkward as ak
+
+from .VariableBase import VariableBase
+from .Variable import ConstantVariable, SumVariable, DifferenceVariable, ProductVariable, RatioVariable, UFuncVariable, AbsVariable, LogVariable
+from .CompositeVariable import RelativeResolutionVariable, Magnitude3dVariable, Magnitude2dVariable, Distance3dVariable, Distance2dVariable, DeltaPhiVariable, DeltaRVariable
+from simonplot.typing.Protocols import VariableProtocol
+
+from typing import List, Tuple
+
+#numpy ufuncs with a direct numexpr equivalent
+_UFUNC_TEMPLATES = {
+    np.sqrt : 'sqrt(%s)',
+    np.square : '(%s**2)',
+    np.abs : 'abs(%s)',
+    np.negative : '(-%s)',
+    np.exp : 'exp(%s)',
+    np.expm1 : 'expm1(%s)',
+    np.log : 'log(%s)',
+    np.log10 : 'log10(%s)',
+    np.log1p : 'log1p(%s)',
+    np.sin : 'sin(%s)',
+    np.cos : 'cos(%s)',
+    np.tan : 'tan(%s)',
+    np.arcsin : 'arcsin(%s)',
+    np.arccos : 'arccos(%s)',
+    np.arctan : 'arctan(%s)',
+    np.sinh : 'sinh(%s)',
+    np.cosh : 'cosh(%s)',
+    np.tanh : 'tanh(%s)',
+    np.arcsinh : 'arcsinh(%s)',
+    np.arccosh : 'arccosh(%s)',
+    np.arctanh : 'arctanh(%s)',
+}
+
+class _Lowering:
+    '''
+    Lowers a variable tree to a numexpr expression string
+    Nodes without an expression equivalent become leaves, which are evaluated normally
+    '''
+    def __init__(self):
+        self.leaves : List[VariableProtocol] = []
+        self._names = {}
+
+    def leaf(self, var : VariableProtocol) -> str:
+        # dedupe on key rather than ==, since BasicVariable.__eq__ ignores the collection name
+        if var.key not in self._names:
+            self._names[var.key] = 'v%d'%len(self.leaves)
+            self.leaves.append(var)
+        return self._names[var.key]
+
+    def lower(self, var : VariableProtocol) -> str:
+        if type(var) is ConstantVariable:
+            return '(%r)'%float(var._value)
+        elif type(var) is SumVariable:
+            return '(%s + %s)'%(self.lower(var._var1), self.lower(var._var2))
+        elif type(var) is DifferenceVariable:
+            return '(%s - %s)'%(self.lower(var._var2), self.lower(var._var1))
+        elif type(var) is ProductVariable:
+            return '(%s * %s)'%(self.lower(var._var1), self.lower(var._var2))
+        elif type(var) is RatioVariable:
+            return '(%s / %s)'%(self.lower(var._num), self.lower(var._denom))
+        elif type(var) is RelativeResolutionVariable:
+            gen = self.lower(var._gen)
+            return '((%s - %s) / %s)'%(self.lower(var._reco), gen, gen)
+        elif type(var) is AbsVariable:
+            return 'abs(%s)'%self.lower(var._var)
+        elif type(var) is LogVariable:
+            if var._base is None:
+                return 'log(%s)'%self.lower(var._var)
+            elif var._base == 10:
+                return 'log10(%s)'%self.lower(var._var)
+            else:
+                return '(log(%s) / %r)'%(self.lower(var._var), float(np.log(var._base)))
+        elif type(var) is UFuncVariable and var._ufunc in _UFUNC_TEMPLATES:
+            return _UFUNC_TEMPLATES[var._ufunc]%self.lower(var._var)
+        elif type(var) is Magnitude3dVariable or type(var) is Magnitude2dVariable:
+            return self.lower(var._rvar)
+        elif type(var) is Distance3dVariable or type(var) is Distance2dVariable:
+            return self.lower(var.magnitude_var)
+        elif type(var) is DeltaRVariable:
+            return self.lower(var._dr)
+        elif type(var) is DeltaPhiVariable:
+            dphi = '(%s - %s)'%(self.lower(var._phi1), self.lower(var._phi2))
+            dphi = 'where(%s > %r, %s - %r, %s)'%(dphi, np.pi, dphi, 2*np.pi, dphi)
+            return 'where(%s < %r, %s + %r, %s)'%(dphi, -np.pi, dphi, 2*np.pi, dphi)
+        else:
+            return self.leaf(var)
+
+def lower_variable(var : VariableProtocol) -> Tuple[str, List[VariableProtocol]]:
+    '''
+    Returns the numexpr expression for var, and the list of leaf variables (named v0, v1, ...) it depends on
+    '''
+    lowering = _Lowering()
+    expr = lowering.lower(var)
+    return expr, lowering.leaves
+
+def _numexpr_compatible(arr : np.ndarray) -> np.ndarray:
+    # numexpr only supports bool, int32, int64, float32, float64
+    if arr.dtype.kind == 'u' and arr.dtype.itemsize < 8:
+        return arr.astype(np.int64)
+    elif arr.dtype.kind == 'u' or arr.dtype == np.float16:
+        return arr.astype(np.float64)
+    elif arr.dtype.kind == 'i' and arr.dtype.itemsize < 4:
+        return arr.astype(np.int32)
+    else:
+        return arr
+
+class FusedVariable(VariableBase):
+    '''
+    Evaluates an arithmetic variable tree (sums, differences, products, ratios, supported ufuncs,
+    magnitudes, distances, DeltaPhi/DeltaR, ...) in a single numexpr pass,
+    rather than materializing a temporary array for every node.
+
+    Jagged inputs are flattened to their contents, the expression is evaluated on the flat buffers,
+    and the result is unflattened with the shared counts.
+    Per-event inputs are broadcast onto the objects, as awkward would.
+    Falls back to normal evaluation if numexpr is not installed, or for layouts deeper than one level of jaggedness
+    '''
+    def __init__(self, var : VariableProtocol):
+        self._var = var
+        self._expr, self._leaves = lower_variable(var)
+
+    @property
+    def expression(self) -> str:
+        return self._expr
+
+    @property
+    def _natural_centerline(self):
+        return self._var.centerline
+
+    @property
+    def prebinned(self) -> bool:
+        return False
+
+    @property
+    def columns(self):
+        return self._var.columns
+
+    def evaluate(self, dataset, cut):
+        try:
+            import numexpr
+        except ImportError:
+            return self._var.evaluate(dataset, cut)
+
+        values = [leaf.evaluate(dataset, cut) for leaf in self._leaves]
+
+        counts = None
+        for val in values:
+            if isinstance(val, ak.Array) and val.ndim == 2:
+                thecounts = ak.to_numpy(ak.num(val, axis=1))
+                if counts is None:
+                    counts = thecounts
+                elif not np.array_equal(counts, thecounts):
+                    return self._var.evaluate(dataset, cut)
+            elif isinstance(val, ak.Array) and val.ndim > 2:
+                return self._var.evaluate(dataset, cut)
+
+        local_dict = {}
+        for i, val in enumerate(values):
+            jagged = isinstance(val, ak.Array) and val.ndim == 2
+            if isinstance(val, ak.Array):
+                if jagged:
+                    val = ak.flatten(val, axis=1)
+                try:
+                    val = ak.to_numpy(val, allow_missing=False)
+                except ValueError:
+                    return self._var.evaluate(dataset, cut)
+            else:
+                val = np.asarray(val)
+
+            # per-event values (numpy, or awkward eg from NanoEvents) are broadcast onto the objects
+            if counts is not None and not jagged and val.ndim == 1:
+                val = np.repeat(val, counts)
+
+            local_dict['v%d'%i] = _numexpr_compatible(val)
+
+        result = numexpr.evaluate(self._expr, local_dict=local_dict)
+
+        if counts is not None:
+            return ak.unflatten(result, counts)
+        else:
+            return result
+
+    @property
+    def key(self):
+        return self._var.key
+
+    def __eq__(self, other):
+        if type(other) is not FusedVariable:
+            return False
+
+        return self._var == other._var
+
+    def set_collection_name(self, collection_name):
+        self._var.set_collection_name(collection_name)
+        self._expr, self._leaves = lower_variable(self._var)
@@ -1,4 +1,5 @@
 import copy
+import os
 
 from simonplot.config import lookup_axis_label
 from simonplot.util.profile import ProfileStruct
@@ -286,18 +287,39 @@ class SumVariable(VariableBase):
         self._var1.set_collection_name(collection_name)
         self._var2.set_collection_name(collection_name)
 
+# CorrectionSets shared between all CorrectionlibVariables in the process,
+# keyed by (path, mtime) so that edited files are reloaded
+_correctionsets = {}
+
+def _load_correctionset(path : str):
+    from correctionlib import CorrectionSet
+
+    key = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+    if key not in _correctionsets:
+        _correctionsets[key] = CorrectionSet.from_file(path)
+    return _correctionsets[key]
+
 class CorrectionlibVariable(VariableBase):
+    # the correctionlib evaluator can't be pickled, so it is reloaded from path
+    _transient = ('_eval',)
+
     def __init__(self, var_l : Sequence[VariableProtocol | str], path : str, key : str):
         self._vars = [BasicVariable(var) if isinstance(var, str) else var for var in var_l]
 
-        from correctionlib import CorrectionSet
-        cset = CorrectionSet.from_file(path)
-        if key not in list(cset.keys()):
-            print("Error: Correctionlib key '%s' not found in %s"%(key, path))
+        self._path = path
+        self._csetkey = key
+        self._load()
+
+    def _load(self):
+        if hasattr(self, '_eval'):
+            return
+
+        cset = _load_correctionset(self._path)
+        if self._csetkey not in list(cset.keys()):
+            print("Error: Correctionlib key '%s' not found in %s"%(self._csetkey, self._path))
             print("Available keys: %s"%list(cset.keys()))
             raise ValueError("Correctionlib key not found")
-        self._eval = cset[key].evaluate
-        self._csetkey = key
+        self._eval = cset[self._csetkey].evaluate
 
     @property
     def _natural_centerline(self):
@@ -315,8 +337,44 @@ class CorrectionlibVariable(VariableBase):
         return list(set(cols))
 
     def evaluate(self, dataset, cut):
+        '''
+        correctionlib only evaluates flat arrays, so flatten any jagged arguments to their contents,
+        broadcast per-event arguments onto the objects, make one vectorized call, and unflatten the result.
+        Repeated evaluations within one fill are memoized by the evaluation context (see util/evalcontext.py)
+        '''
+        self._load()
+
         args = [var.evaluate(dataset, cut) for var in self._vars]
-        return self._eval(*args)
+
+        counts = None
+        for arg in args:
+            if isinstance(arg, ak.Array) and arg.ndim > 2:
+                raise RuntimeError("CorrectionlibVariable.evaluate: arguments with more than one level of nesting are not supported")
+            elif isinstance(arg, ak.Array) and arg.ndim == 2:
+                thecounts = ak.to_numpy(ak.num(arg, axis=1))
+                if counts is None:
+                    counts = thecounts
+                elif not np.array_equal(counts, thecounts):
+                    raise RuntimeError("CorrectionlibVariable.evaluate: jagged arguments have different numbers of objects")
+
+        flat_args = []
+        for arg in args:
+            if isinstance(arg, ak.Array) and arg.ndim == 2:
+                arg = ak.to_numpy(ak.flatten(arg, axis=1))
+            else:
+                arg = ak.to_numpy(arg) if isinstance(arg, ak.Array) else np.asarray(arg)
+                if arg.ndim == 0:
+                    arg = arg.item()
+                elif counts is not None:
+                    arg = np.repeat(arg, counts)
+            flat_args.append(arg)
+
+        result = self._eval(*flat_args)
+
+        if counts is not None:
+            return ak.unflatten(result, counts)
+        else:
+            return result
 
     @property
     def key(self):
@@ -376,15 +434,21 @@ class UFuncVariable(VariableBase):
         self._var.set_collection_name(collection_name)
 
 class ProfileVariable(VariableBase):
+    '''
+    Profile of yvar in bins of xvar. Entries are unweighted, unless weighted=True,
+    in which case the event weight and dataset weight are applied
+    '''
     def __init__(self, 
                  xvar : VariableProtocol | str, 
                  yvar : VariableProtocol | str,
                  mode : str,
-                 mode_params : Any = None):
+                 mode_params : Any = None,
+                 weighted : bool = False):
         self._xvar = BasicVariable(xvar) if isinstance(xvar, str) else xvar
         self._yvar = BasicVariable(yvar) if isinstance(yvar, str) else yvar
         self._mode = mode
         self._mode_params = mode_params
+        self._weighted = weighted
 
         self._modestr = self._mode
         if self._mode_params is not None:
@@ -394,6 +458,8 @@ class ProfileVariable(VariableBase):
                 self._modestr += "(%s,%s)"%(self._mode_params[0], self._mode_params[1])
             else:
                 raise ValueError("Invalid mode_params for ProfileVariable: %s"%self._mode_params)
+        if self._weighted:
+            self._modestr = "weighted-" + self._modestr
 
     @property
     def _natural_centerline(self):
@@ -412,7 +478,8 @@ class ProfileVariable(VariableBase):
             xvar = self._xvar.evaluate(dataset, cut),
             yvar = self._yvar.evaluate(dataset, cut),
             mode = self._mode, # pyright: ignore[reportArgumentType]
-            mode_params = self._mode_params
+            mode_params = self._mode_params,
+            weighted = self._weighted
         )
     
     @property
@@ -435,16 +502,24 @@ class ProfileVariable(VariableBase):
         if type(other) is not ProfileVariable:
             return False
         
-        return self._xvar == other._xvar and self._yvar == other._yvar and self._mode == other._mode and self._mode_params == other._mode_params
+        return self._xvar == other._xvar and self._yvar == other._yvar and self._mode == other._mode and self._mode_params == other._mode_params and self._weighted == other._weighted
 
     def set_collection_name(self, collection_name):
         self._xvar.set_collection_name(collection_name)
         self._yvar.set_collection_name(collection_name)
 
 class RateVariable(VariableBase):
-    def __init__(self, binaryfield : VariableProtocol | str, wrt : VariableProtocol | str):
+    '''
+    Rate of binaryfield (pass=1, fail=0) as a function of wrt
+    With thresholds, binaryfield is instead a continuous discriminant, and the turn-on curves
+    for passing (discriminant >= threshold) each of the thresholds are all filled in one pass.
+    The resulting RateHistStruct has a 'threshold' axis. plot_histogram draws one curve per threshold;
+    use RateHistStruct.at_threshold(i) to pick out a single curve
+    '''
+    def __init__(self, binaryfield : VariableProtocol | str, wrt : VariableProtocol | str, thresholds : Sequence[float] | None = None):
         self._binaryfield = BasicVariable(binaryfield) if isinstance(binaryfield, str) else binaryfield
         self._wrt = BasicVariable(wrt) if isinstance(wrt, str) else wrt
+        self._thresholds = None if thresholds is None else list(thresholds)
 
     @property
     def _natural_centerline(self):
@@ -461,12 +536,16 @@ class RateVariable(VariableBase):
     def evaluate(self, dataset, cut):
         return RateStruct(
             self._binaryfield.evaluate(dataset, cut),
-            self._wrt.evaluate(dataset, cut)
+            self._wrt.evaluate(dataset, cut),
+            self._thresholds
         )
 
     @property
     def key(self):
-        return "%s_rate_wrt_%s"%(self._binaryfield.key, self._wrt.key)
+        if self._thresholds is None:
+            return "%s_rate_wrt_%s"%(self._binaryfield.key, self._wrt.key)
+        else:
+            return "%s_rate_wrt_%s_thresholds_%s"%(self._binaryfield.key, self._wrt.key, '_'.join(repr(float(t)) for t in self._thresholds))
 
     @property
     def xkey(self):
@@ -484,7 +563,7 @@ class RateVariable(VariableBase):
     def __eq__(self, other):
         if type(other) is not RateVariable:
             return False
-        return self._binaryfield == other._binaryfield and self._wrt == other._wrt
+        return self._binaryfield == other._binaryfield and self._wrt == other._wrt and self._thresholds == other._thresholds
 
     def set_collection_name(self, collection_name):
         self._binaryfield.set_collection_name(collection_name)
@@ -677,4 +756,55 @@ class VariableFromCut(VariableBase):
         return self._cut == other._cut
     
     def set_collection_name(self, collection_name):
-        self._cut.set_collection_name(collection_name)
\ No newline at end of file
+        self._cut.set_collection_name(collection_name)
+
+class SidecarVariable(VariableBase):
+    '''
+    Wraps an expensive variable so that its values are computed once per dataset,
+    stored in a parquet sidecar next to the dataset (see ParquetDataset.write_sidecar()),
+    and read back like a plain column on later evaluations (including in later sessions)
+
+    Datasets without sidecar support just evaluate the wrapped variable
+    '''
+    def __init__(self, var : VariableProtocol):
+        self._var = var
+
+    @property
+    def _natural_centerline(self):
+        return self._var.centerline
+    
+    @property
+    def prebinned(self) -> bool:
+        return False
+    
+    @property
+    def columns(self):
+        # needed whenever the sidecar has to be (re)computed
+        return self._var.columns
+    
+    def evaluate(self, dataset, cut):
+        if not hasattr(dataset, 'get_sidecar_column'):
+            dataset.ensure_columns(self._var.columns)
+            return self._var.evaluate(dataset, cut)
+
+        if cut is None:
+            mask = slice(None)
+        else:
+            mask = cut.evaluate(dataset)
+
+        val = dataset.get_sidecar_column(self._var)
+
+        return val[mask]
+    
+    @property
+    def key(self):
+        return self._var.key
+    
+    def __eq__(self, other):
+        if type(other) is not SidecarVariable:
+            return False
+        
+        return self._var == other._var
+    
+    def set_collection_name(self, collection_name):
+        self._var.set_collection_name(collection_name)
@@ -1,4 +1,5 @@
 from simonplot.config import lookup_axis_label
+from simonplot.util.evalcontext import memoize_variable_evaluate
 
 from typing import List, Protocol, Any, Union, Sequence, Tuple
 from abc import ABC, abstractmethod
@@ -7,6 +8,22 @@ class VariableBase(ABC):
     '''
     Base class for `Variable`s, implementing basic common functionality
     '''
+    # attributes which are not part of the variable definition (eg unpicklable evaluators)
+    # these are not pickled, and are rebuilt lazily on first use
+    _transient : Tuple[str, ...] = ()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attr in self._transient:
+            state.pop(attr, None)
+        return state
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # memoize results inside an evaluation_context (see util/evalcontext.py)
+        if 'evaluate' in cls.__dict__:
+            cls.evaluate = memoize_variable_evaluate(cls.__dict__['evaluate'])
+
     @property
     @abstractmethod
     def _natural_centerline(self):
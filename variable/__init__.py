@@ -1,5 +1,6 @@
-from .Variable import  ConstantVariable, BasicVariable, ConcatVariable, AkNumVariable, RatioVariable, ProductVariable, DifferenceVariable, SumVariable, CorrectionlibVariable, UFuncVariable, RateVariable, AbsVariable, LogVariable, ProfileVariable, VariableFromCut
-from .CompositeVariable import RelativeResolutionVariable, Magnitude3dVariable, Magnitude2dVariable, Distance3dVariable, DeltaPhiVariable, DeltaRVariable, EtaFromXYZVariable, PhiFromXYZVariable
+from .Variable import  ConstantVariable, BasicVariable, ConcatVariable, AkNumVariable, RatioVariable, ProductVariable, DifferenceVariable, SumVariable, CorrectionlibVariable, UFuncVariable, RateVariable, AbsVariable, LogVariable, ProfileVariable, VariableFromCut, SidecarVariable
+from .CompositeVariable import RelativeResolutionVariable, Magnitude3dVariable, Magnitude2dVariable, Distance3dVariable, Distance2dVariable, DeltaPhiVariable, DeltaRVariable, EtaFromXYZVariable, PhiFromXYZVariable
+from .FusedVariable import FusedVariable
 from .PrebinnedVariable import BasicPrebinnedVariable, WithJacobian, NormalizePerBlock, DivideOutProfile, CorrelationFromCovariance
 __all__ = [
     'ConstantVariable',
@@ -16,6 +17,7 @@ __all__ = [
     'Magnitude3dVariable',
     'Magnitude2dVariable',
     'Distance3dVariable',
+    'Distance2dVariable',
     'DeltaPhiVariable',
     'DeltaRVariable',
     'EtaFromXYZVariable',
@@ -30,4 +32,6 @@ __all__ = [
     "LogVariable",
     "ProfileVariable",
     "VariableFromCut",
+    "SidecarVariable",
+    "FusedVariable",
 ]
\ No newline at end of file